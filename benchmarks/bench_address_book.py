@@ -0,0 +1,41 @@
+"""Benchmark of AddressBook.add_record scaling.
+Inserts records in doubling batches and prints time per record for every size.
+Linear scaling shows up as a flat "us/record" column.
+
+Usage:
+    python -m benchmarks.bench_address_book [max_records]   (default 1000000)
+"""
+import sys
+import time
+
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.models import UserRecord
+
+
+def make_record(i: int) -> UserRecord:
+    return UserRecord(f"Contact {i}", phones=[f"0{i % 1_000_000_000:09d}"])
+
+
+def main(max_records: int):
+    book = AddressBook()
+    print("{:>10} {:>12} {:>12}".format("records", "batch, s", "us/record"))
+    size, inserted = 1000, 0
+    while inserted < max_records:
+        batch = min(size, max_records) - inserted
+        start = time.perf_counter()
+        for i in range(inserted, inserted + batch):
+            book.add_record(make_record(i))
+        elapsed = time.perf_counter() - start
+        inserted += batch
+        print("{:>10} {:>12.3f} {:>12.2f}".format(inserted, elapsed, elapsed / batch * 1e6))
+        size *= 2
+
+    start = time.perf_counter()
+    for i in range(0, inserted, 1000):
+        book.delete(f"Contact {i}")
+    elapsed = time.perf_counter() - start
+    print(f"delete: {elapsed / (inserted // 1000) * 1e6:.2f} us/record")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
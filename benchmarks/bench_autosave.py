@@ -0,0 +1,77 @@
+"""Benchmark of the time a command waits for persistence in a session without journal: saving the books after
+every command on the prompt thread against Autosave, which only updates its shadow copy of the changed records
+and saves it in the background. Prints the latency of the prompt thread per command and the number of saves.
+
+Usage:
+    python -m benchmarks.bench_autosave [contacts] [commands]   (default 100000 200)
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+
+from ccnb.src.autosave import Autosave
+from ccnb.src.binary_format import BinaryFormat
+from ccnb.src.cipher import SessionCipher
+from ccnb.src.data_base import BUFFER_SIZE, DataBase
+from ccnb.src.models import UserRecord
+from benchmarks.bench_save_format import make_books
+
+PASSWORD = "correct horse battery staple"
+
+
+def change(data_base, command: int):
+    """One command: adds a contact or a phone to the contact added by the previous command"""
+    if command % 2:
+        data_base.address_book.add_record(UserRecord(f"Autosave{command}", ["0501234567"]))
+    else:
+        data_base.address_book.find(f"Autosave{command - 1}").add_phone("0507654321")
+
+
+def print_row(name: str, latencies, saves: int):
+    print("{:>20} {:>10.3f} {:>10.3f} {:>6}".format(name, sum(latencies) / len(latencies) * 1000,
+                                                    max(latencies) * 1000, saves))
+
+
+def main(contacts: int, commands: int):
+    data_base = make_books(contacts, contacts // 10)
+    cipher = SessionCipher(PASSWORD)
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = os.path.join(directory, "books.ccnb.aes")
+        print(f"{contacts} contacts, {commands} commands")
+        print("{:>20} {:>10} {:>10} {:>6}".format("persistence", "mean, ms", "max, ms", "saves"))
+
+        # Synchronous saves are slow, a tenth of the commands is enough for the average
+        latencies = []
+        for command in range(1, commands // 10 + 1):
+            change(data_base, command)
+            start = time.perf_counter()
+            DataBase.write_encrypted(data_base, filepath, cipher)
+            latencies.append(time.perf_counter() - start)
+        print_row("save every command", latencies, len(latencies))
+
+        def save(user_id, contacts, notes):
+            plain_file = io.BytesIO()
+            BinaryFormat.dump_values(plain_file, user_id, contacts, notes)
+            plain_file.seek(0)
+            with open(filepath + ".tmp", "wb") as encrypted_file:
+                cipher.encrypt(plain_file, encrypted_file, BUFFER_SIZE)
+            os.replace(filepath + ".tmp", filepath)
+        autosave = Autosave(save, changes=20, seconds=1.0)
+        autosave.attach(data_base.address_book, data_base.note_book)
+        latencies = []
+        for command in range(commands // 10 + 1, commands // 10 + commands + 1):
+            change(data_base, command)
+            start = time.perf_counter()
+            autosave.commit()
+            latencies.append(time.perf_counter() - start)
+            # Time of the user typing the next command
+            time.sleep(0.01)
+        autosave.close()
+        print_row("autosave", latencies, autosave.saves)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 200)
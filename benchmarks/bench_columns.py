@@ -0,0 +1,51 @@
+"""Benchmark of bulk queries of AddressBook against the NumPy ContactColumns view.
+Prints the time of every query on both, best of 3 runs, and the time to build the view.
+
+Usage:
+    python -m benchmarks.bench_columns [contacts]   (default 200000)
+"""
+import sys
+import time
+
+from ccnb.src.columns import ContactColumns
+from benchmarks.bench_save_format import make_books
+
+
+def best_time(query) -> float:
+    times = []
+    for _ in range(3):
+        start = time.perf_counter()
+        query()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def count_by_email_domain(address_book):
+    counts = {}
+    for record in address_book.values():
+        for domain in {email.rsplit("@", 1)[-1].lower() for email in record.emails or ()}:
+            counts[domain] = counts.get(domain, 0) + 1
+    return counts
+
+
+def main(contacts: int):
+    address_book = make_books(contacts, 0).address_book
+    start = time.perf_counter()
+    columns = ContactColumns(address_book)
+    print(f"{contacts} contacts, view built in {time.perf_counter() - start:.3f} s")
+    queries = {
+        "birthdays in 7 days": (lambda: address_book.get_upcoming_birthdays("01.05.2024", 7),
+                                lambda: columns.get_upcoming_birthdays("01.05.2024", 7)),
+        "birthdays in 60 days": (lambda: address_book.get_upcoming_birthdays("01.05.2024", 60),
+                                 lambda: columns.get_upcoming_birthdays("01.05.2024", 60)),
+        "phones with 4567": (lambda: address_book.search_by_phone("4567"), lambda: columns.search_by_phone("4567")),
+        "count by domain": (lambda: count_by_email_domain(address_book), columns.count_by_email_domain),
+        "without phone": (lambda: [record for record in address_book.values() if not record.phones], columns.without_phone),
+    }
+    print("{:>22} {:>14} {:>12}".format("query", "AddressBook, s", "columns, s"))
+    for name, (book_query, columns_query) in queries.items():
+        print("{:>22} {:>14.4f} {:>12.4f}".format(name, best_time(book_query), best_time(columns_query)))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,67 @@
+"""Benchmark of encrypted saves and loads. Saves: a new SessionCipher for every save (the password is stretched every
+time, as pyAesCrypt does) against one SessionCipher per session, which stretches it once for the salt of the session.
+Loads check the password with the header of the file and decrypt it: with a new SessionCipher for every call
+the password is stretched twice, one SessionCipher reuses the key of the salt.
+Prints latency and time spent on password stretching.
+
+Usage:
+    python -m benchmarks.bench_encryption [contacts] [repeats]   (default 1000 10)
+"""
+import os
+import sys
+import tempfile
+import time
+
+from ccnb.src.cipher import SessionCipher
+from ccnb.src.data_base import DataBase
+from benchmarks.bench_save_format import make_books
+
+PASSWORD = "correct horse battery staple"
+
+
+def measure_saves(data_base, filepath: str, repeats: int, session: bool):
+    """Returns average save time and average stretching time per save"""
+    cipher = SessionCipher(PASSWORD)
+    derivation_time = total = 0.0
+    for _ in range(repeats):
+        if not session:
+            derivation_time += cipher.derivation_time
+            cipher = SessionCipher(PASSWORD)
+        start = time.perf_counter()
+        DataBase.write_encrypted(data_base, filepath, cipher)
+        total += time.perf_counter() - start
+    return total / repeats, (derivation_time + cipher.derivation_time) / repeats
+
+
+def measure_loads(filepath: str, repeats: int, session: bool):
+    """Returns average load time and average stretching time per load"""
+    derivation_time = total = 0.0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        verify_cipher = SessionCipher(PASSWORD)
+        with open(filepath, "rb") as encrypted_file:
+            verify_cipher.verify(encrypted_file)
+        cipher = verify_cipher if session else SessionCipher(PASSWORD)
+        DataBase.read_encrypted(filepath, cipher)
+        total += time.perf_counter() - start
+        derivation_time += verify_cipher.derivation_time + (0.0 if session else cipher.derivation_time)
+    return total / repeats, derivation_time / repeats
+
+
+def main(contacts: int, repeats: int):
+    data_base = make_books(contacts, contacts // 10)
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = os.path.join(directory, "books.ccnb.aes")
+        print(f"{contacts} contacts, {repeats} repeats")
+        print("{:>24} {:>10} {:>14}".format("operation", "time, ms", "stretching, ms"))
+        rows = [("save, cipher per save", measure_saves(data_base, filepath, repeats, False)),
+                ("save, cipher per session", measure_saves(data_base, filepath, repeats, True)),
+                ("load, cipher per call", measure_loads(filepath, repeats, False)),
+                ("load, cipher per session", measure_loads(filepath, repeats, True))]
+        for name, (total, derivation_time) in rows:
+            print("{:>24} {:>10.1f} {:>14.1f}".format(name, total * 1000, derivation_time * 1000))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 10)
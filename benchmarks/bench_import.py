@@ -0,0 +1,42 @@
+"""Benchmark of streaming CSV import into an AddressBook with one process and with a process pool.
+Every 100th row is invalid and goes to the reject file. Prints import time and rows per second.
+
+Usage:
+    python -m benchmarks.bench_import [rows] [workers]   (default 200000, number of CPUs)
+"""
+import csv
+import os
+import sys
+import tempfile
+import time
+
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.transfer import CSV_HEADER, Transfer
+
+
+def make_csv(filepath: str, rows: int):
+    with open(filepath, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_HEADER)
+        for i in range(rows):
+            phone = f"0{i % 1_000_000_000:09d}" if i % 100 else "123"
+            writer.writerow((f"Contact {i}", phone, f"{i % 28 + 1:02d}.{i % 12 + 1:02d}.{1950 + i % 50}",
+                             f"contact{i}@example.com", f"{i} Main street"))
+
+
+def main(rows: int, workers: int):
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = os.path.join(directory, "contacts.csv")
+        make_csv(filepath, rows)
+        print(f"{rows} rows, {os.path.getsize(filepath) / 2**20:.1f} MB")
+        print("{:>8} {:>10} {:>10} {:>12}".format("workers", "import, s", "rejected", "rows/s"))
+        for count in sorted({1, workers}):
+            start = time.perf_counter()
+            _, rejected = Transfer.import_contacts(AddressBook(), filepath, workers=count)
+            elapsed = time.perf_counter() - start
+            print("{:>8} {:>10.2f} {:>10} {:>12.0f}".format(count, elapsed, rejected, rows / elapsed))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1)
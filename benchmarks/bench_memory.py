@@ -0,0 +1,67 @@
+"""Benchmark of memory used by the models, measured with tracemalloc.
+Prints bytes per contact and bytes per note, for bare records and for records kept in the books with their indexes.
+
+Usage:
+    python -m benchmarks.bench_memory [contacts] [notes]   (default 100000 10000)
+"""
+import sys
+import tracemalloc
+
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.NoteBook import NoteBook
+from ccnb.src.models import Note, UserRecord
+
+
+def make_record(i: int) -> UserRecord:
+    return UserRecord(f"Contact {i}", phones=[f"0{i % 1_000_000_000:09d}"],
+                      birthday=f"{i % 28 + 1:02d}.{i % 12 + 1:02d}.{1950 + i % 50}",
+                      emails=[f"contact{i}@example.com"], address=f"{i} Main street")
+
+
+def make_note(i: int) -> Note:
+    return Note(f"Note {i}", f"Content of the note number {i} " * 5, [f"tag{i % 100}", f"group{i % 7}"])
+
+
+def measure(build) -> int:
+    """Returns bytes allocated by build and still alive while its result is kept"""
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    result = build()
+    size = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def fill_address_book(contacts: int) -> AddressBook:
+    address_book = AddressBook()
+    for i in range(contacts):
+        address_book.add_record(make_record(i))
+    return address_book
+
+
+def fill_note_book(notes: int) -> NoteBook:
+    note_book = NoteBook()
+    for i in range(notes):
+        note = make_note(i)
+        note_book.add_note(note.title.value, note.content.value)
+        note_book.add_tags_to_note(note.title.value, note.tags.value)
+    return note_book
+
+
+def main(contacts: int, notes: int):
+    results = {
+        "contact": measure(lambda: [make_record(i) for i in range(contacts)]) / contacts,
+        "note": measure(lambda: [make_note(i) for i in range(notes)]) / notes,
+        "contact in AddressBook": measure(lambda: fill_address_book(contacts)) / contacts,
+        "note in NoteBook": measure(lambda: fill_note_book(notes)) / notes,
+    }
+    print(f"{contacts} contacts, {notes} notes")
+    print("{:>24} {:>10}".format("", "bytes"))
+    for name, size in results.items():
+        print("{:>24} {:>10.0f}".format(name, size))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 10_000)
@@ -0,0 +1,59 @@
+"""Benchmark of startup of the memory-mapped RecordStore against loading a BinaryFormat save file.
+Books are written and every variant is opened in a separate process, so peak RSS of a variant is its own.
+Prints time to open the books and find one contact, and peak RSS.
+
+Usage:
+    python -m benchmarks.bench_record_store [contacts] [notes]   (default 100000 10000)
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from ccnb.src.binary_format import BinaryFormat
+from ccnb.src.record_store import RecordStore
+
+
+def open_books(variant: str, filepath: str):
+    start = time.perf_counter()
+    if variant == "binary":
+        with open(filepath, "rb") as save_file:
+            address_book, _ = BinaryFormat.load(save_file)
+    else:
+        address_book = RecordStore(filepath).address_book
+    opened = time.perf_counter() - start
+    address_book.find("Contact 12345")
+    found = time.perf_counter() - start
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print("{:>8} {:>10.3f} {:>12.3f} {:>10.1f}".format(variant, opened, found, rss))
+
+
+def make_files(directory: str, contacts: int, notes: int):
+    from benchmarks.bench_save_format import make_books
+    data_base = make_books(contacts, notes)
+    with open(os.path.join(directory, "books.ccnb"), "wb") as save_file:
+        BinaryFormat.dump(data_base.address_book, data_base.note_book, save_file)
+    RecordStore.write(os.path.join(directory, "books.records"), data_base.address_book, data_base.note_book)
+
+
+def main(contacts: int, notes: int):
+    with tempfile.TemporaryDirectory() as directory:
+        files = {"binary": os.path.join(directory, "books.ccnb"), "mmap": os.path.join(directory, "books.records")}
+        subprocess.run([sys.executable, "-m", "benchmarks.bench_record_store", "--make", directory, str(contacts), str(notes)],
+                       check=True)
+        print(f"{contacts} contacts, {notes} notes")
+        print("{:>8} {:>10} {:>12} {:>10}".format("variant", "open, s", "+ find, s", "RSS, MB"))
+        for variant, filepath in files.items():
+            subprocess.run([sys.executable, "-m", "benchmarks.bench_record_store", "--open", variant, filepath], check=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--make":
+        make_files(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+    elif len(sys.argv) > 1 and sys.argv[1] == "--open":
+        open_books(sys.argv[2], sys.argv[3])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000,
+             int(sys.argv[2]) if len(sys.argv) > 2 else 10_000)
@@ -0,0 +1,74 @@
+"""Benchmark of bringing the changes of the writer session into a read-only session: restarting the session
+(reading the whole save) against Watcher, which applies new journal operations or merges a new snapshot
+into the books. Prints the time the prompt thread spends on it, reading of the files runs in the watcher thread.
+
+Usage:
+    python -m benchmarks.bench_reload [contacts] [changes]   (default 100000 100)
+"""
+import os
+import sys
+import tempfile
+import time
+
+from ccnb.src.data_base import DataBase
+from ccnb.src.journal import Journal
+from ccnb.src.models import UserRecord
+from ccnb.src.watcher import Watcher
+from benchmarks.bench_save_format import make_books
+
+
+def wait(watcher: Watcher, reloads: int):
+    """Waits for the watcher thread to find the changes, Watcher checks the files every 10 ms here"""
+    time.sleep(0.5)
+    while watcher.reloads < reloads:
+        time.sleep(0.01)
+
+
+def main(contacts: int, changes: int):
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = os.path.join(directory, "books.ccnb")
+        journal_path = os.path.join(directory, "books.journal")
+        DataBase.write_snapshot(make_books(contacts, contacts // 10), filepath)
+        writer, reader = DataBase.read_snapshot(filepath), DataBase.read_snapshot(filepath)
+        print(f"{contacts} contacts, {changes} changed records")
+        print("{:>20} {:>10}".format("reload", "prompt, s"))
+
+        start = time.perf_counter()
+        DataBase.read_snapshot(filepath)
+        print("{:>20} {:>10.4f}".format("restart", time.perf_counter() - start))
+
+        # Writer appends the changes to its journal, the reader applies only them
+        journal = Journal(journal_path)
+        journal.attach(writer.address_book, writer.note_book)
+        for i in range(changes):
+            writer.address_book.add_record(UserRecord(f"Reload{i}", ["0501234567"]))
+        journal.commit()
+        files = [os.stat(journal_path).st_ino]
+        def read_snapshot():
+            data_base = DataBase.read_snapshot(filepath)
+            data_base.watched = (files, 0)
+            return data_base
+        watcher = Watcher(lambda: files, read_snapshot, journal_path, list(files), 0, seconds=0.01)
+        watcher.attach(reader.address_book, reader.note_book)
+        wait(watcher, 0)
+        start = time.perf_counter()
+        applied = watcher.apply()
+        print("{:>20} {:>10.4f}   {} records".format("journal operations", time.perf_counter() - start, applied))
+
+        # Writer folds the journal into a new save, the reader compares the snapshot with its books
+        for i in range(changes):
+            writer.address_book.find(f"Reload{i}").add_phone("0507654321")
+        journal.commit()
+        journal.close()
+        DataBase.write_snapshot(writer, filepath)
+        files = [None]
+        wait(watcher, 1)
+        start = time.perf_counter()
+        applied = watcher.apply()
+        print("{:>20} {:>10.4f}   {} records".format("snapshot merge", time.perf_counter() - start, applied))
+        watcher.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 100)
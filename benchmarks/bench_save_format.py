@@ -0,0 +1,62 @@
+"""Benchmark of save formats: legacy pickle of DataBase against BinaryFormat.
+Builds a book of contacts and notes and prints file size, save time and load time of both formats.
+Load time of both formats includes rebuilding the indexes of the books.
+
+Usage:
+    python -m benchmarks.bench_save_format [contacts] [notes]   (default 100000 10000)
+"""
+import io
+import pickle
+import sys
+import time
+
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.binary_format import BinaryFormat
+from ccnb.src.data_base import DataBase
+from ccnb.src.NoteBook import NoteBook
+from ccnb.src.models import UserRecord
+
+
+def make_books(contacts: int, notes: int) -> DataBase:
+    address_book, note_book = AddressBook(), NoteBook()
+    for i in range(contacts):
+        address_book.add_record(UserRecord(f"Contact {i}", phones=[f"0{i % 1_000_000_000:09d}"],
+                                           birthday=f"{i % 28 + 1:02d}.{i % 12 + 1:02d}.{1950 + i % 50}",
+                                           emails=[f"contact{i}@example.com"], address=f"{i} Main street"))
+    for i in range(notes):
+        note_book.add_note(f"Note {i}", f"Content of the note number {i} " * 5)
+        note_book.add_tags_to_note(f"Note {i}", [f"tag{i % 100}", f"group{i % 7}"])
+    return DataBase(address_book, note_book)
+
+
+def measure(dump, load):
+    """Returns size in bytes, best save and load times of 3 runs"""
+    save_times, load_times = [], []
+    for _ in range(3):
+        stream = io.BytesIO()
+        start = time.perf_counter()
+        dump(stream)
+        save_times.append(time.perf_counter() - start)
+        stream.seek(0)
+        start = time.perf_counter()
+        load(stream)
+        load_times.append(time.perf_counter() - start)
+    return len(stream.getvalue()), min(save_times), min(load_times)
+
+
+def main(contacts: int, notes: int):
+    data_base = make_books(contacts, notes)
+    formats = {
+        "pickle": (lambda stream: pickle.dump(data_base, stream), pickle.load),
+        "binary": (lambda stream: BinaryFormat.dump(data_base.address_book, data_base.note_book, stream), BinaryFormat.load),
+    }
+    print(f"{contacts} contacts, {notes} notes")
+    print("{:>8} {:>12} {:>10} {:>10}".format("format", "size, MB", "save, s", "load, s"))
+    for name, (dump, load) in formats.items():
+        size, save_time, load_time = measure(dump, load)
+        print("{:>8} {:>12.2f} {:>10.3f} {:>10.3f}".format(name, size / 2**20, save_time, load_time))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 10_000)
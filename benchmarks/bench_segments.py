@@ -0,0 +1,59 @@
+"""Benchmark of a session which only works with notes: one save file with both books against separate segments.
+Prints startup (reading the books the session needs) and exit (writing the changed books) times, with and without
+encryption.
+
+Usage:
+    python -m benchmarks.bench_segments [contacts] [notes]   (default 100000 1000)
+"""
+import os
+import sys
+import tempfile
+import time
+
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.cipher import SessionCipher
+from ccnb.src.data_base import DataBase
+from ccnb.src.NoteBook import NoteBook
+from benchmarks.bench_save_format import make_books
+
+PASSWORD = "correct horse battery staple"
+
+
+def measure(data_base, filepath: str, cipher):
+    """Returns load and save times of the file"""
+    if cipher is None:
+        DataBase.write_snapshot(data_base, filepath)
+        start = time.perf_counter()
+        loaded = DataBase.read_snapshot(filepath)
+        load_time = time.perf_counter() - start
+        start = time.perf_counter()
+        DataBase.write_snapshot(loaded, filepath)
+    else:
+        DataBase.write_encrypted(data_base, filepath, cipher)
+        start = time.perf_counter()
+        loaded = DataBase.read_encrypted(filepath, cipher)
+        load_time = time.perf_counter() - start
+        start = time.perf_counter()
+        DataBase.write_encrypted(loaded, filepath, cipher)
+    return load_time, time.perf_counter() - start
+
+
+def main(contacts: int, notes: int):
+    data_base = make_books(contacts, notes)
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{contacts} contacts, {notes} notes, session changes notes only")
+        print("{:>12} {:>10} {:>12} {:>10}".format("layout", "encrypted", "startup, s", "exit, s"))
+        for cipher in (None, SessionCipher(PASSWORD)):
+            encrypted = "yes" if cipher else "no"
+            # Single file: both books are read and written
+            load_time, save_time = measure(data_base, os.path.join(directory, "single.ccnb"), cipher)
+            print("{:>12} {:>10} {:>12.3f} {:>10.3f}".format("single file", encrypted, load_time, save_time))
+            # Segments: only the notes segment is read and written, the contacts segment is untouched
+            notes_segment = DataBase(AddressBook(), data_base.note_book)
+            load_time, save_time = measure(notes_segment, os.path.join(directory, "notes.ccnb"), cipher)
+            print("{:>12} {:>10} {:>12.3f} {:>10.3f}".format("segments", encrypted, load_time, save_time))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 1000)
@@ -0,0 +1,79 @@
+"""Micro-benchmark of Validator: per-value calls of the previous implementations (patterns compiled on every call,
+datetime.strptime for every birthday) against the current per-value methods and batch methods.
+Prints time per value in microseconds.
+
+Usage:
+    python -m benchmarks.bench_validator [values]   (default 100000)
+"""
+import re
+import sys
+import time
+from datetime import datetime
+
+from ccnb.src.Validator import Validator
+
+
+def legacy_normalize_phone(phone_number: str) -> str:
+    phone_number = re.sub(r'\D', '', phone_number)
+    if len(phone_number) == 10 and phone_number.startswith("0"):
+        return f"+38{phone_number}"
+    elif len(phone_number) == 12 and phone_number.startswith("38"):
+        return f"+{phone_number}"
+    raise ValueError(f"{phone_number} use invalid phone number format.")
+
+
+def legacy_validate_email(email: str) -> str:
+    if not re.match(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,7}\b', email):
+        raise ValueError(f"{email} is not a valid email address.")
+    return email
+
+
+def legacy_validate_birthday(birthday: str) -> datetime:
+    try:
+        date = datetime.strptime(birthday, "%d.%m.%Y")
+    except ValueError:
+        raise ValueError("Invalid date format. Use DD.MM.YYYY")
+    if date.day == 29 and date.month == 2:
+        raise ValueError("Birthday cannot be 29th February. Use 28.02.YYYY or 01.03.YYYY")
+    if date > datetime.now():
+        raise ValueError("Birthday can't be a future date")
+    return date
+
+
+def per_value(validate, values):
+    for value in values:
+        try:
+            validate(value)
+        except ValueError:
+            pass
+
+
+def best_time(run) -> float:
+    times = []
+    for _ in range(3):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(count: int):
+    # Every 50th value is invalid
+    phones = [f"+38 (0{i % 100:02d}) {i % 1000:03d}-{i % 10000:04d}" if i % 50 else "123" for i in range(count)]
+    emails = [f"contact{i}@example.com" if i % 50 else f"contact{i}" for i in range(count)]
+    birthdays = [f"{i % 28 + 1:02d}.{i % 12 + 1:02d}.{1950 + i % 50}" if i % 50 else "31.02.1990" for i in range(count)]
+    cases = {
+        "phone": (phones, legacy_normalize_phone, Validator.normalize_phone, Validator.normalize_phones),
+        "email": (emails, legacy_validate_email, Validator.validate_email, Validator.validate_emails),
+        "birthday": (birthdays, legacy_validate_birthday, Validator.validate_birthday, Validator.validate_birthdays),
+    }
+    print(f"{count} values, us/value")
+    print("{:>10} {:>10} {:>10} {:>10}".format("", "legacy", "per value", "batch"))
+    for name, (values, legacy, single, batch) in cases.items():
+        times = (best_time(lambda: per_value(legacy, values)), best_time(lambda: per_value(single, values)),
+                 best_time(lambda: batch(values)))
+        print("{:>10} {:>10.2f} {:>10.2f} {:>10.2f}".format(name, *(elapsed / count * 1e6 for elapsed in times)))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
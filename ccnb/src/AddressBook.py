@@ -1,14 +1,23 @@
+import functools
+import itertools
 from collections import UserDict
-from datetime import timedelta
-from typing import Dict
+from datetime import date, timedelta
+from typing import Dict, Iterator, Set, Tuple
 
+from ccnb.src.indexes import BirthdayIndex, NgramIndex, PhoneIndex
 from ccnb.src.models import *
 
 
 class AddressBook(UserDict):
     """Address book class
         data: dict with key: int, value: UserRecord
-        user_id: int, autoincrement id for new records
+        user_id: int, autoincrement id, the last id given to a new record. Saved with the book, never reused
+        names index: dict with key: lowercased name, value: set of record keys.
+            Kept in sync by __setitem__/__delitem__ and by the records themselves (see UserRecord.set_listener)
+        search index: NgramIndex with trigrams of all searchable fields except phones, narrows candidates for search()
+        phone index: PhoneIndex with normalized phones, used by search() and reverse lookups
+        birthday index: BirthdayIndex with birthdays in calendar order, used by birthday queries
+        columns: ContactColumns|None, NumPy view of the book for birthday queries of big books, see use_columns()
         supported operations:
             - add_record(record: UserRecord):
                 validates if record already exists
@@ -17,74 +26,334 @@ class AddressBook(UserDict):
                 search for a record by pattern in all fields
                 search order: name, phone, birthday, email, address
                 non-case-sensitive search
+            - find_by_phone(phone: str) -> List[UserRecord]
+                reverse lookup of contacts by full phone number in any valid format
+            - search_by_phone(digits: str, suffix_only = False) -> List[UserRecord]
+                contacts with a phone containing digits (or ending with digits if suffix_only)
             - delete(name: str)
             - get_upcoming_birthdays(specific_date = None, days = 7) -> List[Dict[str, str]]
                 returns a list of upcoming birthdays within a days range (default 7) from a specific date (default today)
                 specific_date: str, format: "dd.mm.yyyy"
                 days: int, number of days to look ahead
+            - get_next_birthdays(count = 5, specific_date = None) -> List[Dict[str, str]]
+                returns next count birthdays in calendar order from a specific date (default today)
+            - get_birthdays_in_month(month: int) -> List[Dict[str, str]]
+                returns birthdays in the month in calendar order, key "birthday" holds the date of birth
+            - use_columns(min_size)
+                opt-in, requires numpy: birthday queries of a book with at least min_size records run over
+                a ContactColumns view, built by the first such query and kept in sync through subscribe()
+            - subscribe(callback) / unsubscribe(callback)
+                callback(key, record) is called after every change, record is None for deleted ones
+            - changed_keys / deleted_keys -> Set[int]
+                keys of records added or changed / deleted since the last mark_saved(), a key is in one of them at most
+            - has_changes() -> bool
+            - mark_saved()
+                called by persistence after the book was saved, clears the sets and dirty flags of changed records
     """
     def __init__(self):
+        self.__names = {}        # lowercased name -> set of keys
+        self.__indexed_names = {}  # key -> lowercased name the record is indexed under
+        self.__search_index = NgramIndex()
+        self.__phone_index = PhoneIndex()
+        self.__birthday_index = BirthdayIndex()
+        self.user_id = 0
+        self.__subscribers = []
+        self.__changed = set()  # keys added or changed since mark_saved()
+        self.__deleted = set()  # keys deleted since mark_saved()
+        self.__columns = None
+        self.__columns_type = None
+        self.__columns_min_size = None
         super().__init__()
 
+    def __getstate__(self):
+        # Indexes are not saved, they are rebuilt after loading
+        return {"data": self.data, "user_id": self.user_id}
+
+    def __setstate__(self, state):
+        # Books saved before user_id was stored continue from the biggest key
+        self.user_id = state["user_id"] if "user_id" in state else max(state["data"].keys(), default=0)
+        self.__names = {}
+        self.__indexed_names = {}
+        self.__search_index = NgramIndex()
+        self.__phone_index = PhoneIndex()
+        self.__birthday_index = BirthdayIndex()
+        self.__subscribers = []
+        self.__changed = set()
+        self.__deleted = set()
+        self.__columns = None
+        self.__columns_type = None
+        self.__columns_min_size = None
+        self.data = {}
+        for key, record in state["data"].items():
+            self[key] = record
+        self.mark_saved()
+
+    def __setitem__(self, key, record: UserRecord):
+        if key in self.data:
+            # Replaced record keeps its place in the book
+            self.__unindex(key)
+            self.data[key].set_listener(None)
+        self.user_id = max(self.user_id, key)
+        self.data[key] = record
+        self.__index(key)
+        record.set_listener(functools.partial(self.__reindex, key))
+        self.__publish(key)
+
+    def __delitem__(self, key):
+        self.__unindex(key)
+        self.data[key].set_listener(None)
+        del self.data[key]
+        self.__publish(key)
+
+    def use_columns(self, min_size: int):
+        """Raises ImportError without numpy"""
+        # Imported here, the view is optional and imports AddressBook itself
+        from ccnb.src.columns import ContactColumns
+        self.__columns_type = ContactColumns
+        self.__columns_min_size = min_size
+
+    def __columns_view(self):
+        """ContactColumns for a book of at least the size given to use_columns(), None otherwise"""
+        if self.__columns_min_size is None or len(self.data) < self.__columns_min_size:
+            return None
+        if self.__columns is None:
+            self.__columns = self.__columns_type(self)
+        return self.__columns
+
+    def subscribe(self, callback):
+        """Register callback(key, record) called after a record is added, changed or deleted (record is None)"""
+        self.__subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.__subscribers.remove(callback)
+
+    def __publish(self, key):
+        if key in self.data:
+            self.__changed.add(key)
+            self.__deleted.discard(key)
+        else:
+            self.__changed.discard(key)
+            self.__deleted.add(key)
+        for callback in self.__subscribers:
+            callback(key, self.data.get(key))
+
+    @property
+    def changed_keys(self) -> Set[int]:
+        return set(self.__changed)
+
+    @property
+    def deleted_keys(self) -> Set[int]:
+        return set(self.__deleted)
+
+    def has_changes(self) -> bool:
+        return bool(self.__changed or self.__deleted)
+
+    def mark_saved(self):
+        for key in self.__changed:
+            self.data[key].mark_clean()
+        self.__changed.clear()
+        self.__deleted.clear()
+
+    def __index(self, key):
+        record = self.data[key]
+        name = record.name.value.lower()
+        self.__names.setdefault(name, set()).add(key)
+        self.__indexed_names[key] = name
+        self.__search_index.add(key, self.__searchable_texts(record))
+        self.__phone_index.add(key, record.phones or ())
+        self.__birthday_index.add(key, record.birthday.value if record.birthday else None)
+
+    def __unindex(self, key):
+        name = self.__indexed_names.pop(key)
+        keys = self.__names[name]
+        keys.discard(key)
+        if not keys:
+            del self.__names[name]
+        self.__search_index.remove(key)
+        self.__phone_index.remove(key)
+        self.__birthday_index.remove(key)
+
+    @staticmethod
+    def __searchable_texts(record: UserRecord):
+        """Lowercased values of all fields used by search(), except phones"""
+        yield record.name.value.lower()
+        if record.birthday:
+            yield str(record.birthday.value).lower()
+        if record.emails:
+            yield from (email.lower() for email in record.emails)
+        if record.address:
+            yield record.address.value.lower()
+
+    @staticmethod
+    def __matches(record: UserRecord, pattern: str) -> bool:
+        return AddressBook.matches(pattern, record.name.value, record.phones or (),
+                                   str(record.birthday.value) if record.birthday else None,
+                                   record.emails or (), record.address.value if record.address else None)
+
+    @staticmethod
+    def matches(pattern: str, name: str, phones, birthday: str|None, emails, address: str|None) -> bool:
+        """Search predicate over plain field values, birthday is str() of the datetime.
+        Field order: name, phone, birthday, email, address"""
+        if name and pattern.lower() in name.lower():
+            return True
+        elif any(pattern in phone for phone in phones):
+            return True
+        elif birthday and pattern in birthday:
+            return True
+        elif any(pattern.lower() in email.lower() for email in emails):
+            return True
+        elif address and pattern.lower() in address.lower():
+            return True
+        return False
+
+    def __reindex(self, key):
+        """Called by the record after it was changed"""
+        self.__unindex(key)
+        self.__index(key)
+        self.__publish(key)
+
+    def __find_key(self, name: str) -> int|None:
+        keys = self.__names.get(name.lower())
+        # The oldest record wins if several contacts share the same name
+        return min(keys) if keys else None
+
     def add_record(self, record: UserRecord):
-        key = max(self.data.keys()) + 1 if self.data.keys() else 1 
+        key = self.user_id + 1
         if key in self.data:
             raise KeyError("Contact already exists")
-        self.data[key] = record
+        self[key] = record
 
     def find(self, name: str) -> UserRecord|None:
-        for key in self.data:
-            if name.lower() == self.data[key].name.value.lower():
-                return self.data[key]
-        return None
+        key = self.__find_key(name)
+        return self.data[key] if key is not None else None
 
     def search(self, pattern: str) -> List[UserRecord]:
-        result = []
-        for key in self.data:
-            if self.data[key].name and pattern.lower() in self.data[key].name.value.lower():
-                result.append(self.data[key])
-            elif self.data[key].phones and any(pattern in phone for phone in self.data[key].phones):
-                result.append(self.data[key])
-            elif self.data[key].birthday and pattern in str(self.data[key].birthday.value):
-                result.append(self.data[key])
-            elif self.data[key].emails and any(pattern.lower() in email.lower() for email in self.data[key].emails):
-                result.append(self.data[key])
-            elif self.data[key].address and pattern.lower() in self.data[key].address.value.lower():
-                result.append(self.data[key])
-        return result
+        candidates = self.__search_index.candidates(pattern.lower())
+        if candidates is not None:
+            candidates |= self.__phone_index.search(pattern)
+        # Keys grow monotonically, results are in the order of the keys with and without the index
+        keys = sorted(self.data if candidates is None else candidates)
+        return [self.data[key] for key in keys if self.__matches(self.data[key], pattern)]
+
+    def find_by_phone(self, phone: str) -> List[UserRecord]:
+        keys = self.__phone_index.find(Validator.normalize_phone(phone))
+        return [self.data[key] for key in sorted(keys)]
+
+    def search_by_phone(self, digits: str, suffix_only = False) -> List[UserRecord]:
+        keys = self.__phone_index.ends_with(digits) if suffix_only else self.__phone_index.search(digits)
+        return [self.data[key] for key in sorted(keys)]
 
     def delete(self, name: str):
-        contact = self.find(name)
-        if not contact:
+        key = self.__find_key(name)
+        if key is None:
             raise KeyError("Contact doesn\'t exist")
-        self.data = dict((key, val) for (key, val) in self.data.items() if val != contact)
+        del self[key]
 
-    def get_upcoming_birthdays(self, specific_date = None, days = 7) -> List[Dict[str, str]]:
-        congrats_list = []
-        today = datetime.strptime(specific_date, "%d.%m.%Y").date() if specific_date is not None else datetime.today().date()
-        users_with_bd = list(v for (k, v) in self.data.items() if v.birthday)
-        for user in users_with_bd:
-            original_date = user.birthday.value.date()
-            
-            # Get this year's date
+    @staticmethod
+    def congratulation_date(birthday: date, today: date) -> date:
+        """Date to congratulate on the next birthday from today, weekends are moved to Monday"""
+        # Get this year's date
+        try:
+            date_this_year = birthday.replace(year = today.year)
+        except ValueError:
+            # 29th of Feb in a non-leap year is congratulated on 1st of March, see birthday_ranges
+            date_this_year = date(year = today.year, month = 3, day = 1)
+
+        # Move those who had BD this year to a next year
+        if date_this_year < today:
             try:
-                date_this_year = original_date.replace(year = today.year)
-            except:
-                # TODO: Remove this after adding validation for birthdays at 02/29
-                #29th of Feb
-                date_this_year = datetime(year = today.year, month = 3, day = 1).date()
-            
-            # Move those who had BD this year to a next year
-            if date_this_year < today:
                 date_this_year = date_this_year.replace(year = today.year + 1)
-            
-            # Move weekenders to MON
-            if date_this_year.weekday() >= 5:
-                date_this_year += timedelta(days = 7 - date_this_year.weekday()) # Move 1 or 2 days forward
-            
-            if (date_this_year - today).days <= days:
-                #congratulations
-                congrats_list.append({"name":user.name, "congratulation_date":datetime.strftime(date_this_year, "%d.%m.%Y")})
-        return congrats_list
-
-   
\ No newline at end of file
+            except ValueError:
+                date_this_year = date(year = today.year + 1, month = 3, day = 1)
+
+        # Move weekenders to MON
+        if date_this_year.weekday() >= 5:
+            date_this_year += timedelta(days = 7 - date_this_year.weekday()) # Move 1 or 2 days forward
+        return date_this_year
+
+    @staticmethod
+    def parse_date(specific_date) -> date:
+        return datetime.strptime(specific_date, "%d.%m.%Y").date() if specific_date is not None else datetime.today().date()
+
+    @staticmethod
+    def birthday_ranges(today: date, days: int) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+        """Inclusive ((month, day), (month, day)) ranges of birthdays which can be congratulated within days from today.
+        29th of Feb is congratulated on 1st of March in non-leap years and has to be checked separately"""
+        if days < 0:
+            return []
+        # Weekend shift only moves dates forward, so candidates are birthdays within [today, today + days]
+        last_day = today + timedelta(days = days)
+        if days >= 365:
+            return [((1, 1), (12, 31))]
+        elif last_day.year == today.year:
+            return [((today.month, today.day), (last_day.month, last_day.day))]
+        return [((today.month, today.day), (12, 31)), ((1, 1), (last_day.month, last_day.day))]
+
+    def get_upcoming_birthdays(self, specific_date = None, days = 7) -> List[Dict[str, str]]:
+        columns = self.__columns_view()
+        if columns is not None:
+            return columns.get_upcoming_birthdays(specific_date, days)
+        return self.upcoming_birthdays(self.__birthdays_between, self.parse_date(specific_date), days)
+
+    def get_next_birthdays(self, count = 5, specific_date = None) -> List[Dict[str, str]]:
+        today = self.parse_date(specific_date)
+        keys = itertools.islice(self.__birthday_index.starting_from((today.month, today.day)), count)
+        return self.next_birthdays(self.__birthdays_between, {key: self.data[key] for key in keys}, today, count)
+
+    def get_birthdays_in_month(self, month: int) -> List[Dict[str, str]]:
+        columns = self.__columns_view()
+        if columns is not None:
+            return columns.get_birthdays_in_month(month)
+        return self.birthdays_in_month(month, lambda month: (self.data[key] for key in self.__birthday_index.in_month(month)))
+
+    def __birthdays_between(self, start: Tuple[int, int], end: Tuple[int, int]) -> Iterator[Tuple[int, UserRecord]]:
+        return ((key, self.data[key]) for key in self.__birthday_index.between(start, end))
+
+    # Birthday queries over plain values, the storage backends only select the candidates
+
+    @staticmethod
+    def upcoming_birthdays(between, today: date, days: int) -> List[Dict[str, str]]:
+        """get_upcoming_birthdays over between(start, end) -> (key, record) pairs with birthdays in the inclusive
+        range of (month, day)"""
+        ranges = AddressBook.birthday_ranges(today, days)
+        if not ranges:
+            return []
+        candidates = dict(between((2, 29), (2, 29)))
+        for start, end in ranges:
+            candidates.update(between(start, end))
+        upcoming = ((AddressBook.congratulation_date(candidates[key].birthday.value.date(), today), candidates[key])
+                    for key in sorted(candidates))
+        return AddressBook.congratulations((congratulation_date, user) for congratulation_date, user in upcoming
+                                           if (congratulation_date - today).days <= days)
+
+    @staticmethod
+    def next_birthdays(between, candidates: Dict[int, UserRecord], today: date, count: int) -> List[Dict[str, str]]:
+        """get_next_birthdays over candidates: dict key -> record, which has to contain the next count birthdays
+        in calendar order, and between(start, end) like in upcoming_birthdays.
+        A birthday after the last candidate can still be congratulated on the same day or earlier, when the candidate
+        is moved from a weekend to Monday: all birthdays up to the latest congratulation date of the candidates
+        are compared"""
+        if not candidates:
+            return []
+        last_date = max(AddressBook.congratulation_date(user.birthday.value.date(), today) for user in candidates.values())
+        candidates = dict(candidates)
+        candidates.update(between((2, 29), (2, 29)))
+        for start, end in AddressBook.birthday_ranges(today, (last_date - today).days):
+            candidates.update(between(start, end))
+        upcoming = sorted((AddressBook.congratulation_date(user.birthday.value.date(), today), key)
+                          for key, user in candidates.items())
+        return AddressBook.congratulations((congratulation_date, candidates[key])
+                                           for congratulation_date, key in upcoming[:count])
+
+    @staticmethod
+    def birthdays_in_month(month: int, in_month) -> List[Dict[str, str]]:
+        """get_birthdays_in_month over in_month(month) -> records with birthdays in the month in calendar order"""
+        if not 1 <= month <= 12:
+            raise ValueError("Month should be a number from 1 to 12")
+        return [{"name":user.name, "birthday":str(user.birthday)} for user in in_month(month)]
+
+    @staticmethod
+    def congratulations(dated_records) -> List[Dict[str, str]]:
+        """Rows of the birthday lists from (congratulation date, record) pairs"""
+        return [{"name":user.name, "congratulation_date":datetime.strftime(congratulation_date, "%d.%m.%Y")}
+                for congratulation_date, user in dated_records]
@@ -1,12 +1,19 @@
 import functools  # Metadata import from function into decorator
+import os
 
 from colorama import Fore, Style
 from prompt_toolkit import PromptSession  # For autocomplete commands
 
 from ccnb.src.AddressBook import AddressBook
 from ccnb.src.NoteBook import NoteBook
-from ccnb.src.data_base import DataBase, CorruptedFileException
+from ccnb.src.cipher import SessionCipher
+from ccnb.src.data_base import (DataBase, CorruptedFileException, SessionLockedException, AUTOSAVE_ENABLED,
+                                COLUMNS_MIN_SIZE, CONTACTS_SEGMENT, JOURNAL_ENABLED, NOTES_SEGMENT, STORAGE, WATCH_ENABLED)
 from ccnb.src.models import *
+from ccnb.src.Table import Table
+from ccnb.src.transfer import Transfer
+
+CONTACT_COLUMNS = (("Name", 20), ("Birthday", 12), ("Phone(s)", 20), ("Email(s)", 20), ("Address", 20))
 
 CMD_EXIT="exit"
 CMD_NA="n/a"
@@ -17,19 +24,39 @@ class Bot:
         current_user: str, current username
         address_book: AddressBook, instance of AddressBook
         note_book: NoteBook, instance of NoteBook
+            books are loaded from their segments when a command uses them for the first time
+        database: DataBase of the session, holds the books and the writer lock of the user's data
+        read_only: bool, True if data of the user is opened by another session, commands which change books are refused
+        watcher: Watcher|None, live reload of the changes made by the writer session, used for read-only sessions
+        journal: Journal|None, journal of changes, used for sessions without password
+        autosave: Autosave|None, background saving of the save file, used for sessions without journal and storage
+        cipher: SessionCipher|None, encryption of the save files with the password of the session
+        storage: SqliteStorage|RecordStore|None, storage of books with CCNB_STORAGE=sqlite or CCNB_STORAGE=mmap
     Methods have explanation in docstrings.
     """
     
     current_user: str
-    address_book: AddressBook
-    note_book: NoteBook
 
     def __init__(self, user_name: str):
         self.__current_user = Validator.normalize_username(user_name)
         (database, password) = DataBase.load_data(self.current_user)
-        self.address_book = database.address_book
-        self.note_book = database.note_book
+        self.database = database
         self.password = password
+        self.cipher = database.cipher
+        self.storage = database.storage
+        self.read_only = database.read_only
+        self.journal = None
+        if JOURNAL_ENABLED and not password and not self.storage and not self.read_only:
+            self.journal = DataBase.open_journal(self.current_user)
+            self.journal.attach(database.loaded(CONTACTS_SEGMENT), database.loaded(NOTES_SEGMENT))
+        self.autosave = None
+        if not self.journal and not self.storage and not self.read_only:
+            self.__start_autosave()
+        self.watcher = None
+        if self.read_only and WATCH_ENABLED:
+            self.watcher = DataBase.open_watcher(database)
+            self.watcher.attach(database.address_book, database.note_book)
+        self.__use_columns(database.loaded(CONTACTS_SEGMENT))
     
         self.addressbook_handlers = self.register_addressbook_handlers()
         self.note_handlers = self.register_note_handlers()
@@ -39,9 +66,43 @@ class Bot:
     def current_user(self):
         return self.__current_user
 
+    @property
+    def address_book(self) -> AddressBook:
+        address_book = self.database.loaded(CONTACTS_SEGMENT)
+        if address_book is None:
+            address_book = self.database.address_book
+            self.__attach(address_book=address_book)
+        return address_book
+
+    @property
+    def note_book(self) -> NoteBook:
+        note_book = self.database.loaded(NOTES_SEGMENT)
+        if note_book is None:
+            note_book = self.database.note_book
+            self.__attach(note_book=note_book)
+        return note_book
+
+    def __attach(self, address_book=None, note_book=None):
+        """Lazily loaded book joins the journal or autosave of the session"""
+        if self.journal:
+            self.journal.attach(address_book, note_book)
+        if self.autosave:
+            self.autosave.attach(address_book, note_book)
+        self.__use_columns(address_book)
+
+    @staticmethod
+    def __use_columns(address_book):
+        """Big address books answer birthday queries with the NumPy view if CCNB_COLUMNS is set"""
+        if COLUMNS_MIN_SIZE is None or not isinstance(address_book, AddressBook):
+            return
+        try:
+            address_book.use_columns(COLUMNS_MIN_SIZE)
+        except ImportError:
+            print(Fore.RED + "[ERROR] " + Fore.YELLOW + "CCNB_COLUMNS needs numpy (pip install ccnb[columns])" + Fore.RESET)
+
     @current_user.setter
     def current_user(self, user_name):
-        # TODO: Validation of user_name place here
+        # Username is validated and normalized once in __init__, it doesn't change during the session
         pass
 
     @staticmethod
@@ -60,6 +121,17 @@ class Bot:
                 return Fore.YELLOW + "; ".join(e.args)
         return inner
 
+    @staticmethod
+    def requires_writer(func):
+        """Decorator for commands which change the books, they are refused in read-only sessions"""
+
+        @functools.wraps(func)
+        def inner(self, *args, **kwargs):
+            if self.read_only:
+                raise ValueError(f"Data of {self.current_user} is opened by another session, this session is read-only.")
+            return func(self, *args, **kwargs)
+        return inner
+
     @staticmethod
     #returns command key and args if any
     def parse_input(inp: str) -> tuple[str, str, str] | tuple[str, Any]:
@@ -88,7 +160,7 @@ class Bot:
             bot = Bot(input("Enter login >>> "))
             # First should be addressbook
             bot.addressbook_mode()
-        except CorruptedFileException as err:
+        except (CorruptedFileException, SessionLockedException) as err:
             print(f"Could not open save file. Error: {err}")
             return None
         except Exception as err:
@@ -138,7 +210,9 @@ class Bot:
             if command in ["exit", "close"]:
                 exit_ = True
             if command in handlers:
-                print(handlers[command](args) + Style.RESET_ALL)
+                self.reload_changes()
+                self.print_output(handlers[command](args))
+                self.commit_changes()
             else:
                 print(f"{Fore.RED}Unknown command!{Style.RESET_ALL}")
         
@@ -180,12 +254,66 @@ class Bot:
             if command in ["exit", "close", "main"]:
                 exit_ = True
             elif command in handlers:
-                print(handlers[command](args) + Style.RESET_ALL)
+                self.reload_changes()
+                self.print_output(handlers[command](args))
+                self.commit_changes()
             else:
                 print(f"{Fore.RED}Unknown command!{Style.RESET_ALL}")
                 
         return "Navigated back to main menu."
 
+    @staticmethod
+    def print_output(output: str | Table):
+        """Print handler result. Tables are streamed row by row"""
+        if isinstance(output, Table):
+            # Rows are built while the table is written, after the handler has returned.
+            # Their errors are shown as errors of the command
+            print(Bot.input_error(output.write)() + Style.RESET_ALL)
+        else:
+            print(output + Style.RESET_ALL)
+
+    def commit_changes(self):
+        """Persist changes of the last command to the journal or database, if any"""
+        if self.journal:
+            self.journal.commit()
+        if self.storage:
+            self.storage.commit()
+        if self.autosave:
+            self.autosave.commit()
+            self.__print_errors(self.autosave.take_errors())
+
+    @staticmethod
+    def __print_errors(errors):
+        """Errors of the background threads are printed by the prompt thread between commands"""
+        for error in errors:
+            print(Fore.RED + "[ERROR] " + Fore.YELLOW + error + Fore.RESET)
+
+    def reload_changes(self):
+        """Merge changes of the writer session into the books of a read-only session before the next command"""
+        if self.watcher:
+            changed = self.watcher.apply()
+            if changed:
+                print(Fore.BLUE + "[INFO] " + Fore.YELLOW + f"Records changed by another session: {changed}" + Fore.RESET)
+            self.__print_errors(self.watcher.take_errors())
+
+    def __start_autosave(self):
+        if AUTOSAVE_ENABLED:
+            self.autosave = DataBase.open_autosave(self.current_user, self.password, self.cipher)
+            self.autosave.attach(self.database.loaded(CONTACTS_SEGMENT), self.database.loaded(NOTES_SEGMENT))
+
+    def __stop_autosave(self):
+        """Waits for the running autosave, the caller saves the rest"""
+        if self.autosave:
+            self.autosave.close()
+            self.autosave.detach()
+            self.__print_errors(self.autosave.take_errors())
+            # Values taken by attach() and all later changes are in the segments
+            if self.autosave.saves and self.autosave.saved:
+                for segment in (CONTACTS_SEGMENT, NOTES_SEGMENT):
+                    if self.database.loaded(segment) is not None:
+                        self.database.loaded(segment).mark_saved()
+            self.autosave = None
+
     @input_error
     def say_hello(self, *args) -> str:
         """hello, Greet the bot."""
@@ -196,10 +324,33 @@ class Bot:
     @input_error
     def finalize(self, *args) -> str:
         """exit || close, Exit the bot."""
-        DataBase.save_data(self.address_book, self.note_book, self.current_user, self.password)
+        if self.read_only:
+            # Books of a read-only session are never changed, the writer saves the data
+            if self.watcher:
+                self.watcher.close()
+                self.watcher = None
+            return "Good bye!"
+        if self.journal:
+            # All changes are already in the journal
+            self.journal.close()
+            self.journal.detach()
+            self.journal = None
+        elif self.storage:
+            self.storage.close()
+            self.storage = None
+        else:
+            self.__stop_autosave()
+            # Segments are rewritten as a whole, only changed ones are written, books which were not loaded are unchanged
+            address_book, note_book = self.database.loaded(CONTACTS_SEGMENT), self.database.loaded(NOTES_SEGMENT)
+            if DataBase.needs_save(address_book, note_book, self.current_user, self.password):
+                DataBase.save_data(address_book, note_book, self.current_user, self.password, self.cipher)
+        if self.database.lock:
+            # Next session of the user can write
+            self.database.lock.release()
         return "DB is saved. Good bye!"
 
     @input_error
+    @requires_writer
     def add_contact(self, *args) -> str:
         """add [name] [phone], Add a new contact."""
         if len(*args) != 2:
@@ -230,28 +381,43 @@ class Bot:
 
         search_result = self.address_book.search(pattern)
         if search_result:
-            return str.join("\n\n", [str(contact) for contact in self.address_book.search(pattern)])
+            return str.join("\n\n", [str(contact) for contact in search_result])
         return "No matches"
 
     @input_error
-    def get_all(self, *args) -> str:
-        """all, Show all contacts."""
-        if len(*args):
-            raise IndexError("\"all\" doesn\'t need arguments")
+    def reverse_phone(self, *args) -> str:
+        """reverse-phone [phone], Show contacts by full phone number or by its last digits."""
+        if len(*args) < 1:
+            raise IndexError("Incorrect number of arguments" + Fore.YELLOW + " Please try \"reverse-phone _phone_\"")
+        phone = "".join(args[0])
+        try:
+            contacts = self.address_book.find_by_phone(phone)
+        except ValueError:
+            # Not a full number, treat it as the last digits
+            if not phone.isdigit():
+                raise ValueError(f"{phone} is neither a phone number nor digits")
+            contacts = self.address_book.search_by_phone(phone, suffix_only=True)
+        if not contacts:
+            raise KeyError("No matches")
+        return str.join("\n\n", [str(contact) for contact in contacts])
+
+    @input_error
+    def get_all(self, *args) -> str | Table:
+        """all [--page N] [--limit N], Show all contacts. (optional) show only N contacts of the page"""
+        rest, page, limit = Table.parse_page_args(args[0])
+        if len(rest):
+            raise IndexError("\"all\" only accepts --page and --limit arguments")
         if len(self.address_book) == 0:
             return "It\'s lonely here:( Please use \"add\" command"
-        result_str = "{:<20} {:<12} {:<20} {:<20} {:<20}\n".format("Name", "Birthday", "Phone(s)", "Email(s)",
-                                                                   "Address")
-        for k, user in self.address_book.items():
-            result_str += "{:<20} {:<12} {:<20} {:<20} {:<20}\n".format(
-                str(user.name),
-                str(user.birthday) if user.birthday else 'Not set',
-                UserRecord.truncate_list_of_recs(user.phones),
-                UserRecord.truncate_list_of_recs(user.emails),
-                str(user.address) if user.address else 'Not set')
-        return result_str
+        rows = ((str(user.name),
+                 str(user.birthday) if user.birthday else 'Not set',
+                 UserRecord.truncate_list_of_recs(user.phones),
+                 UserRecord.truncate_list_of_recs(user.emails),
+                 str(user.address) if user.address else 'Not set') for user in self.address_book.values())
+        return Table(CONTACT_COLUMNS, rows).paginate(page, limit)
 
     @input_error
+    @requires_writer
     def add_birthday(self, *args) -> str:
         """add-birthday [name] [DD.MM.YYYY], Add birthday to existing contact."""
         if len(*args) != 2:
@@ -294,6 +460,28 @@ class Bot:
         return result_str
 
     @input_error
+    def next_birthdays(self, *args) -> str:
+        """next-birthdays [count], Show next birthdays. (optional) number of contacts, 5 by default"""
+        if len(*args) > 1:
+            raise IndexError("\"next-birthdays\" can only accept 1 argument - number of contacts")
+        count = int(args[0][0]) if args[0] else 5
+        birth_dict = self.address_book.get_next_birthdays(count)
+        if not birth_dict:
+            raise KeyError("Nothing to show")
+        return "".join(f"{str(bd['name']) : <20}{bd['congratulation_date'] : <20}\n" for bd in birth_dict)
+
+    @input_error
+    def birthdays_in_month(self, *args) -> str:
+        """birthdays-in [month], Show birthdays in the month (1-12)."""
+        if len(*args) != 1:
+            raise IndexError("Incorrect number of arguments" + Fore.YELLOW + " Please try \"birthdays-in _month_\"")
+        birth_dict = self.address_book.get_birthdays_in_month(int(args[0][0]))
+        if not birth_dict:
+            raise KeyError("Nothing to show")
+        return "".join(f"{str(bd['name']) : <20}{bd['birthday'] : <20}\n" for bd in birth_dict)
+
+    @input_error
+    @requires_writer
     def add_email(self, *args) -> str:
         """add-email [name] [email], Add email to existing contact."""
         if len(*args) != 2:
@@ -308,6 +496,7 @@ class Bot:
         return "Contact updated."
 
     @input_error
+    @requires_writer
     def add_address(self, *args) -> str:
         """add-address [name] [address], Add address to existing contact."""
         if len(*args) < 2:
@@ -324,6 +513,7 @@ class Bot:
         return "Contact updated."
 
     @input_error
+    @requires_writer
     def edit_contact(self, *args) -> str:
         """edit [name] [field], Edit contact information."""
         if len(*args) < 2:
@@ -362,6 +552,7 @@ class Bot:
         return "Contact updated\n"
 
     @input_error
+    @requires_writer
     def delete_record(self, *args) -> str:
         """delete [name], Delete contact."""
         name, *_ = args[0]
@@ -369,21 +560,83 @@ class Bot:
         return f"Contact {name} removed."
     
     @input_error
+    @requires_writer
     def set_password(self, *args) -> str:
         """set-password [new_pass], Set password."""
         if len(*args) < 1:
             raise ValueError("Password can\'t be empty.")
         new_passwd = " ".join(args[0])
+        if self.storage:
+            raise ValueError(f"Password is not supported with CCNB_STORAGE={STORAGE}")
 
         delete_unenctypted = (new_passwd and not self.password) # delete old file .pkl if password is set
 
+        # Both books are written with the new password, they are read with the old one
+        address_book, note_book = self.address_book, self.note_book
         self.password = new_passwd
-        DataBase.save_data(self.address_book, self.note_book, self.current_user, self.password)
+        self.cipher = self.database.cipher = SessionCipher(new_passwd)
+        if self.journal:
+            # Encrypted save has no journal, save_data removes the old one
+            self.journal.close()
+            self.journal.detach()
+            self.journal = None
+        self.__stop_autosave()
+        DataBase.save_data(address_book, note_book, self.current_user, self.password, self.cipher, only_changed=False)
         if delete_unenctypted:
             DataBase.delete_unencrypted_save(self.current_user)
+        self.__start_autosave()
         return f"Password changed successfully."
     
     @input_error
+    @requires_writer
+    def import_contacts(self, *args) -> str:
+        """import [file], Import contacts from a .csv or .vcf file. Rejected rows are written to [file].rejects.jsonl"""
+        filepath = self.__transfer_path(args[0], "import")
+        imported, rejected = self.__transfer(Transfer.import_contacts, self.address_book, filepath, on_batch=self.commit_changes)
+        return self.__import_result(imported, rejected, "contacts", filepath)
+
+    @input_error
+    def export_contacts(self, *args) -> str:
+        """export [file], Export all contacts to a .csv or .vcf file."""
+        filepath = self.__transfer_path(args[0], "export")
+        return f"{self.__transfer(Transfer.export_contacts, self.address_book, filepath)} contacts exported to {filepath}"
+
+    @input_error
+    @requires_writer
+    def import_notes(self, *args) -> str:
+        """import [file], Import notes from a .jsonl or .md file. Rejected notes are written to [file].rejects.jsonl"""
+        filepath = self.__transfer_path(args[0], "import")
+        imported, rejected = self.__transfer(Transfer.import_notes, self.note_book, filepath, on_batch=self.commit_changes)
+        return self.__import_result(imported, rejected, "notes", filepath)
+
+    @input_error
+    def export_notes(self, *args) -> str:
+        """export [file], Export all notes to a .jsonl or .md file."""
+        filepath = self.__transfer_path(args[0], "export")
+        return f"{self.__transfer(Transfer.export_notes, self.note_book, filepath)} notes exported to {filepath}"
+
+    @staticmethod
+    def __transfer_path(args, command: str) -> str:
+        if len(args) < 1:
+            raise IndexError("Incorrect number of arguments" + Fore.YELLOW + f" Please try \"{command} _file_\"")
+        return os.path.expanduser(" ".join(args))
+
+    @staticmethod
+    def __transfer(method, book, filepath: str, **kwargs):
+        try:
+            return method(book, filepath, **kwargs)
+        except OSError as error:
+            raise ValueError(f"Could not open {error.filename or filepath}: {error.strerror}")
+
+    @staticmethod
+    def __import_result(imported: int, rejected: int, kind: str, filepath: str) -> str:
+        result = f"{imported} {kind} imported."
+        if rejected:
+            result += Fore.YELLOW + f" {rejected} rejected, see {filepath + Transfer.REJECT_SUFFIX}"
+        return result
+
+    @input_error
+    @requires_writer
     def add_note(self, *args):
         """add [title] [content], Add a new note."""
         if len(*args) < 2:
@@ -393,6 +646,7 @@ class Bot:
         return self.note_book.add_note(title, content)
 
     @input_error
+    @requires_writer
     def edit_note(self, *args):
         """edit [title] [new_content], Edit an existing note."""
         args = " ".join(args[0]).split(" ") #Workaround for Edit command.
@@ -403,6 +657,7 @@ class Bot:
         return self.note_book.edit_note(title, new_content)
 
     @input_error
+    @requires_writer
     def delete_note(self, *args):
         """delete [title], Delete an existing note."""
         if len(*args) < 1:
@@ -412,18 +667,22 @@ class Bot:
 
     @input_error
     def search_notes(self, *args):
-        """search [keyword], Search for notes by keyword."""
-        if len(*args) < 1:
+        """search [keyword] [--page N] [--limit N], Search notes by keywords, best first, then notes containing it."""
+        keywords, page, limit = Table.parse_page_args(args[0])
+        if len(keywords) < 1:
             return "Usage: search-notes [keyword]"
-        keyword = " ".join(*args)
-        return self.note_book.search_notes(keyword)
+        keyword = " ".join(keywords)
+        # Only the notes up to the requested page are ranked
+        return self.note_book.search_notes(keyword, page * limit if limit else None).paginate(page, limit)
 
     @input_error
     def show_all_notes(self, *args):
-        """all, Show all notes."""
-        return self.note_book.show_all_notes()
+        """all [--page N] [--limit N], Show all notes."""
+        _, page, limit = Table.parse_page_args(args[0])
+        return self.note_book.show_all_notes().paginate(page, limit)
     
     @input_error
+    @requires_writer
     def add_tags(self, *args):
         """add-tags [title] [tag1 tag2 ...], Add tags to the note. All tags should be separated by space."""
         if len(*args) < 2:
@@ -432,6 +691,7 @@ class Bot:
         return self.note_book.add_tags_to_note(title, tags)
 
     @input_error
+    @requires_writer
     def remove_tag(self, *args):
         """remove-tag [title] [tag1 tag2 ...], Remove certain tags from the note. All tags should be separated by space."""
         if len(*args) < 2:
@@ -441,21 +701,28 @@ class Bot:
 
     @input_error
     def search_by_tags(self, *args):
-        """search-by-tags [tag1 tag2 ...], Show notes filtered by tags count. All tags should be separated by space."""
-        if len(*args) < 1:
+        """search-by-tags [tag1 tag2 ...] [--page N] [--limit N], Show notes filtered by tags count. All tags should be separated by space."""
+        tags, page, limit = Table.parse_page_args(args[0])
+        if len(tags) < 1:
             return "Usage: search-by-tags [tag1 tag2 ...]"
-        tags = args[0]
-        return self.note_book.search_notes_by_tags(tags)
+        return self.note_book.search_notes_by_tags(tags).paginate(page, limit)
     
+    @input_error
+    def show_tags(self, *args):
+        """tags, Show all tags with number of notes."""
+        return self.note_book.show_tag_counts()
+
     @input_error
     def sort_notes_by_tag_count(self, *args):
-        """sort-by-tags-count, Show notes sorted by tags count."""
-        return self.note_book.sort_notes_by_tag_count()
+        """sort-by-tags-count [--page N] [--limit N], Show notes sorted by tags count."""
+        _, page, limit = Table.parse_page_args(args[0])
+        return self.note_book.sort_notes_by_tag_count().paginate(page, limit)
 
     @input_error
     def sort_notes_by_tags_alphabetically(self, *args):
-        """sort-by-tags-alphabetically, Show notes sorted by tags alphabetically."""
-        return self.note_book.sort_notes_by_tags_alphabetically()
+        """sort-by-tags-alphabetically [--page N] [--limit N], Show notes sorted by tags alphabetically."""
+        _, page, limit = Table.parse_page_args(args[0])
+        return self.note_book.sort_notes_by_tags_alphabetically().paginate(page, limit)
     
     @input_error
     def help_text_addressbook(self, *args):
@@ -485,12 +752,17 @@ class Bot:
         funcs["show-birthday"] = self.show_birthday
         funcs["all"] = self.get_all
         funcs["birthdays"] = self.birthdays
+        funcs["next-birthdays"] = self.next_birthdays
+        funcs["birthdays-in"] = self.birthdays_in_month
         funcs["add-email"] = self.add_email
         funcs["add-address"] = self.add_address
         funcs["search"] = self.search_contact
+        funcs["reverse-phone"] = self.reverse_phone
         funcs["edit"] = self.edit_contact
         funcs["delete"] = self.delete_record
         funcs["set-password"] = self.set_password
+        funcs["import"] = self.import_contacts
+        funcs["export"] = self.export_contacts
         funcs["exit"] = self.finalize
         funcs["close"] = self.finalize
         funcs["help"] = self.help_text_addressbook
@@ -506,9 +778,12 @@ class Bot:
         funcs["remove-tag"] = self.remove_tag
         funcs["search"] = self.search_notes
         funcs["search-by-tags"] = self.search_by_tags
+        funcs["tags"] = self.show_tags
         funcs["all"] = self.show_all_notes
         funcs["sort-by-tags-count"] = self.sort_notes_by_tag_count
         funcs["sort-by-tags-alphabetically"] = self.sort_notes_by_tags_alphabetically
+        funcs["import"] = self.import_notes
+        funcs["export"] = self.export_notes
         funcs["help"] = self.help_text_notebook
         funcs["exit"] = self.stop_notebook
         funcs["close"] = self.stop_notebook
@@ -1,7 +1,13 @@
+import functools
+import itertools
 from collections import UserDict
-from typing import List
+from typing import Iterator, List, Set, Tuple
 
+from ccnb.src.indexes import SortedView, TagIndex, TextIndex
 from ccnb.src.models import Note
+from ccnb.src.Table import Table
+
+NOTE_COLUMNS = (("Title", 20), ("Content", 40), ("Tags", 20))
 
 
 class NoteBook(UserDict):
@@ -10,140 +16,233 @@ class NoteBook(UserDict):
         - add_note(title: str, content: str) -> str
         - edit_note(title: str, new_content: str) -> str
         - delete_note(title: str) -> str
-        - search_notes(keyword: str) -> str
-            searches for notes by keyword in the content. partial match non-case-sensitive
-        - show_all_notes() -> str
+        - search_notes(keyword: str, limit: int = None) -> Table
+            searches for notes by words in the title, content and tags. Non-case-sensitive, words match as prefixes.
+            Results are ranked by BM25 score, at most limit notes are shown (all by default).
+            Other notes containing keyword as a substring follow in the order of the book, e.g. "port" finds "report"
+        - show_all_notes() -> Table
         - add_tags_to_note(title: str, tags: List[str]) -> str
         - remove_tag_from_note(title: str, tag: str) -> str
-        - search_notes_by_tags(tags: List[str]) -> str
+        - search_notes_by_tags(tags: List[str]) -> Table
             searches for notes by tags. full match required
+        - count_notes_by_tag(tag: str) -> int
+        - show_tag_counts() -> Table
+        - sort_notes_by_tag_count() -> Table
+        - sort_notes_by_tags_alphabetically() -> Table
+        - subscribe(callback) / unsubscribe(callback)
+            callback(title, note) is called after every change, note is None for deleted ones
+        - changed_titles / deleted_titles -> Set[str]
+            titles of notes added or changed / deleted since the last mark_saved()
+        - has_changes() -> bool
+        - mark_saved()
+            called by persistence after the book was saved, clears the sets and dirty flags of changed notes
+    Listings are returned as lazy Table objects, str(table) gives the whole text
+    Indexes are kept in sync by __setitem__/__delitem__ and by the notes themselves (see Note.set_listener):
+        - text index: TextIndex over title, content and tags
+        - tag index: TagIndex from tag to note ids. Note id is given on insertion, so ids keep the order of notes
+        - sorted views: SortedView of note ids by tags count and by sorted tags, used by the sort commands
     """
     def __init__(self):
+        self.__text_index = TextIndex()
+        self.__tag_index = TagIndex()
+        self.__ids = {}     # title -> note id
+        self.__titles = {}  # note id -> title
+        self.__last_id = 0
+        self.__sorted_tags = {}  # note id -> tuple of sorted tags, for display in the sort commands
+        self.__by_tag_count = SortedView()
+        self.__by_tags = SortedView()
+        self.__subscribers = []
+        self.__changed = set()  # titles added or changed since mark_saved()
+        self.__deleted = set()  # titles deleted since mark_saved()
         super().__init__()
 
-    def add_note(self, title: str, content: str) -> str:
+    def __getstate__(self):
+        # Indexes are not saved, they are rebuilt after loading
+        return {"data": self.data}
+
+    def __setstate__(self, state):
+        self.__text_index = TextIndex()
+        self.__tag_index = TagIndex()
+        self.__ids = {}
+        self.__titles = {}
+        self.__last_id = 0
+        self.__sorted_tags = {}
+        self.__by_tag_count = SortedView()
+        self.__by_tags = SortedView()
+        self.__subscribers = []
+        self.__changed = set()
+        self.__deleted = set()
+        self.data = {}
+        for title, note in state["data"].items():
+            self[title] = note
+        self.mark_saved()
+
+    def __setitem__(self, title, note: Note):
         if title in self.data:
+            del self[title]
+        self.data[title] = note
+        self.__last_id += 1
+        self.__ids[title] = self.__last_id
+        self.__titles[self.__last_id] = title
+        self.__index(title)
+        note.set_listener(functools.partial(self.__reindex, title))
+        self.__publish(title)
+
+    def __delitem__(self, title):
+        self.__unindex(title)
+        del self.__titles[self.__ids.pop(title)]
+        self.data[title].set_listener(None)
+        del self.data[title]
+        self.__publish(title)
+
+    def subscribe(self, callback):
+        """Register callback(title, note) called after a note is added, changed or deleted (note is None)"""
+        self.__subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.__subscribers.remove(callback)
+
+    def __publish(self, title):
+        if title in self.data:
+            self.__changed.add(title)
+            self.__deleted.discard(title)
+        else:
+            self.__changed.discard(title)
+            self.__deleted.add(title)
+        for callback in self.__subscribers:
+            callback(title, self.data.get(title))
+
+    @property
+    def changed_titles(self) -> Set[str]:
+        return set(self.__changed)
+
+    @property
+    def deleted_titles(self) -> Set[str]:
+        return set(self.__deleted)
+
+    def has_changes(self) -> bool:
+        return bool(self.__changed or self.__deleted)
+
+    def mark_saved(self):
+        for title in self.__changed:
+            self.data[title].mark_clean()
+        self.__changed.clear()
+        self.__deleted.clear()
+
+    def __index(self, title):
+        note = self.data[title]
+        self.__text_index.add(title, [note.title.value, note.content.value, *note.tags.value])
+        note_id = self.__ids[title]
+        self.__tag_index.add(note_id, note.tags.value)
+        sorted_tags = tuple(sorted(note.tags.value))
+        self.__sorted_tags[note_id] = sorted_tags
+        # Most tags first, notes without tags at the end
+        self.__by_tag_count.add(note_id, -len(sorted_tags))
+        self.__by_tags.add(note_id, (len(sorted_tags) == 0, sorted_tags))
+
+    def __unindex(self, title):
+        note_id = self.__ids[title]
+        self.__text_index.remove(title)
+        self.__tag_index.remove(note_id)
+        del self.__sorted_tags[note_id]
+        self.__by_tag_count.remove(note_id)
+        self.__by_tags.remove(note_id)
+
+    def __reindex(self, title):
+        """Called by the note after it was changed"""
+        self.__unindex(title)
+        self.__index(title)
+        self.__publish(title)
+
+    # Commands and listings below use only the mapping interface and the queries, the storage backends share them
+
+    def add_note(self, title: str, content: str) -> str:
+        if title in self:
             return "Note with this title already exists."
-        self.data[title] = Note(title, content)
+        self[title] = Note(title, content)
         return f"Note '{title}' added successfully."
 
     def edit_note(self, title: str, new_content: str) -> str:
-        if title not in self.data:
+        if title not in self:
             return "Note not found."
-        self.data[title].edit_content(new_content)
+        self[title].edit_content(new_content)
         return f"Note '{title}' edited successfully."
 
     def delete_note(self, title: str) -> str:
-        if title not in self.data:
+        if title not in self:
             return "Note not found."
-        del self.data[title]
+        del self[title]
         return f"Note '{title}' deleted successfully."
 
-    def search_notes(self, keyword: str) -> str:
-        found_notes = {title: note for title, note in self.data.items() if note.search_by_keyword(keyword)}
-        if not found_notes:
-            return "No notes found."
-        
-        result_str = "{:<20} {:<40} {:<20}\n".format("Title", "Content", "Tags")
-        for k, note in found_notes.items():
-            tags_str = ', '.join(note.tags.value) if note.tags.value else 'No tags'
-            result_str += "{:<20} {:<40} {:<20}\n".format(
-                str(note.title), 
-                str(note.content),
-                tags_str
-            )
-        return result_str
-
-    def show_all_notes(self) -> str:
-        if not self.data:
-            return "No notes available."
-        # TODO: prettify output
-        result_str = "{:<20} {:<40} {:<20}\n".format("Title", "Content", "Tags")
-        for k, note in self.data.items():
-            tags_str = ', '.join(note.tags.value) if note.tags.value else 'No tags'
-            result_str += "{:<20} {:<40} {:<20}\n".format(
-                str(note.title), 
-                note.content.short_string(),
-                tags_str
-            )
-        return result_str
-    
+    def search_notes(self, keyword: str, limit: int = None) -> Table:
+        found_notes = [self.data[title] for title, _ in self.__text_index.search(keyword, limit)]
+        return self.search_table(found_notes, keyword, self.data.values(), limit)
+
+    def show_all_notes(self) -> Table:
+        # Content is shortened, search_notes shows notes in full
+        return NoteBook.notes_table(((note, note.tags.value) for note in self.values()), "No notes available.",
+                                    short_content=True)
+
     def add_tags_to_note(self, title: str, tags: List[str]) -> str:
-        if title not in self.data:
+        if title not in self:
             return "Note not found."
+        note = self[title]
         for tag in tags:
-            self.data[title].add_tag(tag)
+            note.add_tag(tag)
         return f"Tags '{', '.join(tags)}' added to note '{title}'."
 
     def remove_tag_from_note(self, title: str, tag: str) -> str:
-        if title not in self.data:
+        if title not in self:
             return "Note not found."
-        self.data[title].remove_tag(tag)
+        self[title].remove_tag(tag)
         return f"Tag '{tag}' removed from note '{title}'."
 
-    def search_notes_by_tags(self, tags: List[str]) -> str:
-        found_notes = {
-            title: note for title, note in self.data.items()
-            if all(tag in note.tags.value for tag in tags)
-        }
-        if not found_notes:
-            return f"No notes found with tags {', '.join(tags)}."
-
-        result_str = "{:<20} {:<40} {:<20}\n".format("Title", "Content", "Tags")
-        for k, note in found_notes.items():
-            tags_str = ', '.join(note.tags.value) if note.tags.value else 'No tags'
-            result_str += "{:<20} {:<40} {:<20}\n".format(
-                str(note.title), 
-                str(note.content),
-                tags_str
-            )
-        return result_str
-    
-    def sort_notes_by_tag_count(self) -> str:
+    def search_notes_by_tags(self, tags: List[str]) -> Table:
+        found_ids = sorted(self.__tag_index.match_all(tags))
+        found_notes = (self.data[self.__titles[note_id]] for note_id in found_ids)
+        return self.notes_table(((note, note.tags.value) for note in found_notes),
+                                  f"No notes found with tags {', '.join(tags)}.")
+
+    def count_notes_by_tag(self, tag: str) -> int:
+        return self.__tag_index.count(tag)
+
+    def show_tag_counts(self) -> Table:
+        return self.tag_counts_table(self.__tag_index.counts().items())
+
+    def iter_notes_by_tag_count(self) -> Iterator[Tuple[Note, Tuple[str, ...]]]:
+        """Yields (note, sorted tags) in order of sort_notes_by_tag_count"""
+        return ((self.data[self.__titles[note_id]], self.__sorted_tags[note_id]) for note_id in self.__by_tag_count)
+
+    def iter_notes_by_tags_alphabetically(self) -> Iterator[Tuple[Note, Tuple[str, ...]]]:
+        """Yields (note, sorted tags) in order of sort_notes_by_tags_alphabetically"""
+        return ((self.data[self.__titles[note_id]], self.__sorted_tags[note_id]) for note_id in self.__by_tags)
+
+    def sort_notes_by_tag_count(self) -> Table:
         """Сортування нотаток за кількістю тегів, найбільша кількість на початку, без тегів в кінці, без зміни оригінальних тегів"""
-        
-        # Сортуємо нотатки за кількістю тегів, з найбільшою кількістю на початку, нотатки без тегів в кінці
-        sorted_notes = sorted(
-            self.data.items(),
-            key=lambda item: len(item[1].tags.value),
-            reverse=True
-        )
-
-        if not sorted_notes:
-            return "No notes available for sorting."
-
-        result_str = "{:<20} {:<40} {:<20}\n".format("Title", "Content", "Tags")
-        for k, note in sorted_notes:
-            # Використовуємо копію тегів для сортування, не змінюючи оригінальний список тегів
-            sorted_tags = sorted(note.tags.value)
-            tags_str = ', '.join(sorted_tags) if sorted_tags else 'No tags'
-            result_str += "{:<20} {:<40} {:<20}\n".format(
-                str(note.title),
-                str(note.content),
-                tags_str
-            )
-        return result_str
-
-    def sort_notes_by_tags_alphabetically(self) -> str:
+        return NoteBook.notes_table(self.iter_notes_by_tag_count(), "No notes available for sorting.")
+
+    def sort_notes_by_tags_alphabetically(self) -> Table:
         """Сортування нотаток за алфавітним порядком тегів, нотатки без тегів в кінці, без зміни оригінальних тегів"""
-        
-        # Сортуємо нотатки: спочатку ті, що з тегами, потім за алфавітом тегів
-        sorted_notes = sorted(
-            self.data.items(),
-            key=lambda item: (len(item[1].tags.value) == 0, sorted(item[1].tags.value))
-        )
-
-        if not sorted_notes:
-            return "No notes available for sorting."
-
-        result_str = "{:<20} {:<40} {:<20}\n".format("Title", "Content", "Tags")
-        for k, note in sorted_notes:
-            # Використовуємо копію тегів для сортування, не змінюючи оригінальний список тегів
-            sorted_tags = sorted(note.tags.value)
-            tags_str = ', '.join(sorted_tags) if sorted_tags else 'No tags'
-            result_str += "{:<20} {:<40} {:<20}\n".format(
-                str(note.title),
-                str(note.content),
-                tags_str
-            )
-        return result_str
+        return NoteBook.notes_table(self.iter_notes_by_tags_alphabetically(), "No notes available for sorting.")
+
+    @staticmethod
+    def search_table(found_notes: List[Note], keyword: str, notes, limit: int = None) -> Table:
+        """Table of the notes ranked by the text index followed by the other notes containing keyword as a substring,
+        as words of the index only match from their start"""
+        found_titles = {note.title.value for note in found_notes}
+        substring_notes = (note for note in notes if note.title.value not in found_titles and note.search_by_keyword(keyword))
+        found_notes = itertools.islice(itertools.chain(found_notes, substring_notes), limit)
+        return NoteBook.notes_table(((note, note.tags.value) for note in found_notes), "No notes found.")
+
+    @staticmethod
+    def tag_counts_table(tag_counts) -> Table:
+        """Table of (tag, number of notes) pairs, most used tags first"""
+        return Table((("Tag", 20), ("Notes", 10)), sorted(tag_counts, key=lambda item: (-item[1], item[0])), "No tags available.")
+
+    @staticmethod
+    def notes_table(notes, empty_message: str, short_content = False) -> Table:
+        """Table of (note, tags) pairs"""
+        rows = ((str(note.title),
+                 note.content.short_string() if short_content else str(note.content),
+                 ', '.join(tags) if tags else 'No tags') for note, tags in notes)
+        return Table(NOTE_COLUMNS, rows, empty_message)
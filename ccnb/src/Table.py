@@ -0,0 +1,80 @@
+import itertools
+import sys
+from typing import Iterable, Iterator, List, Sequence, Tuple
+
+
+class Table:
+    """Lazy text table. Rows are formatted only while the table is written,
+    so big tables start printing immediately and are never built as one string.
+    __init__:
+        columns: Sequence[Tuple[str, int]]
+            column headers with their widths
+        rows: Iterable[Sequence]
+            row cells, converted with str(). Rows are read once
+        empty_message: str
+            shown instead of the table if there are no rows
+    Methods:
+        paginate(page: int = 1, limit: int = None) -> Table
+            shows only rows of the page, limit is a number of rows per page
+        lines() -> Iterator[str]
+            header and rows as text lines ending with new line
+        write(stream = sys.stdout)
+            writes lines in chunks of BUFFER_LINES and flushes after each chunk
+        parse_page_args(args: List[str]) -> (List[str], int, int|None)
+            splits --page N and --limit N out of command arguments
+    """
+    BUFFER_LINES = 200
+
+    def __init__(self, columns: Sequence[Tuple[str, int]], rows: Iterable[Sequence], empty_message: str = "Nothing to show"):
+        self.row_format = " ".join("{:<%d}" % width for _, width in columns) + "\n"
+        self.header = tuple(name for name, _ in columns)
+        self.rows = rows
+        self.empty_message = empty_message
+        self.page = 1
+        self.limit = None
+
+    def __str__(self):
+        return "".join(self.lines())
+
+    def paginate(self, page: int = 1, limit: int = None) -> "Table":
+        self.page = page
+        self.limit = limit
+        return self
+
+    def lines(self) -> Iterator[str]:
+        rows = iter(self.rows)
+        if self.limit is not None:
+            start = (self.page - 1) * self.limit
+            rows = itertools.islice(rows, start, start + self.limit)
+        first_row = next(rows, None)
+        if first_row is None:
+            yield self.empty_message if self.page == 1 else f"Page {self.page} is empty"
+            return
+        yield self.row_format.format(*self.header)
+        for row in itertools.chain((first_row,), rows):
+            yield self.row_format.format(*(str(cell) for cell in row))
+
+    def write(self, stream = None):
+        stream = stream or sys.stdout
+        lines = self.lines()
+        while chunk := "".join(itertools.islice(lines, self.BUFFER_LINES)):
+            stream.write(chunk)
+            stream.flush()
+
+    @staticmethod
+    def parse_page_args(args: List[str]) -> Tuple[List[str], int, int|None]:
+        """Returns arguments without --page/--limit options, page number (1 by default) and limit (None by default)"""
+        rest, options = [], {"--page": 1, "--limit": None}
+        args = iter(args)
+        for arg in args:
+            name, _, value = arg.partition("=")
+            if name not in options:
+                rest.append(arg)
+                continue
+            value = value or next(args, "")
+            if not value.isdigit() or int(value) < 1:
+                raise ValueError(f"{name} should be a positive number")
+            options[name] = int(value)
+        if options["--page"] > 1 and options["--limit"] is None:
+            raise ValueError("--page requires --limit")
+        return rest, options["--page"], options["--limit"]
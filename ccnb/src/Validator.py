@@ -1,10 +1,23 @@
+import functools
 import re
 
 from datetime import datetime
+from typing import Iterable, List, Tuple
+
+PHONE_NON_DIGITS = re.compile(r'\D')
+# str.translate table deleting ASCII non-digits, faster than PHONE_NON_DIGITS for ASCII input
+ASCII_NON_DIGITS = dict.fromkeys(code for code in range(128) if not chr(code).isdigit())
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,7}\b')
+USERNAME_PATTERN = re.compile(r'^[A-Za-z0-9._-]+$')
+# Distinct parsed birthdays kept by the cache, ~100 years of dates
+BIRTHDAY_CACHE_SIZE = 40000
 
 
 class Validator:
-    """Class for validation and normalization of user input data."""
+    """Class for validation and normalization of user input data.
+    Batch methods normalize_phones, validate_emails and validate_birthdays take a list of values and return
+    (result, None) or (None, error message) for every value instead of raising ValueError.
+    """
     @staticmethod
     def normalize_phone(phone_number: str) -> str:
         """Normalize phone numbers to standard format, leaving only digits and '+' symbol at the beginning (always returns number in format +380XXXXXXXXX)
@@ -19,50 +32,98 @@ class Validator:
             ValueError: if entered phone number doesn't match any of known formats.
                         Prints error message and suggests to enter phone number in correct format.
         """
-        phone_number = re.sub(r'\D', '', phone_number)  # delete all non-digit characters
+        phone_number, error = Validator.__phone(phone_number)
+        if error:
+            raise ValueError(error)
+        return phone_number
+
+    @staticmethod
+    def normalize_phones(phone_numbers: Iterable[str]) -> List[Tuple[str|None, str|None]]:
+        """Batch normalize_phone, returns (normalized phone, None) or (None, error message) for every phone"""
+        phone = Validator.__phone
+        return [phone(phone_number) for phone_number in phone_numbers]
+
+    @staticmethod
+    def __phone(phone_number: str) -> Tuple[str|None, str|None]:
+        # delete all non-digit characters
+        if phone_number.isascii():
+            phone_number = phone_number.translate(ASCII_NON_DIGITS)
+        elif not phone_number.isdecimal():
+            phone_number = PHONE_NON_DIGITS.sub('', phone_number)
         if len(phone_number) == 10 and phone_number.startswith("0"):
-            return f"+38{phone_number}"
+            return f"+38{phone_number}", None
         elif len(phone_number) == 12 and phone_number.startswith("38"):
-            return f"+{phone_number}"
-        else:
-            raise ValueError(f"{phone_number} use invalid phone number format. \n"
-                            f"Please use the format '0XXXXXXXXX' or '+380XXXXXXXXX'")
+            return f"+{phone_number}", None
+        return None, (f"{phone_number} use invalid phone number format. \n"
+                      f"Please use the format '0XXXXXXXXX' or '+380XXXXXXXXX'")
 
     @staticmethod
     def validate_email(email: str) -> str:
         """Validate email address using regex. Raises ValueError if email is not valid.
             valid email: any symbols before @, any symbols before dot, 2-7 letters after last dot"""
-        regex = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,7}\b'
-        if not re.match(regex, email):
+        if not EMAIL_PATTERN.match(email):
             raise ValueError(f"{email} is not a valid email address.")
         return email
 
+    @staticmethod
+    def validate_emails(emails: Iterable[str]) -> List[Tuple[str|None, str|None]]:
+        """Batch validate_email, returns (email, None) or (None, error message) for every email"""
+        match = EMAIL_PATTERN.match
+        return [(email, None) if match(email) else (None, f"{email} is not a valid email address.") for email in emails]
+
     @staticmethod
     def validate_birthday(birthday: str) -> datetime:
         """Validate birthday date format and value. Raises ValueError if date is not valid.
             valid date format: DD.MM.YYYY
             valid date value: not 29 feb, not in future"""
-        try:
-            date = datetime.strptime(birthday, "%d.%m.%Y")
-        except ValueError:
-            raise ValueError("Invalid date format. Use DD.MM.YYYY")
+        date, error = Validator.__birthday(birthday, datetime.now())
+        if error:
+            raise ValueError(error)
+        return date
+
+    @staticmethod
+    def validate_birthdays(birthdays: Iterable[str]) -> List[Tuple[datetime|None, str|None]]:
+        """Batch validate_birthday, returns (date, None) or (None, error message) for every birthday"""
+        birthday, now = Validator.__birthday, datetime.now()
+        return [birthday(value, now) for value in birthdays]
+
+    @staticmethod
+    def __birthday(birthday: str, now: datetime) -> Tuple[datetime|None, str|None]:
+        date = Validator.parse_date(birthday)
+        if date is None:
+            return None, "Invalid date format. Use DD.MM.YYYY"
         # 29 february check
         if date.day == 29 and date.month == 2:
-            raise ValueError("Birthday cannot be 29th February. Use 28.02.YYYY or 01.03.YYYY")
+            return None, "Birthday cannot be 29th February. Use 28.02.YYYY or 01.03.YYYY"
         # future date check
-        if date > datetime.now():
-            raise ValueError("Birthday can't be a future date")
-        return date
+        if date > now:
+            return None, "Birthday can't be a future date"
+        return date, None
 
+    @staticmethod
+    @functools.lru_cache(maxsize=BIRTHDAY_CACHE_SIZE)
+    def parse_date(value: str) -> datetime|None:
+        """Parses DD.MM.YYYY like datetime.strptime(value, "%d.%m.%Y"), returns None if the value is not a valid date.
+        Dates with two-digit day and month are parsed by hand, other forms (e.g. 1.2.1990) by strptime"""
+        if len(value) == 10 and value[2] == "." and value[5] == "." and value.isascii():
+            day, month, year = value[0:2], value[3:5], value[6:10]
+            if day.isdigit() and month.isdigit() and year.isdigit():
+                try:
+                    return datetime(int(year), int(month), int(day))
+                except ValueError:
+                    return None
+        try:
+            return datetime.strptime(value, "%d.%m.%Y")
+        except ValueError:
+            return None
 
     @staticmethod
     def normalize_username(username: str) -> str:
         """Validate username. Raises ValueError if username contains restricted characters.
             valid username alphanumeric, dash, dot, minus. user-1"""
-        regex = r'^[A-Za-z0-9._-]+$'
         if not username:
             return "guest"
-        elif not re.match(regex, username):
+        elif not USERNAME_PATTERN.match(username):
             print("Login is invalid, using \"guest\"")
             return "guest"
         return username
@@ -0,0 +1,169 @@
+import threading
+import time
+from typing import List
+
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.binary_format import BinaryFormat
+from ccnb.src.NoteBook import NoteBook
+from ccnb.src.models import Note, UserRecord
+
+CONTACTS, NOTES = "contacts", "notes"
+
+
+class Autosave:
+    """Debounced background saving of AddressBook and NoteBook for sessions without journal.
+    Autosave keeps a shadow copy of the books as plain immutable values (see BinaryFormat.contact_values).
+    Changes are collected from the books like in Journal, commit() after a command updates the shadow only for
+    the changed records, so the prompt thread never serializes the books or touches files. A worker thread saves
+    a copy of the shadow after `changes` changed records or `seconds` after the first unsaved change,
+    changes made during a save are saved by the next one. Only the books with changes are given to the save.
+    __init__:
+        save: callable(user_id, contacts, notes) writing the values with BinaryFormat.dump_values, runs in the worker
+            contacts or notes is None if the book has no unsaved changes
+        changes: int, number of changed records which starts a save right away
+        seconds: float, longest time a change stays unsaved
+    Attributes:
+        saves: int, number of finished saves
+        saved: bool, True if the last save has all committed changes
+    Methods:
+        take_errors() -> List[str]
+            messages of the failed saves since the last call, the worker never prints, the session shows them
+        attach(address_book=None, note_book=None) / detach()
+            start/stop collecting changes of the books, attach copies values of all records
+            lazily loaded books can be attached one by one
+        commit()
+            applies collected changes to the shadow and wakes the worker if a save is due
+        close()
+            stops the worker, waits for the running save, changes which are not saved yet are left to the caller
+    """
+    def __init__(self, save, changes: int = 100, seconds: float = 30.0):
+        self.save = save
+        self.changes = changes
+        self.seconds = seconds
+        self.saves = 0
+        self.__address_book = None
+        self.__note_book = None
+        self.__pending_contacts = {}
+        self.__pending_notes = {}
+        self.__contacts = {}    # key -> contact values
+        self.__notes = {}       # title -> note values
+        self.__user_id = 0
+        self.__unsaved = 0      # changed records since the last save
+        self.__unsaved_books = set()  # CONTACTS and/or NOTES
+        self.__since = None     # time.monotonic() of the first unsaved change
+        self.__retry = None     # time.monotonic() of the next try after a failed save
+        self.__errors = []      # messages of failed saves, taken by the prompt thread
+        self.__closed = False
+        self.__condition = threading.Condition()
+        self.__worker = threading.Thread(target=self.__run, name="ccnb-autosave", daemon=True)
+        self.__worker.start()
+
+    def attach(self, address_book: AddressBook = None, note_book: NoteBook = None):
+        if address_book is not None:
+            contacts = {key: BinaryFormat.contact_values(record) for key, record in address_book.items()}
+            with self.__condition:
+                self.__contacts, self.__user_id = contacts, address_book.user_id
+            self.__address_book = address_book
+            address_book.subscribe(self.__on_contact_changed)
+        if note_book is not None:
+            notes = {title: BinaryFormat.note_values(note) for title, note in note_book.items()}
+            with self.__condition:
+                self.__notes = notes
+            self.__note_book = note_book
+            note_book.subscribe(self.__on_note_changed)
+
+    def detach(self):
+        if self.__address_book is not None:
+            self.__address_book.unsubscribe(self.__on_contact_changed)
+        if self.__note_book is not None:
+            self.__note_book.unsubscribe(self.__on_note_changed)
+        self.__address_book = self.__note_book = None
+
+    def __on_contact_changed(self, key, record: UserRecord|None):
+        self.__pending_contacts[key] = record
+
+    def __on_note_changed(self, title, note: Note|None):
+        self.__pending_notes[title] = note
+
+    def commit(self):
+        if not self.__pending_contacts and not self.__pending_notes:
+            return
+        # Values are taken outside of the lock, the worker only waits for the dictionary updates
+        contacts = {key: BinaryFormat.contact_values(record) if record is not None else None
+                    for key, record in self.__pending_contacts.items()}
+        notes = {title: BinaryFormat.note_values(note) if note is not None else None
+                 for title, note in self.__pending_notes.items()}
+        self.__pending_contacts.clear()
+        self.__pending_notes.clear()
+        with self.__condition:
+            for shadow, changed in ((self.__contacts, contacts), (self.__notes, notes)):
+                for key, values in changed.items():
+                    if values is None:
+                        shadow.pop(key, None)
+                    else:
+                        shadow[key] = values
+            if contacts:
+                self.__user_id = self.__address_book.user_id
+                self.__unsaved_books.add(CONTACTS)
+            if notes:
+                self.__unsaved_books.add(NOTES)
+            self.__unsaved += len(contacts) + len(notes)
+            if self.__since is None:
+                self.__since = time.monotonic()
+            self.__condition.notify()
+
+    def take_errors(self) -> List[str]:
+        with self.__condition:
+            errors, self.__errors = self.__errors, []
+        return errors
+
+    @property
+    def saved(self) -> bool:
+        with self.__condition:
+            return not self.__unsaved and not self.__pending_contacts and not self.__pending_notes
+
+    def close(self):
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify()
+        self.__worker.join()
+
+    def __delay(self) -> float|None:
+        """Seconds until the next save is due, 0 if it is due now, None if there is nothing to save"""
+        if not self.__unsaved:
+            return None
+        due = self.__since + self.seconds if self.__unsaved < self.changes else 0
+        if self.__retry is not None:
+            due = max(due, self.__retry)
+        return max(due - time.monotonic(), 0)
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while not self.__closed and (delay := self.__delay()) != 0:
+                    self.__condition.wait(delay)
+                if self.__closed:
+                    return
+                # Shallow copies are enough, values of the shadow are never changed in place
+                books, self.__unsaved_books = self.__unsaved_books, set()
+                user_id = self.__user_id
+                contacts = self.__contacts.copy() if CONTACTS in books else None
+                notes = self.__notes.copy() if NOTES in books else None
+                unsaved, self.__unsaved, self.__since = self.__unsaved, 0, None
+            try:
+                self.save(user_id, [(key,) + values for key, values in contacts.items()] if contacts is not None else None,
+                          list(notes.values()) if notes is not None else None)
+                error = None
+            except Exception as ex:
+                error = ex
+            with self.__condition:
+                if error is None:
+                    self.saves += 1
+                    self.__retry = None
+                else:
+                    self.__errors.append(f"Autosave failed: {error}")
+                    # Changes are kept for the next try in `seconds`
+                    self.__unsaved += unsaved
+                    self.__unsaved_books |= books
+                    self.__since = self.__since or time.monotonic()
+                    self.__retry = time.monotonic() + self.seconds
@@ -0,0 +1,189 @@
+import array
+import gc
+import struct
+import sys
+import threading
+from typing import BinaryIO, Iterable, List, Tuple
+
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.NoteBook import NoteBook
+from ccnb.src.models import Note, UserRecord
+
+
+class BinaryFormat:
+    """Compact versioned save format. Books are stored column by column as plain strings and integers,
+    without pickled Field objects and class references.
+    Layout, all integers are little-endian:
+        header: MAGIC, version: u16
+        contacts: user_id: i64, then columns key, name, birthday (date ordinal, 0 if not set), address,
+                  phone counts, phones of all contacts, email counts, emails of all contacts
+        notes: columns title, content, tag counts, tags of all notes
+    Integer column: count: u64, then count i64 values
+    String column: integer column of string lengths in characters (-1 for None),
+                   then size: u64 and all strings joined and encoded in UTF-8
+    Methods:
+        dump(address_book, note_book, file)
+            writes books to a binary file object
+        dump_values(file, user_id, contacts, notes)
+            writes books given as tuples of contact_values(record) with the key first and note_values(note)
+        load(file) -> (AddressBook, NoteBook)
+            reads books from a binary file object
+            raises ValueError if the file is not in this format, is truncated or has an unsupported version
+    """
+    MAGIC = b"CCNB"
+    VERSION = 1
+    HEADER = struct.Struct("<4sH")
+    SIZE = struct.Struct("<Q")
+    INT = struct.Struct("<q")
+    # Cyclic GC is paused while books are loaded. Loads can run at the same time in the prompt, watcher and
+    # compaction threads: the first one pauses GC, the last one restores the state the first one found
+    __gc_lock = threading.Lock()
+    __gc_pauses = 0
+    __gc_was_enabled = False
+
+    @staticmethod
+    def dump(address_book: AddressBook, note_book: NoteBook, file: BinaryIO):
+        contacts = [(key,) + BinaryFormat.contact_values(record) for key, record in address_book.items()]
+        notes = [BinaryFormat.note_values(note) for note in note_book.values()]
+        BinaryFormat.dump_values(file, address_book.user_id, contacts, notes)
+
+    @staticmethod
+    def contact_values(record: UserRecord) -> tuple:
+        """(name, phones, birthday ordinal or 0, emails, address or None) of the record"""
+        return (record.name.value, tuple(record.phones or ()), record.birthday.ordinal if record.birthday else 0,
+                tuple(record.emails or ()), record.address.value if record.address else None)
+
+    @staticmethod
+    def note_values(note: Note) -> tuple:
+        """(title, content, tags) of the note"""
+        return (note.title.value, note.content.value, tuple(note.tags.value))
+
+    @staticmethod
+    def dump_values(file: BinaryIO, user_id: int, contacts: List[tuple], notes: List[tuple]):
+        """Writes books given as plain values: contacts are (key,) + contact_values, notes are note_values"""
+        write_ints, write_strings = BinaryFormat.__write_ints, BinaryFormat.__write_strings
+        file.write(BinaryFormat.HEADER.pack(BinaryFormat.MAGIC, BinaryFormat.VERSION))
+
+        file.write(BinaryFormat.INT.pack(user_id))
+        write_ints(file, (contact[0] for contact in contacts))
+        write_strings(file, (contact[1] for contact in contacts))
+        write_ints(file, (contact[3] for contact in contacts))
+        write_strings(file, (contact[5] for contact in contacts))
+        write_ints(file, (len(contact[2]) for contact in contacts))
+        write_strings(file, (phone for contact in contacts for phone in contact[2]))
+        write_ints(file, (len(contact[4]) for contact in contacts))
+        write_strings(file, (email for contact in contacts for email in contact[4]))
+
+        write_strings(file, (note[0] for note in notes))
+        write_strings(file, (note[1] for note in notes))
+        write_ints(file, (len(note[2]) for note in notes))
+        write_strings(file, (tag for note in notes for tag in note[2]))
+
+    @staticmethod
+    def load(file: BinaryIO) -> Tuple[AddressBook, NoteBook]:
+        read_ints, read_strings = BinaryFormat.__read_ints, BinaryFormat.__read_strings
+        magic, version = BinaryFormat.HEADER.unpack(BinaryFormat.__read_exact(file, BinaryFormat.HEADER.size))
+        if magic != BinaryFormat.MAGIC:
+            raise ValueError("File is not a ccnb save file")
+        if version > BinaryFormat.VERSION:
+            raise ValueError(f"Save file version {version} is not supported, please update ccnb")
+        # Loading creates millions of objects and none of them is garbage, cyclic GC passes would only slow it down
+        BinaryFormat.__pause_gc()
+        try:
+            return BinaryFormat.__load_books(file)
+        finally:
+            BinaryFormat.__resume_gc()
+
+    @staticmethod
+    def __pause_gc():
+        with BinaryFormat.__gc_lock:
+            if BinaryFormat.__gc_pauses == 0:
+                BinaryFormat.__gc_was_enabled = gc.isenabled()
+                gc.disable()
+            BinaryFormat.__gc_pauses += 1
+
+    @staticmethod
+    def __resume_gc():
+        with BinaryFormat.__gc_lock:
+            BinaryFormat.__gc_pauses -= 1
+            if BinaryFormat.__gc_pauses == 0 and BinaryFormat.__gc_was_enabled:
+                gc.enable()
+
+    @staticmethod
+    def __load_books(file: BinaryIO) -> Tuple[AddressBook, NoteBook]:
+        read_ints, read_strings = BinaryFormat.__read_ints, BinaryFormat.__read_strings
+        (user_id,) = BinaryFormat.INT.unpack(BinaryFormat.__read_exact(file, BinaryFormat.INT.size))
+        keys, names, birthdays, addresses = read_ints(file), read_strings(file), read_ints(file), read_strings(file)
+        phones = BinaryFormat.__split(read_ints(file), read_strings(file))
+        emails = BinaryFormat.__split(read_ints(file), read_strings(file))
+        address_book = AddressBook()
+        # Values were validated before they were saved
+        for key, name, birthday, address in zip(keys, names, birthdays, addresses):
+            address_book[key] = UserRecord.trusted(name, next(phones), birthday, next(emails), address)
+        address_book.user_id = max(address_book.user_id, user_id)
+
+        titles, contents = read_strings(file), read_strings(file)
+        tags = BinaryFormat.__split(read_ints(file), read_strings(file))
+        note_book = NoteBook()
+        for title, content in zip(titles, contents):
+            note_book[title] = Note(title, content, next(tags))
+        # Books are the same as in the file
+        address_book.mark_saved()
+        note_book.mark_saved()
+        return address_book, note_book
+
+    @staticmethod
+    def __write_ints(file: BinaryIO, values: Iterable[int]):
+        values = array.array("q", values)
+        if sys.byteorder == "big":
+            values.byteswap()
+        file.write(BinaryFormat.SIZE.pack(len(values)))
+        file.write(values.tobytes())
+
+    @staticmethod
+    def __write_strings(file: BinaryIO, values: Iterable[str|None]):
+        values = list(values)
+        BinaryFormat.__write_ints(file, (-1 if value is None else len(value) for value in values))
+        data = "".join(value for value in values if value).encode("utf-8", "surrogatepass")
+        file.write(BinaryFormat.SIZE.pack(len(data)))
+        file.write(data)
+
+    @staticmethod
+    def __read_exact(file: BinaryIO, size: int) -> bytes:
+        data = file.read(size)
+        if len(data) != size:
+            raise ValueError("Save file is truncated")
+        return data
+
+    @staticmethod
+    def __read_size(file: BinaryIO) -> int:
+        return BinaryFormat.SIZE.unpack(BinaryFormat.__read_exact(file, BinaryFormat.SIZE.size))[0]
+
+    @staticmethod
+    def __read_ints(file: BinaryIO) -> array.array:
+        values = array.array("q")
+        values.frombytes(BinaryFormat.__read_exact(file, BinaryFormat.__read_size(file) * values.itemsize))
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+
+    @staticmethod
+    def __read_strings(file: BinaryIO) -> List[str|None]:
+        lengths = BinaryFormat.__read_ints(file)
+        text = BinaryFormat.__read_exact(file, BinaryFormat.__read_size(file)).decode("utf-8", "surrogatepass")
+        values, position = [], 0
+        for length in lengths:
+            if length < 0:
+                values.append(None)
+            else:
+                values.append(text[position:position + length])
+                position += length
+        return values
+
+    @staticmethod
+    def __split(counts: Iterable[int], values: List[str]):
+        """Yields lists of values of every record, counts are numbers of values in each list"""
+        position = 0
+        for count in counts:
+            yield values[position:position + count]
+            position += count
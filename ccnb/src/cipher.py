@@ -0,0 +1,190 @@
+import hashlib
+import os
+import time
+from typing import BinaryIO, Dict
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, hmac
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+AES_BLOCK_SIZE = 16
+# Longest password accepted by pyAesCrypt
+MAX_PASSWORD_LENGTH = 1024
+# Rounds of SHA-256 of the AES Crypt key derivation
+STRETCH_ROUNDS = 8192
+# Last bytes of an AES Crypt file: plaintext size mod 16 and HMAC-SHA256 of the ciphertext
+TRAILER_SIZE = 1 + 32
+CREATED_BY = b"CREATED_BY\x00ccnb"
+
+
+class SessionCipher:
+    """Encryption of save files in AES Crypt version 2 format, the format of pyAesCrypt, with cached password stretching.
+    The password is stretched by 8192 rounds of SHA-256 with the salt (iv1) of the file. A SessionCipher draws one
+    random salt and stretches the password for it once, on the first save: all files written by the session use
+    this salt, each of them still gets a random data key and iv. Ciphers of other sessions draw other salts.
+    Stretched keys of the files read by the session are cached by salt: pyAesCrypt stretches the password again for
+    every call, SessionCipher checks the password of a file (verify) and decrypts it with one stretching.
+    Files stay readable by pyAesCrypt.decryptStream and older versions of ccnb.
+    __init__:
+        password: str
+    Attributes:
+        derivations: int, number of password stretchings done by this cipher
+        derivation_time: float, seconds spent on them
+    Methods:
+        encrypt(plain_file, encrypted_file, buffer_size)
+        decrypt(encrypted_file, plain_file, buffer_size)
+            raises ValueError if the password is wrong or the file is corrupted
+        verify(encrypted_file)
+            raises ValueError if the password is wrong, only the header of the file is read
+        authenticate(encrypted_file, buffer_size)
+            raises ValueError like decrypt, checks the HMAC of the whole file without decrypting it
+    """
+    # Keys of the last salts read, a read-only session reads new salts with every reload of the saves
+    KEY_CACHE_SIZE = 16
+
+    def __init__(self, password: str):
+        if len(password) > MAX_PASSWORD_LENGTH:
+            raise ValueError("Password is too long.")
+        self.password = password
+        self.derivations = 0
+        self.derivation_time = 0.0
+        self.__salt = os.urandom(AES_BLOCK_SIZE)  # salt of the files written by the session
+        self.__salt_key = None
+        self.__keys: Dict[bytes, bytes] = {}  # salt -> stretched password of the files read
+
+    def __stretch(self, salt: bytes) -> bytes:
+        """Key derivation of AES Crypt version 2, same as pyAesCrypt.crypto.stretch"""
+        start = time.perf_counter()
+        password = self.password.encode("utf_16_le")
+        key = salt + bytes(16)
+        for _ in range(STRETCH_ROUNDS):
+            key = hashlib.sha256(key + password).digest()
+        self.derivation_time += time.perf_counter() - start
+        self.derivations += 1
+        return key
+
+    def __key(self, salt: bytes) -> bytes:
+        if salt == self.__salt and self.__salt_key is not None:
+            return self.__salt_key
+        key = self.__keys.get(salt)
+        if key is None:
+            key = self.__keys[salt] = self.__stretch(salt)
+            if len(self.__keys) > self.KEY_CACHE_SIZE:
+                del self.__keys[next(iter(self.__keys))]
+        return key
+
+    def encrypt(self, plain_file: BinaryIO, encrypted_file: BinaryIO, buffer_size: int):
+        if buffer_size % AES_BLOCK_SIZE != 0:
+            raise ValueError("Buffer size must be a multiple of AES block size.")
+        salt = self.__salt
+        if self.__salt_key is None:
+            self.__salt_key = self.__stretch(salt)
+        key = self.__salt_key
+        data_iv, data_key = os.urandom(AES_BLOCK_SIZE), os.urandom(32)
+        # Data key and iv are encrypted by the stretched password, as in pyAesCrypt
+        encryptor = Cipher(algorithms.AES(key), modes.CBC(salt)).encryptor()
+        encrypted_key = encryptor.update(data_iv + data_key) + encryptor.finalize()
+        key_hmac = hmac.HMAC(key, hashes.SHA256())
+        key_hmac.update(encrypted_key)
+        # Header: "AES", version 2, reserved byte, CREATED_BY extension, empty 128 bytes container extension, end of extensions
+        encrypted_file.write(b"AES\x02\x00" + len(CREATED_BY).to_bytes(2, "big") + CREATED_BY +
+                             b"\x00\x80" + bytes(128) + b"\x00\x00")
+        encrypted_file.write(salt + encrypted_key + key_hmac.finalize())
+
+        encryptor = Cipher(algorithms.AES(data_key), modes.CBC(data_iv)).encryptor()
+        data_hmac = hmac.HMAC(data_key, hashes.SHA256())
+        while True:
+            data = plain_file.read(buffer_size)
+            last = len(data) < buffer_size
+            if last:
+                # Padding of AES Crypt: bytes of the pad length, the last byte of the file tells the real size mod 16
+                size_mod = len(data) % AES_BLOCK_SIZE
+                pad = (AES_BLOCK_SIZE - size_mod) % AES_BLOCK_SIZE
+                data += bytes([pad]) * pad
+            encrypted = encryptor.update(data)
+            if last:
+                encrypted += encryptor.finalize()
+            data_hmac.update(encrypted)
+            encrypted_file.write(encrypted)
+            if last:
+                break
+        encrypted_file.write(bytes([size_mod]) + data_hmac.finalize())
+
+    def verify(self, encrypted_file: BinaryIO):
+        """Checks the password with the header of the file, the data is not read"""
+        self.__open(encrypted_file)
+
+    def authenticate(self, encrypted_file: BinaryIO, buffer_size: int):
+        """Checks the password and the HMAC of the data, nothing is decrypted"""
+        data_iv_key = self.__open(encrypted_file)
+        data_hmac = hmac.HMAC(data_iv_key[16:], hashes.SHA256())
+        pending = b""
+        while chunk := encrypted_file.read(buffer_size):
+            pending += chunk
+            if len(pending) > TRAILER_SIZE:
+                data_hmac.update(pending[:-TRAILER_SIZE])
+                pending = pending[-TRAILER_SIZE:]
+        if len(pending) != TRAILER_SIZE:
+            raise ValueError("File is corrupted.")
+        try:
+            data_hmac.verify(pending[1:])
+        except InvalidSignature:
+            raise ValueError("Bad HMAC (file is corrupted).")
+
+    def decrypt(self, encrypted_file: BinaryIO, plain_file: BinaryIO, buffer_size: int):
+        if buffer_size % AES_BLOCK_SIZE != 0:
+            raise ValueError("Buffer size must be a multiple of AES block size")
+        data_iv_key = self.__open(encrypted_file)
+        decryptor = Cipher(algorithms.AES(data_iv_key[16:]), modes.CBC(data_iv_key[:16])).decryptor()
+        data_hmac = hmac.HMAC(data_iv_key[16:], hashes.SHA256())
+        # Trailer and the last plaintext block are held back until the end of the file is reached
+        pending, held = b"", b""
+        while chunk := encrypted_file.read(buffer_size):
+            pending += chunk
+            if len(pending) > TRAILER_SIZE:
+                encrypted, pending = pending[:-TRAILER_SIZE], pending[-TRAILER_SIZE:]
+                data_hmac.update(encrypted)
+                plain = held + decryptor.update(encrypted)
+                split = max(len(plain) - AES_BLOCK_SIZE, 0)
+                plain_file.write(plain[:split])
+                held = plain[split:]
+        if len(pending) != TRAILER_SIZE:
+            raise ValueError("File is corrupted.")
+        try:
+            plain = held + decryptor.finalize()
+        except ValueError:
+            raise ValueError("File is corrupted.")
+        try:
+            data_hmac.verify(pending[1:])
+        except InvalidSignature:
+            raise ValueError("Bad HMAC (file is corrupted).")
+        padding = (AES_BLOCK_SIZE - pending[0]) % AES_BLOCK_SIZE
+        plain_file.write(plain[:len(plain) - padding])
+
+    def __open(self, encrypted_file: BinaryIO) -> bytes:
+        """Reads the header up to the data and checks the password, returns iv and key of the data"""
+        read = SessionCipher.__read_exact
+        if read(encrypted_file, 3) != b"AES":
+            raise ValueError("File is corrupted or not an AES Crypt (or pyAesCrypt) file.")
+        if read(encrypted_file, 1) != b"\x02":
+            raise ValueError("pyAesCrypt is only compatible with version 2 of the AES Crypt file format.")
+        read(encrypted_file, 1)
+        while (length := int.from_bytes(read(encrypted_file, 2), "big")) != 0:
+            read(encrypted_file, length)
+        salt, encrypted_key, expected_hmac = read(encrypted_file, 16), read(encrypted_file, 48), read(encrypted_file, 32)
+        key = self.__key(salt)
+        key_hmac = hmac.HMAC(key, hashes.SHA256())
+        key_hmac.update(encrypted_key)
+        try:
+            key_hmac.verify(expected_hmac)
+        except InvalidSignature:
+            raise ValueError("Wrong password (or file is corrupted).")
+        decryptor = Cipher(algorithms.AES(key), modes.CBC(salt)).decryptor()
+        return decryptor.update(encrypted_key) + decryptor.finalize()
+
+    @staticmethod
+    def __read_exact(file: BinaryIO, size: int) -> bytes:
+        data = file.read(size)
+        if len(data) != size:
+            raise ValueError("File is corrupted.")
+        return data
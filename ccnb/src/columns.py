@@ -0,0 +1,270 @@
+from datetime import date
+from typing import Dict, List
+
+import numpy as np
+
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.Validator import Validator
+from ccnb.src.models import UserRecord
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+PHONE_DIGITS = 12  # Normalized phones are "+" and 12 digits, see Validator.normalize_phone
+
+
+class Column:
+    """Growable numpy array, capacity is doubled when it is full
+    __init__:
+        dtype: numpy dtype of values
+    supported operations:
+        - values -> np.ndarray
+            view of the stored values, valid until the next change of the column
+        - append(value)
+        - extend(values)
+        - keep(mask)
+            drops values where mask is False
+    """
+    def __init__(self, dtype):
+        self.__data = np.empty(16, dtype)
+        self.__size = 0
+
+    @property
+    def values(self) -> np.ndarray:
+        return self.__data[:self.__size]
+
+    def __len__(self):
+        return self.__size
+
+    def append(self, value):
+        self.__reserve(self.__size + 1)
+        self.__data[self.__size] = value
+        self.__size += 1
+
+    def extend(self, values):
+        values = np.asarray(values, self.__data.dtype)
+        self.__reserve(self.__size + len(values))
+        self.__data[self.__size:self.__size + len(values)] = values
+        self.__size += len(values)
+
+    def keep(self, mask: np.ndarray):
+        values = self.values[mask]
+        self.__size = 0
+        self.extend(values)
+
+    def __reserve(self, size: int):
+        if size > len(self.__data):
+            data = np.empty(max(size, 2 * len(self.__data)), self.__data.dtype)
+            data[:self.__size] = self.values
+            self.__data = data
+
+
+class ContactColumns:
+    """Columnar view of an address book for vectorized bulk queries, requires numpy (pip install ccnb[columns]).
+    The view subscribes to the book and stays in sync with it. Every version of a record takes a new row,
+    changed and deleted records only mark their old row as dead. Dead rows are dropped when they are
+    more than a half of the table.
+    AddressBook.use_columns() makes birthday queries of big books run over the view, the bot enables it with
+    CCNB_COLUMNS. Below some ten thousand contacts the indexes of AddressBook are as fast and the view would only add
+    memory and work to every change (see benchmarks/bench_columns.py). Other queries, like counts by email domain,
+    are an API for scripts.
+    Rows:
+        keys: int64, key of the record in the book
+        alive: bool, False for changed and deleted records
+        birthdays: datetime64[D], NaT if not set
+        birth months, birth days: int8, 0 if not set
+        phone counts: int32
+    Phones and emails, one entry per value:
+        phones: int64, digits of the normalized phone
+        email domains: int32, codes of interned lowercased domains
+        row of the contact of every entry
+    __init__:
+        address_book: AddressBook or any book with items() and subscribe(callback)
+    supported operations:
+        - close()
+            stops syncing with the book
+        - get_upcoming_birthdays(specific_date = None, days = 7) -> List[Dict[str, str]]
+        - get_birthdays_in_month(month: int) -> List[Dict[str, str]]
+            same results as the methods of AddressBook
+        - find_by_phone(phone: str) -> List[UserRecord]
+        - search_by_phone(digits: str, suffix_only = False) -> List[UserRecord]
+            same results as the methods of AddressBook, digits may start with "+"
+        - count_by_email_domain() -> Dict[str, int]
+            number of contacts with an email in each domain, most common domains first
+        - without_phone() -> List[UserRecord]
+            contacts without phones in the order of the book
+    """
+    def __init__(self, address_book):
+        self.__book = address_book
+        self.__rows = {}  # key -> row of the current version of the record
+        self.__keys, self.__alive, self.__birthdays = Column(np.int64), Column(np.bool_), Column("datetime64[D]")
+        self.__birth_months, self.__birth_days, self.__phone_counts = Column(np.int8), Column(np.int8), Column(np.int32)
+        self.__phones, self.__phone_rows = Column(np.int64), Column(np.int64)
+        self.__email_domains, self.__email_rows = Column(np.int32), Column(np.int64)
+        self.__domains = []       # code -> domain
+        self.__domain_codes = {}  # domain -> code
+        self.__dead = 0
+        self.__load(address_book.items())
+        address_book.subscribe(self.__sync)
+
+    def close(self):
+        self.__book.unsubscribe(self.__sync)
+
+    def __len__(self):
+        return len(self.__rows)
+
+    def __load(self, items):
+        """Fills the table with all records at once"""
+        keys, birthdays, phone_counts = [], [], []
+        phones, phone_rows, email_domains, email_rows = [], [], [], []
+        for row, (key, record) in enumerate(items):
+            self.__rows[key] = row
+            keys.append(key)
+            birthdays.append(record.birthday.ordinal - EPOCH_ORDINAL if record.birthday else np.iinfo(np.int64).min)
+            record_phones = [int(phone[1:]) for phone in record.phones or ()]
+            phone_counts.append(len(record_phones))
+            phones.extend(record_phones)
+            phone_rows.extend([row] * len(record_phones))
+            record_domains = [self.__domain_code(email) for email in record.emails or ()]
+            email_domains.extend(record_domains)
+            email_rows.extend([row] * len(record_domains))
+        # The smallest int64 is NaT in datetime64
+        birthdays = np.array(birthdays, np.int64).view("datetime64[D]")
+        months = birthdays.astype("datetime64[M]")
+        self.__keys.extend(keys)
+        self.__alive.extend(np.ones(len(keys), np.bool_))
+        self.__birthdays.extend(birthdays)
+        self.__birth_months.extend(np.where(np.isnat(birthdays), 0, months.astype(np.int64) % 12 + 1))
+        self.__birth_days.extend(np.where(np.isnat(birthdays), 0, (birthdays - months.astype("datetime64[D]")).astype(np.int64) + 1))
+        self.__phone_counts.extend(phone_counts)
+        self.__phones.extend(phones)
+        self.__phone_rows.extend(phone_rows)
+        self.__email_domains.extend(email_domains)
+        self.__email_rows.extend(email_rows)
+
+    def __sync(self, key, record: UserRecord|None):
+        """Called by the book after a record is added, changed or deleted (record is None)"""
+        row = self.__rows.pop(key, None)
+        if row is not None:
+            self.__alive.values[row] = False
+            self.__dead += 1
+        if record is not None:
+            self.__append(key, record)
+        if self.__dead > len(self.__keys) // 2:
+            self.__compact()
+
+    def __append(self, key, record: UserRecord):
+        row = len(self.__keys)
+        self.__rows[key] = row
+        self.__keys.append(key)
+        self.__alive.append(True)
+        birthday = record.birthday.value if record.birthday else None
+        self.__birthdays.append(np.datetime64(birthday.date() if birthday else "NaT", "D"))
+        self.__birth_months.append(birthday.month if birthday else 0)
+        self.__birth_days.append(birthday.day if birthday else 0)
+        phones = [int(phone[1:]) for phone in record.phones or ()]
+        self.__phone_counts.append(len(phones))
+        self.__phones.extend(phones)
+        self.__phone_rows.extend([row] * len(phones))
+        domains = [self.__domain_code(email) for email in record.emails or ()]
+        self.__email_domains.extend(domains)
+        self.__email_rows.extend([row] * len(domains))
+
+    def __compact(self):
+        """Drops dead rows and entries of them, rows of entries are renumbered"""
+        alive = self.__alive.values.copy()
+        new_rows = np.cumsum(alive) - 1
+        for values, rows in ((self.__phones, self.__phone_rows), (self.__email_domains, self.__email_rows)):
+            kept = alive[rows.values]
+            values.keep(kept)
+            new_values = new_rows[rows.values[kept]]
+            rows.keep(kept)
+            rows.values[:] = new_values
+        for column in (self.__keys, self.__alive, self.__birthdays, self.__birth_months, self.__birth_days, self.__phone_counts):
+            column.keep(alive)
+        self.__rows = dict(zip(self.__keys.values.tolist(), range(len(self.__keys))))
+        self.__dead = 0
+
+    def __domain_code(self, email: str) -> int:
+        domain = email.rsplit("@", 1)[-1].lower()
+        code = self.__domain_codes.get(domain)
+        if code is None:
+            code = self.__domain_codes[domain] = len(self.__domains)
+            self.__domains.append(domain)
+        return code
+
+    def __records(self, keys: np.ndarray) -> List[UserRecord]:
+        return [self.__book[key] for key in keys.tolist()]
+
+    def __phone_keys(self, matches: np.ndarray) -> np.ndarray:
+        """Sorted unique keys of the contacts with matching phone entries"""
+        rows = self.__phone_rows.values[matches]
+        rows = rows[self.__alive.values[rows]]
+        return np.unique(self.__keys.values[rows])
+
+    @staticmethod
+    def __dates(year: int, months: np.ndarray, days: np.ndarray) -> np.ndarray:
+        """Dates of the birthdays in the year, 29th of Feb is moved to 1st of March in non-leap years"""
+        first_days = (np.datetime64(f"{year:04d}-01", "M") + (months - 1)).astype("datetime64[D]")
+        return first_days + (days - 1)
+
+    def get_upcoming_birthdays(self, specific_date = None, days = 7) -> List[Dict[str, str]]:
+        today = AddressBook.parse_date(specific_date)
+        if days < 0:
+            return []
+        rows = self.__alive.values & (self.__birth_months.values > 0)
+        months = self.__birth_months.values[rows].astype(np.int64)
+        birth_days = self.__birth_days.values[rows].astype(np.int64)
+        today64 = np.datetime64(today, "D")
+        # Same rules as AddressBook.congratulation_date
+        dates = self.__dates(today.year, months, birth_days)
+        dates = np.where(dates < today64, self.__dates(today.year + 1, months, birth_days), dates)
+        weekdays = (dates.astype(np.int64) + 3) % 7  # 1970-01-01 was Thursday
+        dates = dates + np.where(weekdays >= 5, 7 - weekdays, 0)
+        matches = (dates - today64).astype(np.int64) <= days
+        keys, dates = self.__keys.values[rows][matches], dates[matches]
+        order = np.argsort(keys, kind="stable")
+        return AddressBook.congratulations(zip(dates[order].astype(object), self.__records(keys[order])))
+
+    def get_birthdays_in_month(self, month: int) -> List[Dict[str, str]]:
+        def in_month(month):
+            rows = self.__alive.values & (self.__birth_months.values == month)
+            keys, days = self.__keys.values[rows], self.__birth_days.values[rows]
+            return self.__records(keys[np.lexsort((keys, days))])
+        return AddressBook.birthdays_in_month(month, in_month)
+
+    def find_by_phone(self, phone: str) -> List[UserRecord]:
+        phone = int(Validator.normalize_phone(phone)[1:])
+        return self.__records(self.__phone_keys(self.__phones.values == phone))
+
+    def search_by_phone(self, digits: str, suffix_only = False) -> List[UserRecord]:
+        # "+" can only be the first character of a phone
+        prefix_only = digits.startswith("+")
+        digits = digits[1:] if prefix_only else digits
+        if digits == "" and not suffix_only:
+            return self.__records(self.__phone_keys(np.ones(len(self.__phones), np.bool_)))
+        if not (digits.isascii() and digits.isdigit()) or len(digits) > PHONE_DIGITS:
+            return []
+        # Digits are compared with a window of the same length shifted over the positions of the phone
+        if prefix_only:
+            if suffix_only and len(digits) < PHONE_DIGITS:
+                return []
+            shifts = [PHONE_DIGITS - len(digits)]
+        else:
+            shifts = [0] if suffix_only else range(PHONE_DIGITS - len(digits) + 1)
+        phones, window, value = self.__phones.values, 10 ** len(digits), int(digits)
+        matches = np.zeros(len(phones), np.bool_)
+        for shift in shifts:
+            matches |= phones // 10 ** shift % window == value
+        return self.__records(self.__phone_keys(matches))
+
+    def count_by_email_domain(self) -> Dict[str, int]:
+        rows = self.__email_rows.values
+        alive = self.__alive.values[rows]
+        # Every contact is counted once per domain
+        pairs = np.unique(rows[alive] * len(self.__domains) + self.__email_domains.values[alive])
+        counts = np.bincount(pairs % max(len(self.__domains), 1), minlength=len(self.__domains))
+        codes = np.lexsort((np.arange(len(counts)), -counts))
+        return {self.__domains[code]: int(counts[code]) for code in codes.tolist() if counts[code]}
+
+    def without_phone(self) -> List[UserRecord]:
+        rows = self.__alive.values & (self.__phone_counts.values == 0)
+        return self.__records(np.sort(self.__keys.values[rows]))
@@ -1,14 +1,22 @@
+import functools
 import os
 import pickle
-from dataclasses import dataclass
 from pathlib import Path
-from pyAesCrypt import encryptStream, decryptStream
 from colorama import Fore
 import getpass
-import io
+import threading
 
 from ccnb.src.AddressBook import AddressBook
+from ccnb.src.autosave import Autosave
+from ccnb.src.binary_format import BinaryFormat
+from ccnb.src.cipher import SessionCipher
+from ccnb.src.durable import durable_replace
 from ccnb.src.NoteBook import NoteBook
+from ccnb.src.journal import Journal
+from ccnb.src.record_store import RecordStore
+from ccnb.src.session_lock import SessionLock
+from ccnb.src.watcher import Watcher
+from ccnb.src.sqlite_storage import SqliteStorage
 
 USER_HOME = os.getenv('HOME') or os.getenv('USERPROFILE') or os.getenv('HOMEPATH')
 CCNB_PATH = os.getenv('CCNB_PATH')
@@ -20,80 +28,586 @@ if CCNB_PATH and Path(CCNB_PATH).is_file():
     print(Fore.YELLOW + f"\t\tUsing default path: {CCNB_PATH}\n" + Fore.RESET)
 elif CCNB_PATH is None:
     CCNB_PATH = os.path.join(USER_HOME, '.ccnb')
+SAVE_EXTENSION = ".ccnb"
+# Books are saved separately in CCNB_PATH/<username>/<segment>.ccnb, every segment is a save file with one book
+CONTACTS_SEGMENT = "contacts"
+NOTES_SEGMENT = "notes"
+SEGMENTS = (CONTACTS_SEGMENT, NOTES_SEGMENT)
+# Pickle save files of older versions, they are loaded as usual and replaced by segments on save
+# Single <username>.ccnb files of older versions are handled the same way
+LEGACY_EXTENSION = ".pkl"
+# Chunk size of encryption and decryption, encrypted saves are never held in memory as a whole
+BUFFER_SIZE = 64 * 1024
+# Journal of changes is kept for sessions without password, set CCNB_JOURNAL=0 to save only on exit
+JOURNAL_ENABLED = os.getenv('CCNB_JOURNAL', '1') != '0'
+# Sessions without journal are saved in the background after CCNB_AUTOSAVE_CHANGES changed records or
+# CCNB_AUTOSAVE_SECONDS after the first unsaved change, set CCNB_AUTOSAVE=0 to save only on exit
+AUTOSAVE_ENABLED = os.getenv('CCNB_AUTOSAVE', '1') != '0'
+AUTOSAVE_CHANGES = int(os.getenv('CCNB_AUTOSAVE_CHANGES', '100'))
+AUTOSAVE_SECONDS = float(os.getenv('CCNB_AUTOSAVE_SECONDS', '30'))
+# Read-only sessions read the saves again if the writer replaced a file while they were read, at most this many times
+SNAPSHOT_RETRIES = 10
+# Read-only sessions check the saves for changes of the writer every CCNB_WATCH_SECONDS, set CCNB_WATCH=0 to disable
+WATCH_ENABLED = os.getenv('CCNB_WATCH', '1') != '0'
+WATCH_SECONDS = float(os.getenv('CCNB_WATCH_SECONDS', '1'))
+# Birthday queries of address books with at least CCNB_COLUMNS contacts use the NumPy view (AddressBook.use_columns),
+# not set by default
+COLUMNS_MIN_SIZE = int(os.getenv('CCNB_COLUMNS')) if os.getenv('CCNB_COLUMNS') else None
+# Storage backend for sessions without password: "pickle" (default), "sqlite" or "mmap" (RecordStore)
+STORAGE = os.getenv('CCNB_STORAGE', 'pickle').lower()
 
-@dataclass
 class DataBase:
     """Class for storing and reading data to/from file.
+    __init__:
+        address_book, note_book: books, None for a book which is loaded from its segment on first access
+        storage: SqliteStorage|RecordStore|None, keeps the books with CCNB_STORAGE=sqlite or CCNB_STORAGE=mmap
+        cipher: SessionCipher|None, password of the encrypted save with the stretched keys of the files read
+        username: str|None, owner of the segments to load, books of a DataBase without username are new empty books
+        lock: SessionLock|None, writer lock of the user's saves taken by load_data
+        read_only: bool, True if another session holds the lock, books of the session must not be saved
+        watched: (list, int)|None, file_ids and journal offset of the snapshot read by read_consistent
+    Attributes:
+        address_book / note_book: loaded on first access, see loaded(segment)
     Supported operations:
-        - save_data(address_book: AddressBook, note_book: NoteBook, username, password="")
-            saves data to a file named by username
+        - loaded(segment) -> AddressBook|NoteBook|None
+            book of CONTACTS_SEGMENT or NOTES_SEGMENT if it is already loaded
+        - locked(lock) -> DataBase
+            sets the writer lock of the session, read_only is True if another session holds it
+        - save_data(address_book, note_book, username, password="", cipher=None, only_changed=True)
+            saves changed books (all given books if not only_changed) to their segments in BinaryFormat,
+            None stands for a book which was not loaded
+            removes single save files of older versions once both segments are written, marks books saved
+            cipher: SessionCipher of the password from the previous load or save, a new one is created for a new password
+        - needs_save(address_book, note_book, username, password="") -> bool
+            True if a book has changes which are not in its segment (see AddressBook.mark_saved)
         - load_data(username="guest") -> (DataBase, str)
-            loads data from a file or returns new AddressBook and NoteBook if file not found. Second return value is user's password
-        - delete_unencrypted_save(username) 
-            deletes unencrypted pickle file when user sets password data from a file or returns new AddressBook and NoteBook if file not found
+            opens data of the user, books are read when they are used. Second return value is user's password,
+            it is checked with the header of the encrypted save
+            the first session of the user takes the writer lock <username>.lock, sessions opened while it is held
+            are read-only and read both books at once with read_consistent
+        - read_consistent(username, cipher=None) -> DataBase
+            both books with the journal as one snapshot, without waiting for the writer
+        - file_ids(username) -> list
+            identity of the saves and journals of the user, changes when the writer replaces or rotates a file
+        - open_watcher(data_base) -> Watcher
+            live reload of the writer's changes into the books of a read-only session, see Watcher
+        - delete_unencrypted_save(username)
+            deletes unencrypted saves when user sets password
+        - find_save(username) -> str|None
+            path of a save file of the user: segments, then <username>.ccnb, <username>.ccnb.aes of older versions,
+            then legacy <username>.pkl, <username>.pkl.aes
+        - segment_path(username, segment) -> str
+            CCNB_PATH/<username>/<segment>.ccnb, ".aes" is added for encrypted segments
+        - read_segment(username, segment, cipher=None) -> AddressBook|NoteBook
+            reads the book from its segment or from the single save file of an older version, applies the journal
+        - read_snapshot(filepath) -> DataBase / write_snapshot(data_base, filepath)
+            reads BinaryFormat or legacy pickle file / writes BinaryFormat file
+        - open_autosave(username, password="", cipher=None) -> Autosave
+            background saving of the segments for sessions without journal, see Autosave
+        - open_journal(username) -> Journal
+            opens journal of changes on top of the unencrypted segments, see Journal
+        - compact_journal(username, journal_path)
+            folds journal into the unencrypted segments, called by Journal in a background thread
+        - open_sqlite(username) -> DataBase
+            opens <username>.sqlite3 with SqliteStorage, imports existing unencrypted save into a new database
+        - open_record_store(username) -> DataBase
+            opens <username>.records with RecordStore, imports existing unencrypted save into a new store
+    Encrypted save file is written and read through a pipe: serialization and AES work in separate threads chunk by chunk
+    Every save file is written to <file>.tmp, synced to disk and renamed over the old one, a crash never leaves a half written save.
+    The directory is synced after the rename, journals and old saves are deleted only when the new save is on disk
+    Books of a user without password are the last segments plus changes in <username>.journal.old and <username>.journal
+    With CCNB_STORAGE=sqlite or CCNB_STORAGE=mmap books of a user without password are kept by the storage attribute
     """
-    address_book: AddressBook
-    note_book: NoteBook
+    # Compaction of the journal and loading of a segment with the journal don't run at the same time
+    __lock = threading.Lock()
+
+    def __init__(self, address_book: AddressBook|None = None, note_book: NoteBook|None = None,
+                 storage: SqliteStorage|RecordStore|None = None, cipher: SessionCipher|None = None, username=None,
+                 lock: SessionLock|None = None, read_only=False):
+        self.storage = storage
+        self.cipher = cipher
+        self.username = username
+        self.lock = lock
+        self.read_only = read_only
+        self.watched = None
+        self.__books = {CONTACTS_SEGMENT: address_book, NOTES_SEGMENT: note_book}
+
+    def __getstate__(self):
+        # Same layout as legacy save files, storage, cipher and lock of the session are not pickled
+        return {"address_book": self.address_book, "note_book": self.note_book}
+
+    def __setstate__(self, state):
+        # Legacy save files are pickles of DataBase dataclass with address_book and note_book
+        self.__init__(state["address_book"], state["note_book"])
+
+    @property
+    def address_book(self) -> AddressBook:
+        return self.__book(CONTACTS_SEGMENT)
+
+    @property
+    def note_book(self) -> NoteBook:
+        return self.__book(NOTES_SEGMENT)
+
+    def loaded(self, segment):
+        return self.__books[segment]
+
+    def __book(self, segment):
+        if self.__books[segment] is None:
+            if self.username is None:
+                self.__books[segment] = AddressBook() if segment == CONTACTS_SEGMENT else NoteBook()
+            else:
+                self.__books[segment] = DataBase.read_segment(self.username, segment, self.cipher)
+        return self.__books[segment]
+
+    @staticmethod
+    def save_data(address_book: AddressBook|None, note_book: NoteBook|None, username, password="", cipher=None,
+                  only_changed=True):
+        try:
+            os.makedirs(os.path.join(CCNB_PATH, username.lower()), exist_ok=True)
+        except OSError:
+            print(Fore.RED + "[ERROR] " + Fore.YELLOW + f"Creation of the directory {CCNB_PATH} failed" + Fore.RESET)
+        if password and (cipher is None or cipher.password != password):
+            cipher = SessionCipher(password)
+        saved = []
+        for segment, book in ((CONTACTS_SEGMENT, address_book), (NOTES_SEGMENT, note_book)):
+            if book is not None and (not only_changed or DataBase.segment_needs_save(book, username, segment, password)):
+                address_book_part, note_book_part = (book, NoteBook()) if segment == CONTACTS_SEGMENT else (AddressBook(), book)
+                dump = functools.partial(BinaryFormat.dump, address_book_part, note_book_part)
+                saved.append(DataBase.__write_segment(dump, username, segment, password, cipher))
+                book.mark_saved()
+
+        if saved:
+            print(Fore.BLUE + "[INFO] " + Fore.YELLOW + f"Data saved to {', '.join(saved)}" + Fore.RESET)
+        # Segments contain all changes, journal must not be replayed on top of them
+        DataBase.delete_journal(username)
+        DataBase.delete_legacy_saves(username, password)
+
+    @staticmethod
+    def needs_save(address_book: AddressBook|None, note_book: NoteBook|None, username, password="") -> bool:
+        """False if the segments of the user already have the books: nothing changed since they were loaded or saved
+        and the segments are written with the same encryption"""
+        return (DataBase.segment_needs_save(address_book, username, CONTACTS_SEGMENT, password) or
+                DataBase.segment_needs_save(note_book, username, NOTES_SEGMENT, password))
+
+    @staticmethod
+    def segment_needs_save(book, username, segment, password="") -> bool:
+        if book is None:
+            return False
+        return book.has_changes() or not os.path.exists(DataBase.segment_path(username, segment) + (".aes" if password else ""))
+
+    @staticmethod
+    def save_path(username, extension=SAVE_EXTENSION):
+        return os.path.join(CCNB_PATH, username.lower() + extension)
+
+    @staticmethod
+    def segment_path(username, segment):
+        return os.path.join(CCNB_PATH, username.lower(), segment + SAVE_EXTENSION)
+
+    @staticmethod
+    def find_save(username):
+        candidates = [DataBase.segment_path(username, segment) for segment in SEGMENTS]
+        candidates += [DataBase.save_path(username, extension) for extension in (SAVE_EXTENSION, LEGACY_EXTENSION)]
+        for filepath in candidates:
+            for path in (filepath, filepath + ".aes"):
+                if os.path.exists(path):
+                    return path
+        return None
 
     @staticmethod
-    def save_data(address_book: AddressBook, note_book: NoteBook, username, password=""):
-        data_base = DataBase(address_book, note_book)
-        if not os.path.exists(CCNB_PATH):
+    def __saved_file(username, segment, encrypted) -> str|None:
+        """File to read the book of the segment from: the segment, or the single save file of an older version
+        if the segment wasn't written yet"""
+        suffix = ".aes" if encrypted else ""
+        candidates = (DataBase.segment_path(username, segment), DataBase.save_path(username, SAVE_EXTENSION),
+                      DataBase.save_path(username, LEGACY_EXTENSION))
+        return next((filepath + suffix for filepath in candidates if os.path.exists(filepath + suffix)), None)
+
+    @staticmethod
+    def delete_legacy_saves(username, password=""):
+        """Deletes single save files of older versions, once both segments are written"""
+        suffix = ".aes" if password else ""
+        if not all(os.path.exists(DataBase.segment_path(username, segment) + suffix) for segment in SEGMENTS):
+            return
+        for extension in (SAVE_EXTENSION, LEGACY_EXTENSION):
+            filepath = DataBase.save_path(username, extension)
+            for path in (filepath, filepath + ".aes"):
+                if os.path.exists(path):
+                    os.remove(path)
+                    print(Fore.BLUE + "[INFO] " + Fore.YELLOW + f"Old save file {path} was converted and deleted" + Fore.RESET)
+
+    @staticmethod
+    def read_snapshot(filepath):
+        with open(filepath, "rb") as plain_file:
+            return DataBase.__read(plain_file, filepath)
+
+    @staticmethod
+    def __read_book(username, segment, cipher=None):
+        """Book of the segment without the journal, only encrypted files are read if cipher is given"""
+        filepath = DataBase.__saved_file(username, segment, cipher is not None)
+        if filepath is None:
+            data_base = DataBase()
+        elif cipher is not None:
+            data_base = DataBase.read_encrypted(filepath, cipher)
+        else:
+            data_base = DataBase.read_snapshot(filepath)
+        return data_base.address_book if segment == CONTACTS_SEGMENT else data_base.note_book
+
+    @staticmethod
+    def read_segment(username, segment, cipher=None):
+        with DataBase.__lock:
+            book = DataBase.__read_book(username, segment, cipher)
+            if cipher is None:
+                address_book, note_book = (book, None) if segment == CONTACTS_SEGMENT else (None, book)
+                filepath = DataBase.journal_path(username)
+                for path in (filepath + ".old", filepath):
+                    if os.path.exists(path):
+                        Journal.replay(path, address_book, note_book)
+            return book
+
+    @staticmethod
+    def read_consistent(username, cipher=None):
+        """Reads both books and the journal of the user as one snapshot, for read-only sessions.
+        The writer is never waited for: it replaces saves by rename and rotates the journal by rename, so the books
+        are read again if any of the files was replaced meanwhile. Appends to the journal only add later states of records"""
+        for _ in range(SNAPSHOT_RETRIES):
+            files = DataBase.file_ids(username)
+            offset = 0
             try:
-                os.makedirs(CCNB_PATH)
-            except OSError:
-                print(
-                    Fore.RED + "[ERROR] " + Fore.YELLOW + f"Creation of the directory {CCNB_PATH} failed" + Fore.RESET)
-        filepath = os.path.join(CCNB_PATH, username.lower() + ".pkl")
-        if not password:
-            with open(filepath, "wb") as plain_file:
-                pickle.dump(data_base, plain_file)
+                address_book = DataBase.__read_book(username, CONTACTS_SEGMENT, cipher)
+                note_book = DataBase.__read_book(username, NOTES_SEGMENT, cipher)
+                if cipher is None:
+                    filepath = DataBase.journal_path(username)
+                    if os.path.exists(filepath + ".old"):
+                        Journal.replay(filepath + ".old", address_book, note_book)
+                    if os.path.exists(filepath):
+                        # Journal is still written, the watcher goes on from the end of the last complete operation
+                        with open(filepath, "rb") as journal_file:
+                            operations, offset = Journal.read_operations(journal_file)
+                        for operation in operations:
+                            Journal.apply(operation, address_book, note_book)
+            except FileNotFoundError:
+                # Old save file or rotated journal was deleted by the writer after the check
+                continue
+            if DataBase.file_ids(username) == files:
+                address_book.mark_saved()
+                note_book.mark_saved()
+                data_base = DataBase(address_book, note_book, cipher=cipher, username=username)
+                data_base.watched = (files, offset)
+                return data_base
+        raise CorruptedFileException(f"Save files of {username} keep changing, please try again")
+
+    @staticmethod
+    def file_ids(username):
+        """Identity of every file a snapshot is read from, None for a missing file.
+        Saves are (inode, mtime), journals are only inodes, appends to them don't change it. The journal is the last one"""
+        saves = [DataBase.segment_path(username, segment) for segment in SEGMENTS]
+        saves += [DataBase.save_path(username, extension) for extension in (SAVE_EXTENSION, LEGACY_EXTENSION)]
+        journal_filepath = DataBase.journal_path(username)
+        ids = []
+        for filepath, journal in ([(path, False) for save in saves for path in (save, save + ".aes")] +
+                                  [(journal_filepath + ".old", True), (journal_filepath, True)]):
+            try:
+                stat = os.stat(filepath)
+            except FileNotFoundError:
+                ids.append(None)
+                continue
+            ids.append(stat.st_ino if journal else (stat.st_ino, stat.st_mtime_ns))
+        return ids
+
+    @staticmethod
+    def read_unencrypted(username):
+        """Last unencrypted books of the user without journal, empty books if there is no save"""
+        return DataBase(DataBase.__read_book(username, CONTACTS_SEGMENT), DataBase.__read_book(username, NOTES_SEGMENT))
+
+    @staticmethod
+    def __read(file, filepath):
+        """Format is chosen by the file name, legacy files are pickles of DataBase"""
+        if LEGACY_EXTENSION in os.path.basename(filepath):
+            return pickle.load(file)
+        return DataBase(*BinaryFormat.load(file))
+
+    @staticmethod
+    def write_snapshot(data_base, filepath):
+        """Writes unencrypted save file to a temporary file and replaces the old one with it"""
+        DataBase.__write_plain(functools.partial(BinaryFormat.dump, data_base.address_book, data_base.note_book), filepath)
+
+    @staticmethod
+    def write_encrypted(data_base, filepath, cipher: SessionCipher):
+        """Serializes data_base straight into the encryptor, encrypted chunks go to a temporary file
+        which replaces the old save file"""
+        DataBase.__write_encrypted(functools.partial(BinaryFormat.dump, data_base.address_book, data_base.note_book),
+                                   filepath, cipher)
+
+    @staticmethod
+    def __write_segment(dump, username, segment, password="", cipher=None) -> str:
+        """Writes the segment with dump(file), returns its path"""
+        filepath = DataBase.segment_path(username, segment)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        if password:
+            filepath += ".aes"
+            DataBase.__write_encrypted(dump, filepath, cipher)
         else:
-            filepath = filepath + ".aes"
-            plain_stream = pickle.dumps(data_base)
-            encrypted_stream = io.BytesIO()
-            encryptStream(io.BytesIO(plain_stream), encrypted_stream, password, 64 * 1024)
-            with open(filepath, "wb") as encrypted_file:
-                encrypted_file.write(encrypted_stream.getvalue())
+            DataBase.__write_plain(dump, filepath)
+        return filepath
+
+    @staticmethod
+    def __write_plain(dump, filepath):
+        with open(filepath + ".tmp", "wb") as plain_file:
+            dump(plain_file)
+            plain_file.flush()
+            os.fsync(plain_file.fileno())
+        durable_replace(filepath + ".tmp", filepath)
 
-        print(Fore.BLUE + "[INFO] " + Fore.YELLOW + f"Data saved to {filepath}" + Fore.RESET)
+    @staticmethod
+    def __write_encrypted(dump, filepath, cipher: SessionCipher):
+        def encrypt(plain_file):
+            with open(filepath + ".tmp", "wb") as encrypted_file:
+                cipher.encrypt(plain_file, encrypted_file, BUFFER_SIZE)
+                encrypted_file.flush()
+                os.fsync(encrypted_file.fileno())
+        DataBase.__piped(dump, encrypt)
+        durable_replace(filepath + ".tmp", filepath)
 
     @staticmethod
-    def delete_unencrypted_save(username):
-        filepath = os.path.join(CCNB_PATH, username.lower() + ".pkl")
+    def open_autosave(username, password="", cipher=None) -> Autosave:
+        """Autosave writing the segments of the user, encrypted if password is set"""
+        if password and (cipher is None or cipher.password != password):
+            cipher = SessionCipher(password)
+        return Autosave(functools.partial(DataBase.write_autosave, username, password, cipher),
+                        AUTOSAVE_CHANGES, AUTOSAVE_SECONDS)
+
+    @staticmethod
+    def write_autosave(username, password, cipher, user_id, contacts, notes):
+        """Writes plain values of the changed books collected by Autosave, runs in the autosave thread"""
+        if contacts is not None:
+            dump = lambda file: BinaryFormat.dump_values(file, user_id, contacts, [])
+            DataBase.__write_segment(dump, username, CONTACTS_SEGMENT, password, cipher)
+        if notes is not None:
+            dump = lambda file: BinaryFormat.dump_values(file, 0, [], notes)
+            DataBase.__write_segment(dump, username, NOTES_SEGMENT, password, cipher)
+
+    @staticmethod
+    def read_encrypted(filepath, cipher: SessionCipher):
+        """Decrypts the file chunk by chunk straight into the reader of the save format.
+        Legacy pickles are authenticated as a whole first, unpickling runs code given by the file"""
+        def load(plain_file):
+            data_base = DataBase.__read(plain_file, filepath)
+            # Wait for the end of the stream, HMAC of the file is checked after the last chunk
+            while plain_file.read(BUFFER_SIZE):
+                pass
+            return data_base
+        with open(filepath, "rb") as encrypted_file:
+            if LEGACY_EXTENSION in os.path.basename(filepath):
+                cipher.authenticate(encrypted_file, BUFFER_SIZE)
+                encrypted_file.seek(0)
+            return DataBase.__piped(lambda plain_file: cipher.decrypt(encrypted_file, plain_file, BUFFER_SIZE), load)
+
+    @staticmethod
+    def __piped(producer, consumer):
+        """Runs producer(write_file) in a thread and consumer(read_file) in the current one, connected by a pipe.
+        Returns result of the consumer, raises error of the producer first"""
+        read_fd, write_fd = os.pipe()
+        errors = []
+        def produce():
+            try:
+                with open(write_fd, "wb", BUFFER_SIZE) as write_file:
+                    producer(write_file)
+            except Exception as ex:
+                # BrokenPipeError if the consumer has failed
+                errors.append(ex)
+        thread = threading.Thread(target=produce)
+        thread.start()
+        try:
+            with open(read_fd, "rb", BUFFER_SIZE) as read_file:
+                result = consumer(read_file)
+        except Exception:
+            # Closed pipe stops the producer, its error (e.g. wrong password) explains the failure better
+            thread.join()
+            if errors and not isinstance(errors[0], BrokenPipeError):
+                raise errors[0]
+            raise
+        thread.join()
+        if errors:
+            raise errors[0]
+        return result
+
+    @staticmethod
+    def open_watcher(data_base) -> Watcher:
+        """Watcher of the saves of a read-only session, data_base is a snapshot from read_consistent"""
+        username, cipher = data_base.username, data_base.cipher
+        files, offset = data_base.watched
+        return Watcher(functools.partial(DataBase.file_ids, username), functools.partial(DataBase.read_consistent, username, cipher),
+                       DataBase.journal_path(username), files, offset, WATCH_SECONDS)
+
+    @staticmethod
+    def lock_path(username):
+        return os.path.join(CCNB_PATH, username.lower() + ".lock")
+
+    @staticmethod
+    def journal_path(username):
+        return os.path.join(CCNB_PATH, username.lower() + ".journal")
+
+    @staticmethod
+    def open_journal(username) -> Journal:
+        os.makedirs(CCNB_PATH, exist_ok=True)
+        filepath = DataBase.journal_path(username)
+        operations = 0
         if os.path.exists(filepath):
-            os.remove(filepath)
-            print(Fore.BLUE + "[INFO] " + Fore.YELLOW + f"Unencrypted save file {filepath} was deleted" + Fore.RESET)
+            with open(filepath, "r", encoding="utf-8") as journal_file:
+                operations = sum(1 for _ in journal_file)
+        return Journal(filepath, functools.partial(DataBase.compact_journal, username), operations)
+
+    @staticmethod
+    def compact_journal(username, journal_path):
+        with DataBase.__lock:
+            data_base = DataBase.read_unencrypted(username)
+            Journal.replay(journal_path, data_base.address_book, data_base.note_book)
+            # Only segments with operations in the journal are written
+            if DataBase.segment_needs_save(data_base.address_book, username, CONTACTS_SEGMENT):
+                DataBase.__write_segment(functools.partial(BinaryFormat.dump, data_base.address_book, NoteBook()),
+                                         username, CONTACTS_SEGMENT)
+            if DataBase.segment_needs_save(data_base.note_book, username, NOTES_SEGMENT):
+                DataBase.__write_segment(functools.partial(BinaryFormat.dump, AddressBook(), data_base.note_book),
+                                         username, NOTES_SEGMENT)
+            for extension in (SAVE_EXTENSION, LEGACY_EXTENSION):
+                filepath = DataBase.save_path(username, extension)
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+            os.remove(journal_path)
+
+    @staticmethod
+    def fold_journal(username):
+        """Folds the journal left by an earlier session into the segments, for sessions which don't keep a journal"""
+        filepath = DataBase.journal_path(username)
+        for path in (filepath + ".old", filepath):
+            if os.path.exists(path):
+                DataBase.compact_journal(username, path)
+
+    @staticmethod
+    def delete_journal(username):
+        filepath = DataBase.journal_path(username)
+        for path in (filepath + ".old", filepath):
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def replay_journal(data_base, username):
+        filepath = DataBase.journal_path(username)
+        for path in (filepath + ".old", filepath):
+            if os.path.exists(path):
+                Journal.replay(path, data_base.address_book, data_base.note_book)
+        return data_base
+
+    @staticmethod
+    def delete_unencrypted_save(username):
+        filepaths = [DataBase.segment_path(username, segment) for segment in SEGMENTS]
+        filepaths += [DataBase.save_path(username, extension) for extension in (SAVE_EXTENSION, LEGACY_EXTENSION)]
+        for filepath in filepaths:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+                print(Fore.BLUE + "[INFO] " + Fore.YELLOW + f"Unencrypted save file {filepath} was deleted" + Fore.RESET)
             
+    @staticmethod
+    def has_unencrypted_save(username) -> bool:
+        journal_filepath = DataBase.journal_path(username)
+        saves = (*(DataBase.segment_path(username, segment) for segment in SEGMENTS),
+                 DataBase.save_path(username), DataBase.save_path(username, LEGACY_EXTENSION),
+                 journal_filepath, journal_filepath + ".old")
+        return any(os.path.exists(path) for path in saves)
+
+    @staticmethod
+    def open_record_store(username):
+        os.makedirs(CCNB_PATH, exist_ok=True)
+        filepath = DataBase.save_path(username, ".records")
+        if not os.path.exists(filepath) and DataBase.has_unencrypted_save(username):
+            data_base = DataBase.replay_journal(DataBase.read_unencrypted(username), username)
+            RecordStore.create(filepath, data_base.address_book, data_base.note_book)
+            print(Fore.BLUE + "[INFO] " + Fore.YELLOW + f"Data of {username} imported to {filepath}" + Fore.RESET)
+        storage = RecordStore(filepath)
+        print(Fore.BLUE + "[INFO] " + Fore.YELLOW + f"Using record store {filepath}" + Fore.RESET)
+        return DataBase(storage.address_book, storage.note_book, storage)
+
+    @staticmethod
+    def open_sqlite(username):
+        os.makedirs(CCNB_PATH, exist_ok=True)
+        filepath = os.path.join(CCNB_PATH, username.lower() + ".sqlite3")
+        storage = SqliteStorage(filepath)
+        if storage.is_empty() and DataBase.has_unencrypted_save(username):
+            data_base = DataBase.replay_journal(DataBase.read_unencrypted(username), username)
+            for key, record in data_base.address_book.items():
+                storage.address_book[key] = record
+            for title, note in data_base.note_book.items():
+                storage.note_book[title] = note
+            storage.commit()
+            print(Fore.BLUE + "[INFO] " + Fore.YELLOW + f"Data of {username} imported to {filepath}" + Fore.RESET)
+        print(Fore.BLUE + "[INFO] " + Fore.YELLOW + f"Using database {filepath}" + Fore.RESET)
+        return DataBase(storage.address_book, storage.note_book, storage)
+
     @staticmethod
     def load_data(username="guest"):
+        os.makedirs(CCNB_PATH, exist_ok=True)
+        lock = SessionLock(DataBase.lock_path(username))
         try:
-            filepath = os.path.join(CCNB_PATH, username.lower() + ".pkl")
-            if os.path.exists(filepath):
-                with open(filepath, "rb") as f:
-                    print(Fore.BLUE + "[INFO] " + Fore.YELLOW + f"Loading data from {filepath}" + Fore.RESET)
-                    return (pickle.load(f), None)
-            elif os.path.exists(filepath + ".aes"):
-                filepath = filepath + ".aes"
+            filepath = DataBase.find_save(username)
+            encrypted = filepath is not None and filepath.endswith(".aes")
+            read_only = not lock.acquire()
+            if read_only:
+                if STORAGE in ("sqlite", "mmap") and not encrypted:
+                    raise SessionLockedException(f"Data of {username} is opened by another session, "
+                                                 f"CCNB_STORAGE={STORAGE} doesn't support read-only sessions")
+                print(Fore.BLUE + "[INFO] " + Fore.YELLOW +
+                      f"Data of {username} is opened by another session, changes are not allowed" + Fore.RESET)
+            if STORAGE == "sqlite" and not encrypted:
+                return (DataBase.open_sqlite(username).locked(lock), None)
+            if STORAGE == "mmap" and not encrypted:
+                return (DataBase.open_record_store(username).locked(lock), None)
+            if filepath is not None and not encrypted:
+                print(Fore.BLUE + "[INFO] " + Fore.YELLOW + f"Loading data from {os.path.dirname(filepath)}" + Fore.RESET)
+                if read_only:
+                    return (DataBase.read_consistent(username).locked(lock), None)
+                if not JOURNAL_ENABLED:
+                    DataBase.fold_journal(username)
+                return (DataBase(username=username).locked(lock), None)
+            elif encrypted:
                 retries = 3
                 while retries > 0:
                     password = getpass.getpass('Password: ')
                     try:
+                        cipher = SessionCipher(password)
                         with open(filepath, "rb") as encrypted_file:
-                            encrypted_stream = encrypted_file.read()
-                        plain_stream = io.BytesIO()
-                        decryptStream(io.BytesIO(encrypted_stream), plain_stream, password, 64 * 1024)
-                        return (pickle.loads(plain_stream.getvalue()), password)
+                            cipher.verify(encrypted_file)
+                        break
                     except Exception as ex:
                         retries -= 1
                         print(Fore.RED + "Wrong password. " + Fore.YELLOW + f"Retries left: {retries}" + Fore.RESET)
-                raise CorruptedFileException("Wrong password or file is corrupted")
+                else:
+                    raise CorruptedFileException("Wrong password or file is corrupted")
+                if read_only:
+                    return (DataBase.read_consistent(username, cipher).locked(lock), password)
+                return (DataBase(cipher=cipher, username=username).locked(lock), password)
             else:
-                return (DataBase(AddressBook(), NoteBook()), None)
-        except CorruptedFileException as cfe:
-            raise cfe
+                # Journal without save file, books are read from it
+                if read_only:
+                    return (DataBase.read_consistent(username).locked(lock), None)
+                if not JOURNAL_ENABLED:
+                    DataBase.fold_journal(username)
+                return (DataBase(username=username).locked(lock), None)
+        except (CorruptedFileException, SessionLockedException) as ex:
+            lock.release()
+            raise ex
         except Exception as ex:
+            lock.release()
             raise Exception("Error opening save file!", ex)
 
+    def locked(self, lock: SessionLock):
+        """Sets the writer lock taken by load_data, the session is read-only if the lock is not held"""
+        self.lock = lock
+        self.read_only = not lock.held
+        return self
+
 class CorruptedFileException(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class SessionLockedException(Exception):
+    """Raised when data of the user is opened by another session and the storage has no read-only mode"""
+    pass
@@ -0,0 +1,20 @@
+import os
+
+
+def sync_directory(path: str):
+    """Flushes the entries of the directory to disk, so renames and new files in it survive a power loss.
+    Directories can't be opened on Windows, renames there are written by the file system itself"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    directory = os.open(path or ".", os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+def durable_replace(source: str, destination: str):
+    """os.replace which is on disk when it returns. Files made obsolete by the new one (journals, older saves)
+    may be deleted only after it, otherwise a power loss can keep the old name and lose both"""
+    os.replace(source, destination)
+    sync_directory(os.path.dirname(destination))
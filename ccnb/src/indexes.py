@@ -0,0 +1,338 @@
+import bisect
+import heapq
+import itertools
+import math
+import re
+from typing import Dict, Iterable, Iterator, List, Set
+
+
+def intersect(postings: List[Set]) -> Set:
+    """Intersection of non-empty list of sets, starting from the smallest one so the result stays small"""
+    postings = sorted(postings, key=len)
+    result = set(postings[0])
+    for keys in postings[1:]:
+        if not result:
+            break
+        result &= keys
+    return result
+
+
+class NgramIndex:
+    """Inverted index from character n-grams to record keys.
+    Used to narrow candidates for substring search, every candidate must be verified by the caller.
+    __init__:
+        n: int, length of n-grams (default 3)
+    supported operations:
+        - add(key, texts: Iterable[str])
+            indexes all n-grams of every text, n-grams never cross text boundaries
+        - remove(key)
+        - candidates(pattern: str) -> Set|None
+            keys which contain all n-grams of the pattern.
+            None if the pattern is shorter than n and can't be narrowed by the index
+    """
+    def __init__(self, n: int = 3):
+        self.n = n
+        self.__postings: Dict[str, Set] = {}
+        self.__grams_by_key: Dict[object, Set[str]] = {}
+
+    def grams(self, text: str) -> Set[str]:
+        n = self.n
+        return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+    def add(self, key, texts: Iterable[str]):
+        grams = set()
+        for text in texts:
+            grams |= self.grams(text)
+        self.__grams_by_key[key] = grams
+        for gram in grams:
+            self.__postings.setdefault(gram, set()).add(key)
+
+    def remove(self, key):
+        for gram in self.__grams_by_key.pop(key, ()):
+            keys = self.__postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self.__postings[gram]
+
+    def candidates(self, pattern: str) -> Set|None:
+        grams = self.grams(pattern)
+        if not grams:
+            return None
+        return intersect([self.__postings.get(gram, set()) for gram in grams])
+
+
+class PhoneIndex:
+    """Index of normalized phone numbers for reverse lookup.
+    Keeps phone -> keys map for exact lookup and a sorted suffix array of all numbers for partial queries.
+    The suffix array is built on the first partial query and updated in place afterwards.
+    supported operations:
+        - add(key, phones: Iterable[str])
+        - remove(key)
+        - find(phone: str) -> Set
+            keys of records with exactly this normalized phone
+        - search(digits: str) -> Set
+            keys of records with a phone containing digits
+        - ends_with(digits: str) -> Set
+            keys of records with a phone ending with digits
+    """
+    def __init__(self):
+        self.__owners: Dict[str, Set] = {}
+        self.__phones_by_key: Dict[object, Set[str]] = {}
+        self.__suffixes = None  # sorted list of (suffix, phone), None until the first partial query
+
+    def add(self, key, phones: Iterable[str]):
+        phones = set(phones)
+        self.__phones_by_key[key] = phones
+        for phone in phones:
+            owners = self.__owners.setdefault(phone, set())
+            if not owners and self.__suffixes is not None:
+                for suffix in self.__phone_suffixes(phone):
+                    bisect.insort(self.__suffixes, suffix)
+            owners.add(key)
+
+    def remove(self, key):
+        for phone in self.__phones_by_key.pop(key, ()):
+            owners = self.__owners[phone]
+            owners.discard(key)
+            if owners:
+                continue
+            del self.__owners[phone]
+            if self.__suffixes is not None:
+                for suffix in self.__phone_suffixes(phone):
+                    del self.__suffixes[bisect.bisect_left(self.__suffixes, suffix)]
+
+    def find(self, phone: str) -> Set:
+        return set(self.__owners.get(phone, ()))
+
+    def search(self, digits: str) -> Set:
+        return self.__keys_of(self.__prefixed(digits))
+
+    def ends_with(self, digits: str) -> Set:
+        # Equal suffix sorts first among the suffixes prefixed by digits
+        return self.__keys_of(itertools.takewhile(lambda item: item[0] == digits, self.__prefixed(digits)))
+
+    @staticmethod
+    def __phone_suffixes(phone: str):
+        return [(phone[i:], phone) for i in range(len(phone))]
+
+    def __prefixed(self, digits: str):
+        """(suffix, phone) pairs with suffix starting with digits, in sorted order"""
+        if self.__suffixes is None:
+            self.__suffixes = sorted(suffix for phone in self.__owners for suffix in self.__phone_suffixes(phone))
+        for i in range(bisect.bisect_left(self.__suffixes, (digits,)), len(self.__suffixes)):
+            if not self.__suffixes[i][0].startswith(digits):
+                break
+            yield self.__suffixes[i]
+
+    def __keys_of(self, suffixes) -> Set:
+        result = set()
+        for _, phone in suffixes:
+            result |= self.__owners[phone]
+        return result
+
+
+class BirthdayIndex:
+    """Calendar-ordered index of birthdays: sorted list of (month, day, key).
+    The sorted list is built on the first query and updated in place afterwards.
+    supported operations:
+        - add(key, birthday: date|None)
+        - remove(key)
+        - between(start: (month, day), end: (month, day)) -> List
+            keys with birthday in the inclusive range within one year, start <= end
+        - starting_from(start: (month, day)) -> Iterator
+            keys in calendar order starting from the day, wrapping around the year end once
+        - in_month(month: int) -> List
+            keys with birthday in the month, in calendar order
+    """
+    def __init__(self):
+        self.__entries = {}  # key -> (month, day, key)
+        self.__days = None   # sorted entries, None until the first query
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def add(self, key, birthday):
+        if birthday is None:
+            return
+        entry = (birthday.month, birthday.day, key)
+        self.__entries[key] = entry
+        if self.__days is not None:
+            bisect.insort(self.__days, entry)
+
+    def remove(self, key):
+        entry = self.__entries.pop(key, None)
+        if entry is not None and self.__days is not None:
+            del self.__days[bisect.bisect_left(self.__days, entry)]
+
+    def between(self, start, end) -> List:
+        days = self.__sorted_days()
+        lo = bisect.bisect_left(days, start)
+        hi = bisect.bisect_left(days, (end[0], end[1] + 1))
+        return [key for _, _, key in days[lo:hi]]
+
+    def starting_from(self, start) -> Iterator:
+        days = self.__sorted_days()
+        lo = bisect.bisect_left(days, start)
+        for i in itertools.chain(range(lo, len(days)), range(lo)):
+            yield days[i][2]
+
+    def in_month(self, month: int) -> List:
+        return self.between((month, 1), (month, 31))
+
+    def __sorted_days(self) -> List:
+        if self.__days is None:
+            self.__days = sorted(self.__entries.values())
+        return self.__days
+
+
+class TextIndex:
+    """Tokenized inverted index with BM25 ranking.
+    Tokens are lowercased words, query words also match as prefixes of indexed words.
+    supported operations:
+        - add(key, texts: Iterable[str])
+        - remove(key)
+        - search(query: str, limit: int = None) -> List[(key, score)]
+            keys with at least one query word sorted by BM25 score (best first), at most limit results
+    """
+    K1 = 1.2
+    B = 0.75
+    TOKEN_REGEX = re.compile(r"\w+")
+
+    def __init__(self):
+        self.__postings: Dict[str, Dict[object, int]] = {}  # token -> {key: term frequency}
+        self.__tokens_by_key: Dict[object, Dict[str, int]] = {}
+        self.__lengths: Dict[object, int] = {}
+        self.__total_length = 0
+        self.__vocabulary = None  # sorted tokens, None until the first query
+
+    @classmethod
+    def tokenize(cls, text: str) -> List[str]:
+        return cls.TOKEN_REGEX.findall(text.lower())
+
+    def add(self, key, texts: Iterable[str]):
+        frequencies = {}
+        length = 0
+        for text in texts:
+            for token in self.tokenize(text):
+                frequencies[token] = frequencies.get(token, 0) + 1
+                length += 1
+        self.__tokens_by_key[key] = frequencies
+        self.__lengths[key] = length
+        self.__total_length += length
+        for token, frequency in frequencies.items():
+            if token not in self.__postings:
+                self.__postings[token] = {}
+                if self.__vocabulary is not None:
+                    bisect.insort(self.__vocabulary, token)
+            self.__postings[token][key] = frequency
+
+    def remove(self, key):
+        if key not in self.__tokens_by_key:
+            return
+        for token in self.__tokens_by_key.pop(key):
+            keys = self.__postings[token]
+            del keys[key]
+            if not keys:
+                del self.__postings[token]
+                if self.__vocabulary is not None:
+                    del self.__vocabulary[bisect.bisect_left(self.__vocabulary, token)]
+        self.__total_length -= self.__lengths.pop(key)
+
+    def search(self, query: str, limit: int = None) -> List:
+        documents = len(self.__lengths)
+        if not documents:
+            return []
+        average_length = self.__total_length / documents or 1
+        scores = {}
+        for token in set(self.tokenize(query)):
+            for term in self.__expand(token):
+                keys = self.__postings[term]
+                idf = math.log(1 + (documents - len(keys) + 0.5) / (len(keys) + 0.5))
+                for key, frequency in keys.items():
+                    norm = self.K1 * (1 - self.B + self.B * self.__lengths[key] / average_length)
+                    scores[key] = scores.get(key, 0) + idf * frequency * (self.K1 + 1) / (frequency + norm)
+        if limit is None:
+            return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def __expand(self, token: str) -> List[str]:
+        """Indexed tokens starting with token"""
+        if self.__vocabulary is None:
+            self.__vocabulary = sorted(self.__postings)
+        result = []
+        for i in range(bisect.bisect_left(self.__vocabulary, token), len(self.__vocabulary)):
+            if not self.__vocabulary[i].startswith(token):
+                break
+            result.append(self.__vocabulary[i])
+        return result
+
+
+class TagIndex:
+    """Posting lists from tag to set of keys.
+    supported operations:
+        - add(key, tags: Iterable[str])
+        - remove(key)
+        - match_all(tags: Iterable[str]) -> Set
+            keys having every tag, intersection starts from the rarest tag
+        - count(tag: str) -> int
+        - counts() -> Dict[str, int]
+    """
+    def __init__(self):
+        self.__postings: Dict[str, Set] = {}
+        self.__tags_by_key: Dict[object, Set[str]] = {}
+
+    def add(self, key, tags: Iterable[str]):
+        tags = set(tags)
+        self.__tags_by_key[key] = tags
+        for tag in tags:
+            self.__postings.setdefault(tag, set()).add(key)
+
+    def remove(self, key):
+        for tag in self.__tags_by_key.pop(key, ()):
+            keys = self.__postings[tag]
+            keys.discard(key)
+            if not keys:
+                del self.__postings[tag]
+
+    def match_all(self, tags: Iterable[str]) -> Set:
+        postings = [self.__postings.get(tag, set()) for tag in set(tags)]
+        return intersect(postings) if postings else set(self.__tags_by_key)
+
+    def count(self, tag: str) -> int:
+        return len(self.__postings.get(tag, ()))
+
+    def counts(self) -> Dict[str, int]:
+        return {tag: len(keys) for tag, keys in self.__postings.items()}
+
+
+class SortedView:
+    """Keys ordered by a sort key given on insertion, ties are ordered by key.
+    The sorted list is built on the first iteration and updated in place afterwards,
+    so reading the first k keys costs O(k).
+    supported operations:
+        - add(key, sort_key)
+        - remove(key)
+        - iteration over keys in sorted order
+    """
+    def __init__(self):
+        self.__entries = {}   # key -> (sort_key, key)
+        self.__sorted = None  # sorted entries, None until the first iteration
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def add(self, key, sort_key):
+        entry = (sort_key, key)
+        self.__entries[key] = entry
+        if self.__sorted is not None:
+            bisect.insort(self.__sorted, entry)
+
+    def remove(self, key):
+        entry = self.__entries.pop(key, None)
+        if entry is not None and self.__sorted is not None:
+            del self.__sorted[bisect.bisect_left(self.__sorted, entry)]
+
+    def __iter__(self) -> Iterator:
+        if self.__sorted is None:
+            self.__sorted = sorted(self.__entries.values())
+        return (key for _, key in self.__sorted)
@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.durable import sync_directory
+from ccnb.src.NoteBook import NoteBook
+from ccnb.src.models import Note, UserRecord
+
+
+class Journal:
+    """Append-only journal of AddressBook and NoteBook changes made after the last snapshot.
+    Every line is a JSON operation with the full new state of one record (null for deleted ones):
+        {"contact": key, "record": {"name": ..., "phones": [...], "birthday": ordinal, "emails": [...], "address": ...}}
+        {"note": title, "record": {"title": ..., "content": ..., "tags": [...]}}
+    Operations are idempotent, so replaying a journal twice gives the same result.
+    __init__:
+        filepath: str, path of the journal file
+        compact: callable(rotated_filepath) folding a rotated journal into the snapshot, runs in a background thread
+        operations: int, number of operations already in the journal file
+    Methods:
+        attach(address_book=None, note_book=None) / detach()
+            start/stop collecting changes of the books, lazily loaded books can be attached one by one
+        commit()
+            appends collected changes to the file and syncs it to disk, starts compaction after COMPACT_AFTER operations
+        close()
+            commits changes and waits for the running compaction
+        replay(filepath, address_book, note_book) -> int
+            applies operations of the file to the books, returns number of operations
+            operations of a book given as None are skipped
+        read_operations(journal_file, offset=0) -> (list, int)
+            operations of the complete lines after offset of a binary file and offset of the end of the last one
+        apply(operation, address_book, note_book)
+            applies one operation to the books
+    """
+    COMPACT_AFTER = 1000
+
+    def __init__(self, filepath: str, compact=None, operations: int = 0):
+        self.filepath = filepath
+        self.rotated_filepath = filepath + ".old"
+        self.compact = compact
+        self.operations = operations
+        self.__address_book = None
+        self.__note_book = None
+        self.__pending_contacts = {}
+        self.__pending_notes = {}
+        self.__compaction = None
+        self.__file = open(filepath, "a", encoding="utf-8")
+        # Journal rotated by a compaction which didn't finish
+        if os.path.exists(self.rotated_filepath):
+            self.__start_compaction()
+
+    def attach(self, address_book: AddressBook = None, note_book: NoteBook = None):
+        if address_book is not None:
+            self.__address_book = address_book
+            address_book.subscribe(self.__on_contact_changed)
+        if note_book is not None:
+            self.__note_book = note_book
+            note_book.subscribe(self.__on_note_changed)
+
+    def detach(self):
+        if self.__address_book is not None:
+            self.__address_book.unsubscribe(self.__on_contact_changed)
+        if self.__note_book is not None:
+            self.__note_book.unsubscribe(self.__on_note_changed)
+        self.__address_book = self.__note_book = None
+
+    def __on_contact_changed(self, key, record: UserRecord|None):
+        # Only the last state of the record is written, when the command is finished
+        self.__pending_contacts[key] = record
+
+    def __on_note_changed(self, title, note: Note|None):
+        self.__pending_notes[title] = note
+
+    def commit(self):
+        if not self.__pending_contacts and not self.__pending_notes:
+            return
+        lines = [json.dumps({"contact": key, "record": self.contact_to_dict(record)}, ensure_ascii=False) + "\n"
+                 for key, record in self.__pending_contacts.items()]
+        lines += [json.dumps({"note": title, "record": self.note_to_dict(note)}, ensure_ascii=False) + "\n"
+                  for title, note in self.__pending_notes.items()]
+        self.__pending_contacts.clear()
+        self.__pending_notes.clear()
+        self.__file.write("".join(lines))
+        self.__file.flush()
+        # A finished command survives a power loss too, not only a crash of the process
+        os.fsync(self.__file.fileno())
+        self.operations += len(lines)
+        if self.operations >= self.COMPACT_AFTER:
+            self.__start_compaction()
+
+    def close(self):
+        self.commit()
+        if self.__compaction is not None:
+            self.__compaction.join()
+        self.__file.close()
+
+    def __start_compaction(self):
+        if self.compact is None or (self.__compaction is not None and self.__compaction.is_alive()):
+            return
+        if not os.path.exists(self.rotated_filepath):
+            # New operations go to a fresh file while the rotated one is folded into the snapshot
+            self.__file.close()
+            os.replace(self.filepath, self.rotated_filepath)
+            self.__file = open(self.filepath, "a", encoding="utf-8")
+            # Both names are on disk before the compaction writes the segments and deletes the rotated journal
+            sync_directory(os.path.dirname(self.filepath))
+            self.operations = 0
+        self.__compaction = threading.Thread(target=self.compact, args=(self.rotated_filepath,))
+        self.__compaction.start()
+
+    @staticmethod
+    def replay(filepath: str, address_book: AddressBook|None, note_book: NoteBook|None) -> int:
+        operations = 0
+        with open(filepath, "r", encoding="utf-8") as journal_file:
+            for line in journal_file:
+                try:
+                    operation = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line can be cut by a crash in the middle of writing
+                    continue
+                Journal.apply(operation, address_book, note_book)
+                operations += 1
+        return operations
+
+    @staticmethod
+    def read_operations(journal_file, offset: int = 0) -> tuple[list, int]:
+        """Reads a journal which is still written by another process, a line without "\\n" is left for the next read"""
+        journal_file.seek(offset)
+        data = journal_file.read()
+        end = data.rfind(b"\n") + 1
+        operations = []
+        for line in data[:end].decode("utf-8").splitlines():
+            try:
+                operations.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return operations, offset + end
+
+    @staticmethod
+    def apply(operation: dict, address_book: AddressBook|None, note_book: NoteBook|None):
+        if "contact" in operation and address_book is not None:
+            key = operation["contact"]
+            if operation["record"] is not None:
+                address_book[key] = Journal.contact_from_dict(operation["record"])
+            elif key in address_book:
+                del address_book[key]
+        elif "note" in operation and note_book is not None:
+            title = operation["note"]
+            if operation["record"] is not None:
+                note_book[title] = Journal.note_from_dict(operation["record"])
+            elif title in note_book:
+                del note_book[title]
+
+    @staticmethod
+    def contact_to_dict(record: UserRecord|None) -> dict|None:
+        if record is None:
+            return None
+        return {"name": record.name.value,
+                "phones": list(record.phones or ()),
+                "birthday": record.birthday.ordinal if record.birthday else None,
+                "emails": list(record.emails or ()),
+                "address": record.address.value if record.address else None}
+
+    @staticmethod
+    def contact_from_dict(record: dict) -> UserRecord:
+        # Journal is written from validated records, birthday is an ordinal
+        return UserRecord.trusted(record["name"], record["phones"], record["birthday"], record["emails"], record["address"])
+
+    @staticmethod
+    def note_to_dict(note: Note|None) -> dict|None:
+        if note is None:
+            return None
+        return {"title": note.title.value, "content": note.content.value, "tags": list(note.tags.value)}
+
+    @staticmethod
+    def note_from_dict(note: dict) -> Note:
+        return Note(note["title"], note["content"], note["tags"])
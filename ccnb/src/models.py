@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Any, List
 
 from prompt_toolkit.completion import Completer, Completion
@@ -7,19 +7,52 @@ from ccnb.src.Validator import Validator
 
 
 class Field:
-    """Base class for representing fields with a value."""
+    """Base class for representing fields with a value.
+    Fields have no __dict__, the value is kept in the only slot _value. Subclasses may store it
+    in a compact form and convert it in the value property.
+    """
+    __slots__ = ("_value",)
+
     def __init__(self, value: Any):
         self.value = value
 
+    @classmethod
+    def trusted(cls, value: Any):
+        """Creates the field from an already validated value in the stored form, without validation
+        (e.g. normalized phone, date ordinal for Birthday). Used to load data written by ccnb itself"""
+        field = cls.__new__(cls)
+        field._value = value
+        return field
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+
     def __str__(self):
         return str(self.value)
     
     def __eq__(self, other):
         return other.__class__ == self.__class__ and other.value == self.value
-    
+
+    def __getstate__(self):
+        # Tuple is never empty, so __setstate__ is called for empty values too
+        return (self._value,)
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            # Saved by an older version: __dict__ with the only attribute, e.g. {"value": ...} or {"_Phone__value": ...}
+            (state,) = state.values()
+            self.value = state
+        else:
+            (self._value,) = state
+
 class Name(Field):
     """Class for representing a name field."""
-    pass
+    __slots__ = ()
 
 class Phone(Field):
     """Class for representing a phone field.
@@ -30,43 +63,56 @@ class Phone(Field):
     __errors_handling__:
         ValueError: if the phone number does not match any of the known formats.
     """
-    def __init__(self, value: str):
-        self.__value = None
-        super().__init__(value)
-
+    __slots__ = ()
 
     @property
     def value(self):
-        return self.__value
+        return self._value
 
     @value.setter
     def value(self, phone):
-        self.__value = Validator.normalize_phone(phone)
+        self._value = Validator.normalize_phone(phone)
 
 
 
 class Birthday(Field):
     """Class for representing a birthday field.
+    The date is stored as its ordinal (see date.toordinal), value gives it as datetime.
     __init__:
         value: str
             The birthday of the contact in format DD.MM.YYYY
     __errors_handling__:
         ValueError: if the date does not match the format or is a future date
     """
-    def __init__(self, value: str):
-        self.__value = None
-        super().__init__(value)
+    __slots__ = ()
 
     @property
-    def value(self):
-        return self.__value
+    def value(self) -> datetime:
+        return datetime.fromordinal(self._value)
 
     @value.setter
     def value(self, value):
-        self.__value = Validator.validate_birthday(value)
+        # Older save files keep the validated datetime
+        value = value if isinstance(value, datetime) else Validator.validate_birthday(value)
+        self._value = value.toordinal()
+
+    @property
+    def ordinal(self) -> int:
+        return self._value
+
+    def date(self) -> date:
+        return date.fromordinal(self._value)
 
     def __str__(self):
-        return datetime.strftime(self.value, "%d.%m.%Y")
+        # strftime drops leading zeros of years before 1000 on some platforms, DD.MM.YYYY is parsed back by Validator
+        birthday = self.date()
+        return f"{birthday.day:02}.{birthday.month:02}.{birthday.year:04}"
+
+    @staticmethod
+    def iso_ordinal(text: str) -> int:
+        """Ordinal of a YYYY-MM-DD date, also of years before 1000 written without leading zeros"""
+        year, month, day = text.split("-")
+        return date(int(year), int(month), int(day)).toordinal()
 
 class Email(Field):
     """Class for representing an email field with validation.
@@ -77,22 +123,19 @@ class Email(Field):
     4) '.' is present
     5) the domain part contains only letters
     """
-    def __init__(self, value):
-        self.__value = None
-        super().__init__(value)
+    __slots__ = ()
 
     @property
     def value(self):
-        return self.__value
+        return self._value
 
     @value.setter
     def value(self, value):
-        self.__value = Validator.validate_email(value)
+        self._value = Validator.validate_email(value)
 
 
 class Address(Field):
-    def __init__(self, value):
-        super().__init__(value)
+    __slots__ = ()
         
 class UserRecord:
     """Class for representing a contact record.
@@ -108,7 +151,12 @@ class UserRecord:
             The email addresses of the contact. Valid format string user@subdomain.domain
         address: str
             The address of the contact. Without any validation.
+    Phones and emails are kept as lists of validated strings, the record has no __dict__.
+    dirty: bool, True if the record was created or changed after it was loaded or mark_clean() was called
+        Set by every setter and add/remove method, so persistence can skip records which are already saved
         """
+    __slots__ = ("__name", "__phones", "__birthday", "__emails", "__address", "__listener", "__dirty")
+
     def __init__(self, name: str,
                  phones: List[str]=None,
                  birthday: str=None,
@@ -119,6 +167,8 @@ class UserRecord:
         self.__birthday = None    # For validation and formatting
         self.__emails = []        # For validation
         self.__address = None     # For make sure that the address is always an Address instance + prepare for future validation
+        self.__listener = None    # Callback of the AddressBook holding this record, called after every change
+        self.__dirty = True       # New record is not saved anywhere yet
 
         if phones:
             self.phones = phones
@@ -139,6 +189,53 @@ class UserRecord:
                 f"\nemail: {'; '.join(self.emails) if self.emails else 'Not set'}, "
                 f"\naddress: {self.address if self.address else 'Not set'}")
 
+    @classmethod
+    def trusted(cls, name: str, phones: List[str]=None, birthday: int=None, emails: List[str]=None, address: str=None):
+        """Creates the record from already validated values without validation: normalized phones and emails,
+        birthday as a date ordinal. Duplicate phones and emails are dropped.
+        Used to load data written by ccnb itself and for values checked by the Validator batch methods"""
+        record = cls.__new__(cls)
+        record.__name = Name.trusted(name)
+        record.__phones = list(dict.fromkeys(phones)) if phones else []
+        record.__birthday = Birthday.trusted(birthday) if birthday else None
+        record.__emails = list(dict.fromkeys(emails)) if emails else []
+        record.__address = Address.trusted(address) if address else None
+        record.__listener = None
+        record.__dirty = False
+        return record
+
+    def __getstate__(self):
+        # Same state as __dict__ of older versions. Listener belongs to the AddressBook instance and is restored by it after loading
+        return {"_UserRecord__name": self.__name, "_UserRecord__phones": self.__phones, "_UserRecord__birthday": self.__birthday,
+                "_UserRecord__emails": self.__emails, "_UserRecord__address": self.__address}
+
+    def __setstate__(self, state):
+        self.__name = state["_UserRecord__name"]
+        self.__birthday = state["_UserRecord__birthday"]
+        self.__address = state["_UserRecord__address"]
+        # Older versions kept Phone and Email objects
+        self.__phones = [phone.value if isinstance(phone, Field) else phone for phone in state["_UserRecord__phones"]]
+        self.__emails = [email.value if isinstance(email, Field) else email for email in state["_UserRecord__emails"]]
+        self.__listener = None
+        self.__dirty = False
+
+    def set_listener(self, listener):
+        """Set callback without arguments to be called after any change of the record (None to unset)"""
+        self.__listener = listener
+
+    @property
+    def dirty(self) -> bool:
+        return self.__dirty
+
+    def mark_clean(self):
+        """Called when the current state of the record is saved"""
+        self.__dirty = False
+
+    def _notify(self):
+        self.__dirty = True
+        if self.__listener is not None:
+            self.__listener()
+
     @staticmethod
     def truncate_list_of_recs(records) -> str:
         records = list(records) if records else None
@@ -156,39 +253,48 @@ class UserRecord:
     @name.setter
     def name(self, name: str):
         self.__name = Name(name)
+        self._notify()
 
     @property
     def phones(self):
         if len(self.__phones) == 0:
             return None
-        return (p.value for p in self.__phones)
+        return iter(self.__phones)
 
     @phones.setter
     def phones(self, phones: List[str]):
+        # Set of known phones keeps adding many phones linear
+        known = set(self.__phones)
+        added = []
         for phone in phones:
-            self.add_phone(phone)
+            phone = Phone(phone).value
+            if phone in known:
+                raise ValueError(f"[ERROR] Number {phone} already exists in the record {self.name.value}")
+            known.add(phone)
+            added.append(phone)
+        # All phones are added after validation with one notification, the listener reindexes the record once
+        if added:
+            self.__phones.extend(added)
+            self._notify()
 
     def add_phone(self, phone: str):
-        phone = Phone(phone)
+        phone = Phone(phone).value
         if phone not in self.__phones:
             self.__phones.append(phone)
+            self._notify()
         else:
             raise ValueError(f"[ERROR] Number {phone} already exists in the record {self.name.value}")
 
-    @phones.setter
-    def phones(self, phones: List[str]):
-        for phone in phones:
-            self.add_phone(phone)
-
     def remove_phone(self, phone: str):
-        phone = Phone(phone)
+        phone = Phone(phone).value
         if phone not in self.__phones:
-            raise ValueError(f"{phone.value} does not exist")
+            raise ValueError(f"{phone} does not exist")
         else:
             self.__phones.remove(phone)
+            self._notify()
 
     def edit_phone(self, phone: str, new_phone: str):
-        if Phone(phone) not in self.__phones:
+        if Phone(phone).value not in self.__phones:
             raise ValueError(f"{phone} does not exist")
         self.add_phone(new_phone)  # Try to add new phone raises an error if the phone already exists
         self.remove_phone(phone)   # Remove the old phone if the new one was added successfully. Otherwise, the old phone remains in the list
@@ -204,34 +310,46 @@ class UserRecord:
     def birthday(self, birthday: str):
         birthday = Birthday(birthday)
         self.__birthday = birthday
+        self._notify()
 
     @property
     def emails(self):
         if len(self.__emails) == 0:
             return None
-        return (email.value for email in self.__emails)
+        return iter(self.__emails)
 
     @emails.setter
     def emails(self, emails: List[str]):
+        known = set(self.__emails)
+        added = []
         for email in emails:
-            self.add_email(email)
+            email = Email(email).value
+            if email in known:
+                raise ValueError(f"[ERROR] Email {email} already exists in the record {self.name.value}")
+            known.add(email)
+            added.append(email)
+        if added:
+            self.__emails.extend(added)
+            self._notify()
 
     def add_email(self, email):
-        email = Email(email)
+        email = Email(email).value
         if email not in self.__emails:
             self.__emails.append(email)
+            self._notify()
         else:
             raise ValueError(f"[ERROR] Email {email} already exists in the record {self.name.value}")
 
     def remove_email(self, email):
-        email = Email(email)
+        email = Email(email).value
         if email not in self.__emails:
-            raise ValueError(f"{email.value} does not exist")
+            raise ValueError(f"{email} does not exist")
         else:
             self.__emails.remove(email)
+            self._notify()
 
     def edit_email(self, email, new_email):
-        if Email(email) not in self.__emails:
+        if Email(email).value not in self.__emails:
             raise ValueError(f"{email} does not exist")
         self.add_email(new_email)  # Try to add new email raises an error if the email already exists
         self.remove_email(email)   # Remove the old email if the new one was added successfully. Otherwise, the old email remains in the list
@@ -244,20 +362,24 @@ class UserRecord:
     def address(self, address):
         address_inst = Address(address)
         self.__address = address_inst
+        self._notify()
 
 class Title(Field):
     """Class for representing the title of a note."""
-    pass
+    __slots__ = ()
 
 class Content(Field):
     """Class for representing the content of a note."""
+    __slots__ = ()
+
     def short_string(self, length = 40):
         full_str = str(self)
         return full_str if len(full_str) <= 40 else (full_str[0:length - 4] + "...")
-    pass
 
 class Tags(Field):
     """Class for representing tags of a note. Contains a list of strings"""
+    __slots__ = ()
+
     def __init__(self, value: List[str]):
         super().__init__(value)
 
@@ -279,11 +401,45 @@ class Note:
             Updates the content of the note
         search_by_keyword(keyword: str) -> bool
             Searches for a keyword in the title, content, and tags of the note
+        mark_clean()
+            Clears dirty, the flag is set by every change of the note made through its methods
     """
+    __slots__ = ("title", "content", "tags", "__listener", "__dirty")
+
     def __init__(self, title: str, content: str, tags: List[str] = None):
         self.title = Title(title)
         self.content = Content(content)
         self.tags = Tags(tags) if tags else Tags([])
+        self.__listener = None  # Callback of the NoteBook holding this note, called after every change
+        self.__dirty = True     # New note is not saved anywhere yet
+
+    def __getstate__(self):
+        # Same state as __dict__ of older versions. Listener belongs to the NoteBook instance and is restored by it after loading
+        return {"title": self.title, "content": self.content, "tags": self.tags}
+
+    def __setstate__(self, state):
+        self.title = state["title"]
+        self.content = state["content"]
+        self.tags = state["tags"]
+        self.__listener = None
+        self.__dirty = False
+
+    def set_listener(self, listener):
+        """Set callback without arguments to be called after any change of the note (None to unset)"""
+        self.__listener = listener
+
+    @property
+    def dirty(self) -> bool:
+        return self.__dirty
+
+    def mark_clean(self):
+        """Called when the current state of the note is saved"""
+        self.__dirty = False
+
+    def _notify(self):
+        self.__dirty = True
+        if self.__listener is not None:
+            self.__listener()
 
     def __str__(self):
         tags_str = ', '.join(self.tags.value) if self.tags.value else 'No tags'
@@ -292,13 +448,16 @@ class Note:
     def add_tag(self, tag: str):
         if tag not in self.tags.value:
             self.tags.value.append(tag)
+            self._notify()
 
     def remove_tag(self, tag: str):
         if tag in self.tags.value:
             self.tags.value.remove(tag)
+            self._notify()
 
     def edit_content(self, new_content: str):
         self.content = Content(new_content)
+        self._notify()
 
     def search_by_keyword(self, keyword: str) -> bool:
         keyword = keyword.lower()
@@ -0,0 +1,699 @@
+import array
+import bisect
+import functools
+import heapq
+import json
+import mmap
+import os
+import struct
+import sys
+from collections import Counter, OrderedDict
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Tuple
+
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.durable import durable_replace
+from ccnb.src.NoteBook import NoteBook
+from ccnb.src.Table import Table
+from ccnb.src.indexes import TextIndex
+from ccnb.src.journal import Journal
+from ccnb.src.models import Birthday, Note, UserRecord, Validator
+
+
+class RecordStore:
+    """Memory-mapped save file with an offset index, records are decoded only when they are accessed.
+    Opening the file maps it and reads the header, so startup time and memory don't depend on the size of the books.
+    Layout, all integers are little-endian i64 arrays aligned to 8 bytes:
+        header: MAGIC, version: u16, user_id, number of contacts n, number of notes m,
+                then (offset, size) of every section in SECTIONS order
+        contacts / notes: records as UTF-8 JSON arrays, one after another
+            contact: [name, [phones], birthday "YYYY-MM-DD" or null, [emails], address or null]
+            note: [title, content, [tags]]
+        contact_keys: n keys in ascending order, contact_offsets: n + 1 offsets of the records in contacts
+        name_order / name_offsets / names: positions of contacts sorted by lowercased name and key,
+            their lowercased UTF-8 names in this order, UTF-8 keeps the order of code points
+        name_ranks: index of every contact in name_order
+        birthday_days: month * 100 + day of every contact, 0 if not set
+        birthday_order: positions of contacts with birthday sorted by birthday_days and key
+        note_offsets: m + 1 offsets of the records in notes, notes are in the order of insertion
+        title_order / title_offsets / titles: positions of notes sorted by UTF-8 title and their titles
+        title_ranks: index of every note in title_order
+    Changes are appended to the Journal <filepath>.journal and written into a new store file on close,
+    so a change doesn't rewrite the whole file.
+    Only names, titles and birthdays are indexed. search, phone lookups, tag queries and sorting of notes read
+    every record and cost O(n) per query, the first search_notes also builds the text index of all notes.
+    __init__:
+        filepath: str, path of the store file, an empty store is created if the file doesn't exist
+    Attributes:
+        address_book: LazyAddressBook
+        note_book: LazyNoteBook
+    Methods:
+        is_empty() -> bool
+        commit()
+            appends changes made since the last commit to the journal
+        close()
+            writes a new store file with all changes, unmaps the file and deletes the journal
+        write(filepath, address_book, note_book)
+            writes any books to a store file, unchanged records of lazy books are copied without decoding
+        create(filepath, address_book, note_book)
+            writes a new store file through <filepath>.tmp
+    """
+    MAGIC = b"CCNR"
+    VERSION = 1
+    HEADER = struct.Struct("<4sH2xqQQ")
+    SECTION = struct.Struct("<QQ")
+    SECTIONS = ("contacts", "contact_keys", "contact_offsets", "name_order", "name_offsets", "names", "name_ranks",
+                "birthday_days", "birthday_order",
+                "notes", "note_offsets", "title_order", "title_offsets", "titles", "title_ranks")
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        if not os.path.exists(filepath):
+            self.create(filepath, AddressBook(), NoteBook())
+        self.__map = None
+        self.__views = []
+        self.address_book = LazyAddressBook(self)
+        self.note_book = LazyNoteBook(self)
+        self.__open()
+        journal_path = filepath + ".journal"
+        if os.path.exists(journal_path):
+            Journal.replay(journal_path, self.address_book, self.note_book)
+        self.__journal = Journal(journal_path)
+        self.__journal.attach(self.address_book, self.note_book)
+
+    def __open(self):
+        with open(self.filepath, "rb") as store_file:
+            self.__map = mmap.mmap(store_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, user_id, contacts, notes = self.HEADER.unpack_from(self.__map)
+        if magic != self.MAGIC:
+            raise ValueError(f"{self.filepath} is not a ccnb record store")
+        if version > self.VERSION:
+            raise ValueError(f"Record store version {version} is not supported, please update ccnb")
+        view = memoryview(self.__map)
+        self.__views = [view]
+        sections = {}
+        for i, name in enumerate(self.SECTIONS):
+            offset, size = self.SECTION.unpack_from(self.__map, self.HEADER.size + i * self.SECTION.size)
+            sections[name] = view[offset:offset + size]
+            self.__views.append(sections[name])
+        for name in sections:
+            if name not in ("contacts", "names", "notes", "titles"):
+                sections[name] = self.__ints(sections[name])
+        self.address_book.attach(sections, user_id)
+        self.note_book.attach(sections)
+
+    def __ints(self, section: memoryview):
+        if sys.byteorder == "little":
+            ints = section.cast("q")
+            self.__views.append(ints)
+            return ints
+        ints = array.array("q", section.tobytes())
+        ints.byteswap()
+        return ints
+
+    def __release(self):
+        for view in reversed(self.__views):
+            view.release()
+        self.__views = []
+        self.__map.close()
+
+    def is_empty(self) -> bool:
+        return len(self.address_book) == 0 and len(self.note_book) == 0
+
+    def commit(self):
+        self.__journal.commit()
+
+    def close(self):
+        self.__journal.close()
+        self.__journal.detach()
+        if self.address_book.changed() or self.note_book.changed():
+            self.write(self.filepath + ".tmp", self.address_book, self.note_book)
+            # Mapped records are read while writing the new file, old mapping is released only after that
+            self.__release()
+            durable_replace(self.filepath + ".tmp", self.filepath)
+        else:
+            self.__release()
+        os.remove(self.__journal.filepath)
+
+    @staticmethod
+    def create(filepath, address_book, note_book):
+        """Writes the books to a temporary file and renames it to filepath, a crash never leaves a half written store"""
+        RecordStore.write(filepath + ".tmp", address_book, note_book)
+        durable_replace(filepath + ".tmp", filepath)
+
+    @staticmethod
+    def write(filepath, address_book, note_book):
+        """Writes books to filepath, books are LazyAddressBook/LazyNoteBook or any AddressBook/NoteBook"""
+        contacts = (address_book.entries() if isinstance(address_book, LazyAddressBook)
+                    else (LazyAddressBook.entry(key, record) for key, record in address_book.items()))
+        notes = (note_book.entries() if isinstance(note_book, LazyNoteBook)
+                 else (LazyNoteBook.entry(note) for note in note_book.values()))
+        with open(filepath, "wb") as store_file:
+            header_size = RecordStore.HEADER.size + RecordStore.SECTION.size * len(RecordStore.SECTIONS)
+            store_file.write(bytes(header_size))
+            sections = {}
+
+            def write_section(name, data):
+                store_file.write(bytes(-store_file.tell() % 8))
+                sections[name] = (store_file.tell(), len(data))
+                store_file.write(data)
+
+            def write_records(name, records):
+                store_file.write(bytes(-store_file.tell() % 8))
+                start = store_file.tell()
+                offsets = array.array("q", [0])
+                for raw in records:
+                    store_file.write(raw)
+                    offsets.append(offsets[-1] + len(raw))
+                sections[name] = (start, offsets[-1])
+                return offsets
+
+            def ints(values):
+                values = array.array("q", values)
+                if sys.byteorder == "big":
+                    values.byteswap()
+                return values.tobytes()
+
+            keys, names, days = array.array("q"), [], array.array("q")
+            def contact_records():
+                for key, raw, name, birthday_days in contacts:
+                    keys.append(key)
+                    names.append(name)
+                    days.append(birthday_days)
+                    yield raw
+            contact_offsets = write_records("contacts", contact_records())
+            name_order = sorted(range(len(keys)), key=lambda i: (names[i], keys[i]))
+            birthday_order = sorted((i for i in range(len(keys)) if days[i]), key=lambda i: (days[i], keys[i]))
+            sorted_names = [names[i] for i in name_order]
+            write_section("contact_keys", ints(keys))
+            write_section("contact_offsets", ints(contact_offsets))
+            write_section("name_order", ints(name_order))
+            write_section("name_offsets", ints(RecordStore.__offsets(sorted_names)))
+            write_section("names", b"".join(sorted_names))
+            write_section("name_ranks", ints(RecordStore.__ranks(name_order)))
+            write_section("birthday_days", ints(days))
+            write_section("birthday_order", ints(birthday_order))
+
+            titles = []
+            def note_records():
+                for title, raw in notes:
+                    titles.append(title)
+                    yield raw
+            note_offsets = write_records("notes", note_records())
+            title_order = sorted(range(len(titles)), key=titles.__getitem__)
+            sorted_titles = [titles[i] for i in title_order]
+            write_section("note_offsets", ints(note_offsets))
+            write_section("title_order", ints(title_order))
+            write_section("title_offsets", ints(RecordStore.__offsets(sorted_titles)))
+            write_section("titles", b"".join(sorted_titles))
+            write_section("title_ranks", ints(RecordStore.__ranks(title_order)))
+
+            store_file.seek(0)
+            store_file.write(RecordStore.HEADER.pack(RecordStore.MAGIC, RecordStore.VERSION, address_book.user_id,
+                                                     len(keys), len(titles)))
+            for name in RecordStore.SECTIONS:
+                store_file.write(RecordStore.SECTION.pack(*sections[name]))
+            store_file.flush()
+            os.fsync(store_file.fileno())
+
+    @staticmethod
+    def __offsets(values: List[bytes]) -> array.array:
+        offsets = array.array("q", [0])
+        for value in values:
+            offsets.append(offsets[-1] + len(value))
+        return offsets
+
+    @staticmethod
+    def __ranks(order: List[int]) -> array.array:
+        ranks = array.array("q", bytes(8 * len(order)))
+        for index, position in enumerate(order):
+            ranks[position] = index
+        return ranks
+
+    @staticmethod
+    def sorted_entry(sections: Dict, name: str, position: int) -> memoryview:
+        """Entry of the position in the sorted blob "name" (names or titles)"""
+        prefix = name[:-1]
+        rank = sections[prefix + "_ranks"][position]
+        offsets = sections[prefix + "_offsets"]
+        return sections[name][offsets[rank]:offsets[rank + 1]]
+
+    @staticmethod
+    def find_sorted(order, offsets, blob, value: bytes) -> int:
+        """First index in order of the blob entry >= value, entries of the blob are sorted"""
+        return bisect.bisect_left(range(len(order)), value, key=lambda i: bytes(blob[offsets[i]:offsets[i + 1]]))
+
+
+class LazyAddressBook(MutableMapping):
+    """AddressBook interface over a RecordStore. Keys are contact ids.
+    Contacts are decoded on access, the last CACHE_SIZE decoded contacts are kept in an LRU cache.
+    Added, changed and deleted contacts are kept in memory until RecordStore.close().
+    find/delete use the name index of the store, birthday queries use the birthday index,
+    search and phone lookups scan all records, O(n) per query, without keeping them in memory.
+    See AddressBook for the description of operations.
+    """
+    CACHE_SIZE = 1000
+
+    def __init__(self, store: RecordStore):
+        self.store = store
+        self.user_id = 0
+        self.__sections = None
+        self.__cache = OrderedDict()  # key -> decoded UserRecord
+        self.__changed = {}           # key -> UserRecord, None for deleted contacts
+        self.__subscribers = []
+
+    def attach(self, sections: Dict, user_id: int):
+        """Called by the store after the file is mapped"""
+        self.__sections = sections
+        self.user_id = user_id
+
+    def changed(self) -> bool:
+        return bool(self.__changed)
+
+    @staticmethod
+    def entry(key, record: UserRecord) -> Tuple[int, bytes, bytes, int]:
+        """(key, encoded record, lowercased UTF-8 name, birthday month * 100 + day) of a record"""
+        birthday = record.birthday.date() if record.birthday else None
+        raw = json.dumps([record.name.value, list(record.phones or ()), birthday.isoformat() if birthday else None,
+                          list(record.emails or ()), record.address.value if record.address else None],
+                         ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return key, raw, record.name.value.lower().encode("utf-8"), birthday.month * 100 + birthday.day if birthday else 0
+
+    def entries(self) -> Iterator[Tuple[int, bytes, bytes, int]]:
+        """Entries of all contacts in key order, unchanged ones are copied from the store"""
+        sections = self.__sections
+        for key in self:
+            if key in self.__changed:
+                yield self.entry(key, self.__changed[key])
+            else:
+                position = self.__position(key)
+                yield (key, bytes(self.__raw(position)), bytes(RecordStore.sorted_entry(sections, "names", position)),
+                       sections["birthday_days"][position])
+
+    def __stored_keys(self):
+        return self.__sections["contact_keys"]
+
+    def __position(self, key) -> int|None:
+        """Position of the key in the store"""
+        keys = self.__stored_keys()
+        position = bisect.bisect_left(keys, key)
+        return position if position < len(keys) and keys[position] == key else None
+
+    def __raw(self, position) -> memoryview:
+        offsets = self.__sections["contact_offsets"]
+        return self.__sections["contacts"][offsets[position]:offsets[position + 1]]
+
+    def __values(self, position) -> list:
+        return json.loads(bytes(self.__raw(position)))
+
+    @staticmethod
+    def __record(values) -> UserRecord:
+        name, phones, birthday, emails, address = values
+        birthday = Birthday.iso_ordinal(birthday) if birthday else None
+        return UserRecord.trusted(name, phones, birthday, emails, address)
+
+    def __len__(self):
+        stored = len(self.__stored_keys())
+        for key, record in self.__changed.items():
+            if self.__position(key) is None:
+                stored += 1
+            elif record is None:
+                stored -= 1
+        return stored
+
+    def __iter__(self) -> Iterator[int]:
+        new_keys = sorted(key for key, record in self.__changed.items() if record is not None and self.__position(key) is None)
+        for key in heapq.merge(self.__stored_keys(), new_keys):
+            if key not in self.__changed or self.__changed[key] is not None:
+                yield key
+
+    def __contains__(self, key):
+        if key in self.__changed:
+            return self.__changed[key] is not None
+        return self.__position(key) is not None
+
+    def __getitem__(self, key) -> UserRecord:
+        if key in self.__changed:
+            if self.__changed[key] is None:
+                raise KeyError(key)
+            return self.__changed[key]
+        if key in self.__cache:
+            self.__cache.move_to_end(key)
+            return self.__cache[key]
+        position = self.__position(key)
+        if position is None:
+            raise KeyError(key)
+        record = self.__record(self.__values(position))
+        record.set_listener(functools.partial(self.__record_changed, key, record))
+        self.__cache[key] = record
+        self.__trim_cache()
+        return record
+
+    def __trim_cache(self):
+        while len(self.__cache) > self.CACHE_SIZE:
+            self.__cache.popitem(last=False)
+
+    def __setitem__(self, key, record: UserRecord):
+        self.__forget(key)
+        self.__changed[key] = record
+        self.user_id = max(self.user_id, key)
+        record.set_listener(functools.partial(self.__record_changed, key, record))
+        self.__publish(key, record)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.__forget(key)
+        self.__changed[key] = None
+        self.__publish(key, None)
+
+    def __forget(self, key):
+        """Drops the record object of the key, it is not a part of the book anymore"""
+        record = self.__changed.get(key) or self.__cache.pop(key, None)
+        if record is not None:
+            record.set_listener(None)
+
+    def __record_changed(self, key, record: UserRecord):
+        """Called by the record after it was changed, changed records stay in memory until the store is closed"""
+        self.__cache.pop(key, None)
+        self.__changed[key] = record
+        self.__publish(key, record)
+
+    def subscribe(self, callback):
+        self.__subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.__subscribers.remove(callback)
+
+    def __publish(self, key, record):
+        for callback in self.__subscribers:
+            callback(key, record)
+
+    def __scan(self, raw_filter: bytes = b"") -> Iterator[Tuple[int, list]]:
+        """(key, plain values) of all contacts in key order, stored contacts without raw_filter bytes are skipped"""
+        for key in self:
+            if key in self.__changed:
+                record = self.__changed[key]
+                birthday = record.birthday.date() if record.birthday else None
+                yield key, [record.name.value, list(record.phones or ()), birthday.isoformat() if birthday else None,
+                            list(record.emails or ()), record.address.value if record.address else None]
+            else:
+                raw = self.__raw(self.__position(key))
+                if raw_filter and raw_filter not in raw.tobytes():
+                    continue
+                yield key, json.loads(bytes(raw))
+
+    def __find_key(self, name: str) -> int|None:
+        keys = [key for key, record in self.__changed.items() if record is not None and record.name.value.lower() == name.lower()]
+        sections = self.__sections
+        order, offsets, names = sections["name_order"], sections["name_offsets"], sections["names"]
+        name = name.lower().encode("utf-8")
+        index = RecordStore.find_sorted(order, offsets, names, name)
+        # Entries with the same name are sorted by key, the first one not changed in this session is the oldest
+        while index < len(order) and names[offsets[index]:offsets[index + 1]] == name:
+            key = self.__stored_keys()[order[index]]
+            if key not in self.__changed:
+                keys.append(key)
+                break
+            index += 1
+        # The oldest record wins if several contacts share the same name
+        return min(keys) if keys else None
+
+    def add_record(self, record: UserRecord):
+        key = self.user_id + 1
+        if key in self:
+            raise KeyError("Contact already exists")
+        self[key] = record
+
+    def find(self, name: str) -> UserRecord|None:
+        key = self.__find_key(name)
+        return self[key] if key is not None else None
+
+    def delete(self, name: str):
+        key = self.__find_key(name)
+        if key is None:
+            raise KeyError("Contact doesn\'t exist")
+        del self[key]
+
+    def search(self, pattern: str) -> List[UserRecord]:
+        keys = [key for key, (name, phones, birthday, emails, address) in self.__scan()
+                if AddressBook.matches(pattern, name, phones, birthday + " 00:00:00" if birthday else None, emails, address)]
+        return [self[key] for key in keys]
+
+    def find_by_phone(self, phone: str) -> List[UserRecord]:
+        phone = Validator.normalize_phone(phone)
+        return [self[key] for key, values in self.__scan(phone.encode()) if phone in values[1]]
+
+    def search_by_phone(self, digits: str, suffix_only = False) -> List[UserRecord]:
+        if suffix_only:
+            keys = [key for key, values in self.__scan(digits.encode()) if any(phone.endswith(digits) for phone in values[1])]
+        else:
+            keys = [key for key, values in self.__scan(digits.encode()) if any(digits in phone for phone in values[1])]
+        return [self[key] for key in keys]
+
+    def __birthday_days(self, key) -> int:
+        record = self.__changed[key]
+        return record.birthday.value.month * 100 + record.birthday.value.day if record and record.birthday else 0
+
+    def __birthdays_from(self, start: Tuple[int, int]) -> Iterator[int]:
+        """Keys in calendar order of birthdays starting from (month, day), without changed contacts"""
+        sections = self.__sections
+        order, days, keys = sections["birthday_order"], sections["birthday_days"], self.__stored_keys()
+        index = bisect.bisect_left(range(len(order)), start[0] * 100 + start[1], key=lambda i: days[order[i]])
+        for i in range(len(order)):
+            key = keys[order[(index + i) % len(order)]]
+            if key not in self.__changed:
+                yield key
+
+    def __birthdays_between(self, start: Tuple[int, int], end: Tuple[int, int]) -> List[int]:
+        sections = self.__sections
+        order, days, keys = sections["birthday_order"], sections["birthday_days"], self.__stored_keys()
+        first, last = start[0] * 100 + start[1], end[0] * 100 + end[1]
+        index = bisect.bisect_left(range(len(order)), first, key=lambda i: days[order[i]])
+        result = []
+        while index < len(order) and days[order[index]] <= last:
+            key = keys[order[index]]
+            if key not in self.__changed:
+                result.append(key)
+            index += 1
+        result.extend(key for key in self.__changed if first <= self.__birthday_days(key) <= last)
+        return result
+
+    def get_upcoming_birthdays(self, specific_date = None, days = 7) -> List[Dict[str, str]]:
+        return AddressBook.upcoming_birthdays(lambda start, end: ((key, self[key]) for key in self.__birthdays_between(start, end)),
+                                              AddressBook.parse_date(specific_date), days)
+
+    def get_next_birthdays(self, count = 5, specific_date = None) -> List[Dict[str, str]]:
+        today = AddressBook.parse_date(specific_date)
+        keys = set(key for _, key in zip(range(count), self.__birthdays_from((today.month, today.day))))
+        keys.update(key for key in self.__changed if self.__birthday_days(key))
+        return AddressBook.next_birthdays(lambda start, end: ((key, self[key]) for key in self.__birthdays_between(start, end)),
+                                          {key: self[key] for key in keys}, today, count)
+
+    def get_birthdays_in_month(self, month: int) -> List[Dict[str, str]]:
+        def in_month(month):
+            keys = self.__birthdays_between((month, 1), (month, 31))
+            keys.sort(key=lambda key: (self[key].birthday.value.day, key))
+            return (self[key] for key in keys)
+        return AddressBook.birthdays_in_month(month, in_month)
+
+
+class LazyNoteBook(MutableMapping):
+    """NoteBook interface over a RecordStore. Keys are note titles, notes keep the order of insertion.
+    Notes are decoded on access, the last CACHE_SIZE decoded notes are kept in an LRU cache.
+    Added, changed and deleted notes are kept in memory until RecordStore.close().
+    Tag queries and sorting scan all notes, O(n) per query, the text index for search_notes is built on the first search.
+    See NoteBook for the description of operations.
+    """
+    CACHE_SIZE = 1000
+
+    def __init__(self, store: RecordStore):
+        self.store = store
+        self.__sections = None
+        self.__cache = OrderedDict()  # title -> decoded Note
+        self.__modified = {}          # title -> Note changed in place, keeps its position
+        self.__deleted = set()        # stored titles deleted or replaced in this session
+        self.__added = {}             # title -> Note added in this session, in the order of insertion
+        self.__text_index = None      # TextIndex, None until the first search
+        self.__subscribers = []
+
+    def attach(self, sections: Dict):
+        """Called by the store after the file is mapped"""
+        self.__sections = sections
+
+    def changed(self) -> bool:
+        return bool(self.__modified or self.__deleted or self.__added)
+
+    @staticmethod
+    def entry(note: Note) -> Tuple[bytes, bytes]:
+        """(UTF-8 title, encoded note) of a note"""
+        raw = json.dumps([note.title.value, note.content.value, list(note.tags.value)],
+                         ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return note.title.value.encode("utf-8"), raw
+
+    def entries(self) -> Iterator[Tuple[bytes, bytes]]:
+        """Entries of all notes in the order of insertion, unchanged ones are copied from the store"""
+        for position, title in self.__stored_titles():
+            if title in self.__modified:
+                yield self.entry(self.__modified[title])
+            else:
+                yield bytes(RecordStore.sorted_entry(self.__sections, "titles", position)), bytes(self.__raw(position))
+        for note in self.__added.values():
+            yield self.entry(note)
+
+    def __raw(self, position) -> memoryview:
+        offsets = self.__sections["note_offsets"]
+        return self.__sections["notes"][offsets[position]:offsets[position + 1]]
+
+    def __stored_titles(self) -> Iterator[Tuple[int, str]]:
+        """(position, title) of stored notes which are not deleted, in the order of insertion"""
+        for position in range(len(self.__sections["note_offsets"]) - 1):
+            title = bytes(RecordStore.sorted_entry(self.__sections, "titles", position)).decode("utf-8")
+            if title not in self.__deleted:
+                yield position, title
+
+    def __position(self, title) -> int|None:
+        sections = self.__sections
+        order, offsets, titles = sections["title_order"], sections["title_offsets"], sections["titles"]
+        encoded = title.encode("utf-8")
+        index = RecordStore.find_sorted(order, offsets, titles, encoded)
+        if index < len(order) and titles[offsets[index]:offsets[index + 1]] == encoded:
+            return order[index]
+        return None
+
+    def __len__(self):
+        return len(self.__sections["note_offsets"]) - 1 - len(self.__deleted) + len(self.__added)
+
+    def __iter__(self) -> Iterator[str]:
+        return (title for title, _ in self.items())
+
+    def __contains__(self, title):
+        if title in self.__added:
+            return True
+        return title not in self.__deleted and self.__position(title) is not None
+
+    def __getitem__(self, title) -> Note:
+        if title in self.__added:
+            return self.__added[title]
+        if title in self.__deleted:
+            raise KeyError(title)
+        if title in self.__modified:
+            return self.__modified[title]
+        if title in self.__cache:
+            self.__cache.move_to_end(title)
+            return self.__cache[title]
+        position = self.__position(title)
+        if position is None:
+            raise KeyError(title)
+        note = self.__note(title, position)
+        self.__cache[title] = note
+        self.__trim_cache()
+        return note
+
+    def __note(self, title, position) -> Note:
+        note = Note(*json.loads(bytes(self.__raw(position))))
+        note.set_listener(functools.partial(self.__note_changed, title, note))
+        return note
+
+    def __trim_cache(self):
+        while len(self.__cache) > self.CACHE_SIZE:
+            self.__cache.popitem(last=False)
+
+    def __setitem__(self, title, note: Note):
+        # Replaced note moves to the end, like in NoteBook
+        if title in self:
+            del self[title]
+        self.__added[title] = note
+        note.set_listener(functools.partial(self.__note_changed, title, note))
+        self.__index(title, note)
+        self.__publish(title, note)
+
+    def __delitem__(self, title):
+        if title not in self:
+            raise KeyError(title)
+        note = self.__added.get(title) or self.__modified.pop(title, None) or self.__cache.pop(title, None)
+        if note is not None:
+            note.set_listener(None)
+        if self.__added.pop(title, None) is None:
+            self.__deleted.add(title)
+        if self.__text_index is not None:
+            self.__text_index.remove(title)
+        self.__publish(title, None)
+
+    def __note_changed(self, title, note: Note):
+        """Called by the note after it was changed, changed notes stay in memory until the store is closed"""
+        if title not in self.__added:
+            self.__cache.pop(title, None)
+            self.__modified[title] = note
+        self.__index(title, note)
+        self.__publish(title, note)
+
+    def __index(self, title, note: Note):
+        if self.__text_index is not None:
+            self.__text_index.remove(title)
+            self.__text_index.add(title, [note.title.value, note.content.value, *note.tags.value])
+
+    def items(self) -> Iterator[Tuple[str, Note]]:
+        """Notes in the order of insertion, stored notes are decoded without caching"""
+        for position, title in self.__stored_titles():
+            if title in self.__modified:
+                yield title, self.__modified[title]
+            else:
+                yield title, self.__cache.get(title) or self.__note(title, position)
+        yield from self.__added.items()
+
+    def values(self) -> Iterator[Note]:
+        return (note for _, note in self.items())
+
+    def subscribe(self, callback):
+        self.__subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.__subscribers.remove(callback)
+
+    def __publish(self, title, note):
+        for callback in self.__subscribers:
+            callback(title, note)
+
+    # Commands over the mapping interface and the queries below are the same as in NoteBook
+    add_note = NoteBook.add_note
+    edit_note = NoteBook.edit_note
+    delete_note = NoteBook.delete_note
+    add_tags_to_note = NoteBook.add_tags_to_note
+    remove_tag_from_note = NoteBook.remove_tag_from_note
+    show_all_notes = NoteBook.show_all_notes
+    sort_notes_by_tag_count = NoteBook.sort_notes_by_tag_count
+    sort_notes_by_tags_alphabetically = NoteBook.sort_notes_by_tags_alphabetically
+
+    def search_notes(self, keyword: str, limit: int = None) -> Table:
+        if self.__text_index is None:
+            self.__text_index = TextIndex()
+            for title, note in self.items():
+                self.__text_index.add(title, [note.title.value, note.content.value, *note.tags.value])
+        found_notes = [self[title] for title, _ in self.__text_index.search(keyword, limit)]
+        return NoteBook.search_table(found_notes, keyword, self.values(), limit)
+
+    def search_notes_by_tags(self, tags: List[str]) -> Table:
+        tags = set(tags)
+        found_notes = (note for note in self.values() if tags.issubset(note.tags.value))
+        return NoteBook.notes_table(((note, note.tags.value) for note in found_notes),
+                                    f"No notes found with tags {', '.join(tags)}.")
+
+    def count_notes_by_tag(self, tag: str) -> int:
+        return sum(1 for note in self.values() if tag in note.tags.value)
+
+    def show_tag_counts(self) -> Table:
+        return NoteBook.tag_counts_table(Counter(tag for note in self.values() for tag in set(note.tags.value)).items())
+
+    def __sorted_notes(self, sort_key) -> Iterator[Tuple[Note, Tuple[str, ...]]]:
+        """(note, sorted tags) ordered by sort_key(sorted tags), ties keep the order of insertion.
+        Only titles and tags are kept while sorting, notes are read again while the result is shown"""
+        entries = sorted((sort_key(tags), position, title, tags) for position, (title, tags) in
+                         enumerate((title, tuple(sorted(note.tags.value))) for title, note in self.items()))
+        return ((self[title], tags) for _, _, title, tags in entries)
+
+    def iter_notes_by_tag_count(self) -> Iterator[Tuple[Note, Tuple[str, ...]]]:
+        return self.__sorted_notes(lambda tags: -len(tags))
+
+    def iter_notes_by_tags_alphabetically(self) -> Iterator[Tuple[Note, Tuple[str, ...]]]:
+        return self.__sorted_notes(lambda tags: (len(tags) == 0, tags))
@@ -0,0 +1,55 @@
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks on Windows, every session is the writer as before
+    fcntl = None
+
+
+class SessionLock:
+    """Advisory lock of the save files of a user, so two sessions never overwrite each other's changes.
+    The first session of the user holds an exclusive flock of the lock file until it exits, it is the only one
+    which writes the saves. Later sessions fail to take the lock and open the saves read-only.
+    The lock belongs to the open file, the OS releases it when the process dies, so a crash never leaves a stale lock.
+    Read-only sessions don't take any lock and never block the writer (see DataBase.read_consistent).
+    __init__:
+        filepath: str, path of the lock file, created if it doesn't exist
+    Attributes:
+        held: bool, True if this session holds the lock
+    Methods:
+        acquire() -> bool
+            takes the lock without waiting, True if it is taken. Always True without fcntl
+        release()
+    """
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.held = False
+        self.__file = None
+
+    def acquire(self) -> bool:
+        if self.held:
+            return True
+        if fcntl is None:
+            self.held = True
+            return True
+        lock_file = open(self.filepath, "a+")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Pid of the writer helps to find the session which keeps the lock
+        lock_file.truncate(0)
+        lock_file.write(f"{os.getpid()}\n")
+        lock_file.flush()
+        self.__file = lock_file
+        self.held = True
+        return True
+
+    def release(self):
+        if self.__file is not None:
+            fcntl.flock(self.__file.fileno(), fcntl.LOCK_UN)
+            self.__file.close()
+            self.__file = None
+        self.held = False
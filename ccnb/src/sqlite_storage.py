@@ -0,0 +1,411 @@
+import functools
+import sqlite3
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Tuple
+
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.NoteBook import NoteBook
+from ccnb.src.Table import Table
+from ccnb.src.indexes import TextIndex
+from ccnb.src.models import Birthday, Note, UserRecord, Validator
+
+# Separator of list values stored in one column, sorts before any printable character
+SEPARATOR = "\x01"
+
+
+class SqliteStorage:
+    """SQLite database with contacts and notes of one user.
+    Records are read on demand, so opening a big database costs the same as a small one.
+    __init__:
+        filepath: str, path of the database file
+    Attributes:
+        address_book: SqliteAddressBook
+        note_book: SqliteNoteBook
+    Methods:
+        commit()
+            saves changes made since the last commit
+        close()
+            commits and closes the database
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS contacts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            name_lower TEXT NOT NULL,
+            birthday TEXT,
+            birthday_text TEXT,
+            birthday_month INTEGER,
+            birthday_day INTEGER,
+            address TEXT,
+            address_lower TEXT
+        );
+        CREATE INDEX IF NOT EXISTS contacts_name ON contacts(name_lower, id);
+        CREATE INDEX IF NOT EXISTS contacts_birthday ON contacts(birthday_month, birthday_day, id);
+        CREATE TABLE IF NOT EXISTS phones (
+            contact_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            phone TEXT NOT NULL,
+            phone_reversed TEXT NOT NULL,
+            PRIMARY KEY (contact_id, position)
+        );
+        CREATE INDEX IF NOT EXISTS phones_phone ON phones(phone);
+        CREATE INDEX IF NOT EXISTS phones_reversed ON phones(phone_reversed);
+        CREATE TABLE IF NOT EXISTS emails (
+            contact_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            email TEXT NOT NULL,
+            email_lower TEXT NOT NULL,
+            PRIMARY KEY (contact_id, position)
+        );
+        CREATE INDEX IF NOT EXISTS emails_email ON emails(email_lower);
+        CREATE TABLE IF NOT EXISTS notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL UNIQUE,
+            content TEXT NOT NULL,
+            tags TEXT NOT NULL,
+            tag_count INTEGER NOT NULL,
+            sorted_tags TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS notes_tag_count ON notes(tag_count DESC, id);
+        CREATE INDEX IF NOT EXISTS notes_sorted_tags ON notes(tag_count = 0, sorted_tags, id);
+        CREATE TABLE IF NOT EXISTS note_tags (
+            note_id INTEGER NOT NULL,
+            tag TEXT NOT NULL,
+            PRIMARY KEY (tag, note_id)
+        );
+        CREATE INDEX IF NOT EXISTS note_tags_note ON note_tags(note_id);
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(title, content, tags, tokenize = "unicode61 remove_diacritics 0");
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.connection = sqlite3.connect(filepath)
+        self.connection.executescript(self.SCHEMA)
+        try:
+            self.connection.execute('CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5(text, tokenize = "trigram")')
+            self.has_trigram_index = True
+        except sqlite3.OperationalError:
+            # SQLite older than 3.34, substring search scans the tables
+            self.has_trigram_index = False
+        self.address_book = SqliteAddressBook(self)
+        self.note_book = SqliteNoteBook(self)
+
+    def is_empty(self) -> bool:
+        return (self.connection.execute("SELECT NOT EXISTS (SELECT 1 FROM contacts)").fetchone()[0] and
+                self.connection.execute("SELECT NOT EXISTS (SELECT 1 FROM notes)").fetchone()[0])
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+class SqliteAddressBook(MutableMapping):
+    """AddressBook interface over SqliteStorage. Keys are contact ids.
+    Every call returns a new UserRecord built from the database, changes of the record are written back immediately.
+    See AddressBook for the description of operations.
+    """
+    RECORD_QUERY = """
+        SELECT c.id, c.name, c.birthday, c.address,
+            (SELECT group_concat(phone, char(1)) FROM (SELECT phone FROM phones WHERE contact_id = c.id ORDER BY position)),
+            (SELECT group_concat(email, char(1)) FROM (SELECT email FROM emails WHERE contact_id = c.id ORDER BY position))
+        FROM contacts c
+    """
+
+    def __init__(self, storage: SqliteStorage):
+        self.storage = storage
+        self.connection = storage.connection
+        self.__subscribers = []
+
+    @property
+    def user_id(self) -> int:
+        row = self.connection.execute("SELECT seq FROM sqlite_sequence WHERE name = 'contacts'").fetchone()
+        return row[0] if row else 0
+
+    def __len__(self):
+        return self.connection.execute("SELECT count(*) FROM contacts").fetchone()[0]
+
+    def __iter__(self) -> Iterator[int]:
+        return (row[0] for row in self.connection.execute("SELECT id FROM contacts ORDER BY id"))
+
+    def __contains__(self, key):
+        return self.connection.execute("SELECT 1 FROM contacts WHERE id = ?", (key,)).fetchone() is not None
+
+    def __getitem__(self, key) -> UserRecord:
+        records = list(self.__select("WHERE c.id = ?", (key,)))
+        if not records:
+            raise KeyError(key)
+        return records[0][1]
+
+    def __setitem__(self, key, record: UserRecord):
+        self.__write(key, record)
+        record.set_listener(functools.partial(self.__write_back, key, record))
+        self.__publish(key, record)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.__delete_rows(key)
+        self.__publish(key, None)
+
+    def items(self):
+        return self.__select("ORDER BY c.id")
+
+    def values(self):
+        return (record for _, record in self.items())
+
+    def subscribe(self, callback):
+        self.__subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.__subscribers.remove(callback)
+
+    def __publish(self, key, record):
+        for callback in self.__subscribers:
+            callback(key, record)
+
+    def __select(self, condition: str, params = ()) -> Iterator[Tuple[int, UserRecord]]:
+        for key, name, birthday, address, phones, emails in self.connection.execute(self.RECORD_QUERY + condition, params):
+            # Values were validated before they were written
+            record = UserRecord.trusted(name,
+                                        phones.split(SEPARATOR) if phones else None,
+                                        Birthday.iso_ordinal(birthday) if birthday else None,
+                                        emails.split(SEPARATOR) if emails else None,
+                                        address)
+            record.set_listener(functools.partial(self.__write_back, key, record))
+            yield key, record
+
+    def __select_keys(self, query: str, params = ()) -> List[UserRecord]:
+        keys = [row[0] for row in self.connection.execute(query, params)]
+        return [self[key] for key in keys]
+
+    def __write_back(self, key, record: UserRecord):
+        """Called by the record after it was changed"""
+        self.__write(key, record)
+        self.__publish(key, record)
+
+    def __write(self, key, record: UserRecord):
+        birthday = record.birthday.value if record.birthday else None
+        address = record.address.value if record.address else None
+        phones = list(record.phones or ())
+        emails = list(record.emails or ())
+        self.__delete_rows(key)
+        self.connection.execute(
+            "INSERT INTO contacts (id, name, name_lower, birthday, birthday_text, birthday_month, birthday_day, address, address_lower) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, record.name.value, record.name.value.lower(),
+             birthday.date().isoformat() if birthday else None, str(birthday) if birthday else None,
+             birthday.month if birthday else None, birthday.day if birthday else None,
+             address, address.lower() if address is not None else None))
+        self.connection.executemany("INSERT INTO phones (contact_id, position, phone, phone_reversed) VALUES (?, ?, ?, ?)",
+                                    ((key, i, phone, phone[::-1]) for i, phone in enumerate(phones)))
+        self.connection.executemany("INSERT INTO emails (contact_id, position, email, email_lower) VALUES (?, ?, ?, ?)",
+                                    ((key, i, email, email.lower()) for i, email in enumerate(emails)))
+        if self.storage.has_trigram_index:
+            texts = [record.name.value.lower(), *phones, str(birthday) if birthday else "",
+                     *(email.lower() for email in emails), address.lower() if address else ""]
+            self.connection.execute("INSERT INTO contacts_fts (rowid, text) VALUES (?, ?)", (key, SEPARATOR.join(texts)))
+
+    def __delete_rows(self, key):
+        self.connection.execute("DELETE FROM contacts WHERE id = ?", (key,))
+        self.connection.execute("DELETE FROM phones WHERE contact_id = ?", (key,))
+        self.connection.execute("DELETE FROM emails WHERE contact_id = ?", (key,))
+        if self.storage.has_trigram_index:
+            self.connection.execute("DELETE FROM contacts_fts WHERE rowid = ?", (key,))
+
+    def __find_key(self, name: str) -> int|None:
+        row = self.connection.execute("SELECT id FROM contacts WHERE name_lower = ? ORDER BY id LIMIT 1", (name.lower(),)).fetchone()
+        return row[0] if row else None
+
+    def add_record(self, record: UserRecord):
+        key = self.connection.execute("INSERT INTO contacts (name, name_lower) VALUES ('', '')").lastrowid
+        self[key] = record
+
+    def find(self, name: str) -> UserRecord|None:
+        key = self.__find_key(name)
+        return self[key] if key is not None else None
+
+    def delete(self, name: str):
+        key = self.__find_key(name)
+        if key is None:
+            raise KeyError("Contact doesn\'t exist")
+        del self[key]
+
+    def search(self, pattern: str) -> List[UserRecord]:
+        # Same predicate and field order as AddressBook.search
+        condition = """
+            WHERE (instr(c.name_lower, :lower) OR instr(c.birthday_text, :pattern) OR instr(c.address_lower, :lower)
+                OR EXISTS (SELECT 1 FROM phones WHERE contact_id = c.id AND instr(phone, :pattern))
+                OR EXISTS (SELECT 1 FROM emails WHERE contact_id = c.id AND instr(email_lower, :lower)))
+        """
+        params = {"pattern": pattern, "lower": pattern.lower()}
+        if self.storage.has_trigram_index and len(pattern) >= 3:
+            # Trigram index narrows candidates, the predicate above verifies them
+            condition += " AND c.id IN (SELECT rowid FROM contacts_fts WHERE contacts_fts MATCH :match)"
+            params["match"] = '"' + pattern.lower().replace('"', '""') + '"'
+        return [record for _, record in self.__select(condition + " ORDER BY c.id", params)]
+
+    def find_by_phone(self, phone: str) -> List[UserRecord]:
+        return self.__select_keys("SELECT DISTINCT contact_id FROM phones WHERE phone = ? ORDER BY contact_id",
+                                  (Validator.normalize_phone(phone),))
+
+    def search_by_phone(self, digits: str, suffix_only = False) -> List[UserRecord]:
+        if suffix_only and digits:
+            # Ending of a phone is a prefix of the reversed phone, so the index can be used
+            start = digits[::-1]
+            end = start[:-1] + chr(ord(start[-1]) + 1)
+            return self.__select_keys("SELECT DISTINCT contact_id FROM phones WHERE phone_reversed >= ? AND phone_reversed < ? "
+                                      "ORDER BY contact_id", (start, end))
+        return self.__select_keys("SELECT DISTINCT contact_id FROM phones WHERE instr(phone, ?) ORDER BY contact_id", (digits,))
+
+    def __birthdays_between(self, start, end) -> List[Tuple[int, UserRecord]]:
+        return list(self.__select("WHERE (c.birthday_month, c.birthday_day) BETWEEN (?, ?) AND (?, ?)", (*start, *end)))
+
+    def get_upcoming_birthdays(self, specific_date = None, days = 7) -> List[Dict[str, str]]:
+        return AddressBook.upcoming_birthdays(self.__birthdays_between, AddressBook.parse_date(specific_date), days)
+
+    def get_next_birthdays(self, count = 5, specific_date = None) -> List[Dict[str, str]]:
+        today = AddressBook.parse_date(specific_date)
+        order = " ORDER BY c.birthday_month, c.birthday_day, c.id LIMIT ?"
+        candidates = dict(self.__select("WHERE (c.birthday_month, c.birthday_day) >= (?, ?)" + order,
+                                        (today.month, today.day, count)))
+        # Wrap around the year end
+        candidates.update(self.__select("WHERE c.birthday_month IS NOT NULL" + order, (count,)))
+        return AddressBook.next_birthdays(self.__birthdays_between, candidates, today, count)
+
+    def get_birthdays_in_month(self, month: int) -> List[Dict[str, str]]:
+        return AddressBook.birthdays_in_month(month, lambda month: (
+            user for _, user in self.__select("WHERE c.birthday_month = ? ORDER BY c.birthday_day, c.id", (month,))))
+
+
+class SqliteNoteBook(MutableMapping):
+    """NoteBook interface over SqliteStorage. Keys are note titles, notes keep the order of insertion.
+    Search is ranked by bm25 of the FTS5 index, words match as prefixes.
+    See NoteBook for the description of operations.
+    """
+
+    def __init__(self, storage: SqliteStorage):
+        self.storage = storage
+        self.connection = storage.connection
+        self.__subscribers = []
+
+    def __len__(self):
+        return self.connection.execute("SELECT count(*) FROM notes").fetchone()[0]
+
+    def __iter__(self) -> Iterator[str]:
+        return (row[0] for row in self.connection.execute("SELECT title FROM notes ORDER BY id"))
+
+    def __contains__(self, title):
+        return self.__note_id(title) is not None
+
+    def __getitem__(self, title) -> Note:
+        notes = list(self.__select("WHERE title = ?", (title,)))
+        if not notes:
+            raise KeyError(title)
+        return notes[0]
+
+    def __setitem__(self, title, note: Note):
+        if title in self:
+            self.__delete_rows(self.__note_id(title))
+        note_id = self.connection.execute("INSERT INTO notes (title, content, tags, tag_count, sorted_tags) VALUES (?, '', '', 0, '')",
+                                          (title,)).lastrowid
+        self.__write(note_id, note)
+        note.set_listener(functools.partial(self.__write_back, note_id, note))
+        self.__publish(title, note)
+
+    def __delitem__(self, title):
+        note_id = self.__note_id(title)
+        if note_id is None:
+            raise KeyError(title)
+        self.__delete_rows(note_id)
+        self.__publish(title, None)
+
+    def items(self):
+        return ((note.title.value, note) for note in self.__select("ORDER BY id"))
+
+    def values(self):
+        return self.__select("ORDER BY id")
+
+    def subscribe(self, callback):
+        self.__subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.__subscribers.remove(callback)
+
+    def __publish(self, title, note):
+        for callback in self.__subscribers:
+            callback(title, note)
+
+    def __note_id(self, title) -> int|None:
+        row = self.connection.execute("SELECT id FROM notes WHERE title = ?", (title,)).fetchone()
+        return row[0] if row else None
+
+    def __select(self, condition: str, params = ()) -> Iterator[Note]:
+        for note_id, title, content, tags in self.connection.execute("SELECT id, title, content, tags FROM notes " + condition, params):
+            note = Note(title, content, tags.split(SEPARATOR) if tags else [])
+            note.set_listener(functools.partial(self.__write_back, note_id, note))
+            yield note
+
+    def __write_back(self, note_id, note: Note):
+        """Called by the note after it was changed"""
+        self.__write(note_id, note)
+        self.__publish(note.title.value, note)
+
+    def __write(self, note_id, note: Note):
+        tags = list(note.tags.value)
+        sorted_tags = sorted(tags)
+        self.connection.execute("UPDATE notes SET content = ?, tags = ?, tag_count = ?, sorted_tags = ? WHERE id = ?",
+                                (note.content.value, SEPARATOR.join(tags), len(tags), SEPARATOR.join(sorted_tags), note_id))
+        self.connection.execute("DELETE FROM note_tags WHERE note_id = ?", (note_id,))
+        self.connection.executemany("INSERT OR IGNORE INTO note_tags (note_id, tag) VALUES (?, ?)", ((note_id, tag) for tag in tags))
+        self.connection.execute("DELETE FROM notes_fts WHERE rowid = ?", (note_id,))
+        self.connection.execute("INSERT INTO notes_fts (rowid, title, content, tags) VALUES (?, ?, ?, ?)",
+                                (note_id, note.title.value, note.content.value, " ".join(tags)))
+
+    def __delete_rows(self, note_id):
+        self.connection.execute("DELETE FROM notes WHERE id = ?", (note_id,))
+        self.connection.execute("DELETE FROM note_tags WHERE note_id = ?", (note_id,))
+        self.connection.execute("DELETE FROM notes_fts WHERE rowid = ?", (note_id,))
+
+    # Commands over the mapping interface and the queries below are the same as in NoteBook
+    add_note = NoteBook.add_note
+    edit_note = NoteBook.edit_note
+    delete_note = NoteBook.delete_note
+    add_tags_to_note = NoteBook.add_tags_to_note
+    remove_tag_from_note = NoteBook.remove_tag_from_note
+    show_all_notes = NoteBook.show_all_notes
+    sort_notes_by_tag_count = NoteBook.sort_notes_by_tag_count
+    sort_notes_by_tags_alphabetically = NoteBook.sort_notes_by_tags_alphabetically
+
+    def search_notes(self, keyword: str, limit: int = None) -> Table:
+        tokens = TextIndex.tokenize(keyword)
+        found_notes = []
+        if tokens:
+            query = " OR ".join('"' + token.replace('"', '""') + '"*' for token in tokens)
+            found_notes = self.__select("JOIN (SELECT rowid, bm25(notes_fts) AS rank FROM notes_fts WHERE notes_fts MATCH ? "
+                                        "ORDER BY rank LIMIT ?) AS found ON id = found.rowid ORDER BY found.rank",
+                                        (query, -1 if limit is None else limit))
+        return NoteBook.search_table(list(found_notes), keyword, self.values(), limit)
+
+    def search_notes_by_tags(self, tags: List[str]) -> Table:
+        tags = sorted(set(tags))
+        found_notes = self.__select(f"""
+            WHERE id IN (SELECT note_id FROM note_tags WHERE tag IN ({", ".join("?" * len(tags))})
+                         GROUP BY note_id HAVING count(*) = ?)
+            ORDER BY id""", (*tags, len(tags)))
+        return NoteBook.notes_table(((note, note.tags.value) for note in found_notes),
+                                    f"No notes found with tags {', '.join(tags)}.")
+
+    def count_notes_by_tag(self, tag: str) -> int:
+        return self.connection.execute("SELECT count(*) FROM note_tags WHERE tag = ?", (tag,)).fetchone()[0]
+
+    def show_tag_counts(self) -> Table:
+        return NoteBook.tag_counts_table(self.connection.execute("SELECT tag, count(*) FROM note_tags GROUP BY tag"))
+
+    def iter_notes_by_tag_count(self) -> Iterator[Tuple[Note, Tuple[str, ...]]]:
+        return ((note, tuple(sorted(note.tags.value))) for note in self.__select("ORDER BY tag_count DESC, id"))
+
+    def iter_notes_by_tags_alphabetically(self) -> Iterator[Tuple[Note, Tuple[str, ...]]]:
+        return ((note, tuple(sorted(note.tags.value))) for note in self.__select("ORDER BY tag_count = 0, sorted_tags, id"))
@@ -0,0 +1,405 @@
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, List, TextIO, Tuple
+
+from ccnb.src.models import Note, UserRecord
+from ccnb.src.Validator import Validator
+
+# Rows validated by one task of the process pool
+BATCH_SIZE = 5000
+# Values of phones and emails in one CSV cell
+LIST_SEPARATOR = ";"
+CSV_HEADER = ["name", "phones", "birthday", "emails", "address"]
+
+
+class ContactCsv:
+    """Contacts in CSV with CSV_HEADER columns, phones and emails are separated by LIST_SEPARATOR,
+    birthday is DD.MM.YYYY. The header row is optional on import.
+    Contact rows are plain tuples (name, phones, birthday, emails, address)
+    """
+    @staticmethod
+    def read(file: TextIO) -> Iterator[Tuple[int, tuple]]:
+        """Yields (line number, contact row)"""
+        reader = csv.reader(file)
+        for cells in reader:
+            if reader.line_num == 1 and [cell.strip().lower() for cell in cells] == CSV_HEADER:
+                continue
+            if not any(cells):
+                continue
+            cells = [cell.strip() for cell in cells] + [""] * (len(CSV_HEADER) - len(cells))
+            name, phones, birthday, emails, address, *_ = cells
+            yield reader.line_num, (name, ContactCsv.__split(phones), birthday or None, ContactCsv.__split(emails), address or None)
+
+    @staticmethod
+    def write(file: TextIO, records: Iterable[UserRecord]):
+        writer = csv.writer(file)
+        writer.writerow(CSV_HEADER)
+        for record in records:
+            writer.writerow((record.name.value, LIST_SEPARATOR.join(record.phones or ()), str(record.birthday or ""),
+                             LIST_SEPARATOR.join(record.emails or ()), record.address.value if record.address else ""))
+
+    @staticmethod
+    def __split(cell: str) -> List[str]:
+        return [value.strip() for value in cell.split(LIST_SEPARATOR) if value.strip()]
+
+
+class VCard:
+    """Contacts in vCard 3.0: FN, TEL, BDAY (YYYY-MM-DD or YYYYMMDD), EMAIL and the street of ADR are used,
+    other properties are ignored. Folded lines and escaped characters are supported.
+    """
+    @staticmethod
+    def read(file: TextIO) -> Iterator[Tuple[int, tuple]]:
+        """Yields (line number of BEGIN:VCARD, contact row)"""
+        card, start = None, 0
+        for number, line in VCard.__unfolded(file):
+            name, _, value = line.partition(":")
+            name = name.split(";")[0].upper()
+            if name == "BEGIN" and value.upper() == "VCARD":
+                card, start = {}, number
+            elif name == "END" and value.upper() == "VCARD" and card is not None:
+                address = (VCard.__split(card.get("ADR", [""])[0], ";") + [""] * 3)[2]
+                yield start, (VCard.__unescape(card.get("FN", [""])[0]), [VCard.__unescape(tel) for tel in card.get("TEL", [])],
+                              VCard.__birthday(card.get("BDAY", [""])[0]), [VCard.__unescape(email) for email in card.get("EMAIL", [])],
+                              VCard.__unescape(address) or None)
+                card = None
+            elif card is not None:
+                card.setdefault(name, []).append(value)
+
+    @staticmethod
+    def write(file: TextIO, records: Iterable[UserRecord]):
+        for record in records:
+            lines = ["BEGIN:VCARD", "VERSION:3.0", "FN:" + VCard.__escape(record.name.value)]
+            lines.extend("TEL:" + phone for phone in record.phones or ())
+            if record.birthday:
+                lines.append("BDAY:" + record.birthday.date().isoformat())
+            lines.extend("EMAIL:" + VCard.__escape(email) for email in record.emails or ())
+            if record.address:
+                lines.append("ADR:;;" + VCard.__escape(record.address.value) + ";;;;")
+            lines.append("END:VCARD")
+            file.write("\r\n".join(lines) + "\r\n")
+
+    @staticmethod
+    def __unfolded(file: TextIO) -> Iterator[Tuple[int, str]]:
+        """Yields (line number, line), lines starting with a space or a tab continue the previous one"""
+        number, line = 0, None
+        for current, text in enumerate(file, 1):
+            text = text.rstrip("\r\n")
+            if text[:1] in (" ", "\t") and line is not None:
+                line += text[1:]
+                continue
+            if line is not None:
+                yield number, line
+            number, line = current, text
+        if line is not None:
+            yield number, line
+
+    @staticmethod
+    def __birthday(value: str) -> str|None:
+        """vCard date as DD.MM.YYYY, values in other formats are returned as is and rejected by validation"""
+        for date_format in ("%Y-%m-%d", "%Y%m%d"):
+            try:
+                return datetime.strptime(value, date_format).strftime("%d.%m.%Y")
+            except ValueError:
+                pass
+        return value or None
+
+    @staticmethod
+    def __split(value: str, separator: str) -> List[str]:
+        """Splits on separators which are not escaped"""
+        parts, current, escaped = [], "", False
+        for char in value:
+            if escaped:
+                current += "\\" + char
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == separator:
+                parts.append(current)
+                current = ""
+            else:
+                current += char
+        parts.append(current)
+        return parts
+
+    @staticmethod
+    def __escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace("\n", "\\n").replace(",", "\\,").replace(";", "\\;")
+
+    @staticmethod
+    def __unescape(value: str) -> str:
+        result, escaped = "", False
+        for char in value:
+            if escaped:
+                result += "\n" if char in "nN" else char
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            else:
+                result += char
+        return result.strip()
+
+
+class NotesJsonl:
+    """Notes in JSON Lines, one object per line: {"title": ..., "content": ..., "tags": [...]}
+    Note rows are plain tuples (title, content, tags, error), error is set for lines which are not JSON objects
+    """
+    @staticmethod
+    def read(file: TextIO) -> Iterator[Tuple[int, tuple]]:
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            # Broken lines are passed on with the error and rejected by validation
+            try:
+                value = json.loads(line)
+            except json.JSONDecodeError as error:
+                yield number, (None, None, None, f"Invalid JSON: {error.msg}")
+                continue
+            if not isinstance(value, dict):
+                yield number, (None, None, None, "Note should be a JSON object")
+                continue
+            yield number, (value.get("title"), value.get("content"), value.get("tags"), None)
+
+    @staticmethod
+    def write(file: TextIO, notes: Iterable[Note]):
+        for note in notes:
+            file.write(json.dumps({"title": note.title.value, "content": note.content.value, "tags": note.tags.value},
+                                  ensure_ascii=False) + "\n")
+
+
+class NotesMarkdown:
+    """Notes in Markdown: every note starts with a "# title" heading, followed by the content
+    and an optional last line "Tags: tag1, tag2". Content lines starting with "#", "Tags:" or "\\" are escaped with "\\".
+    """
+    TAGS_PREFIX = "Tags:"
+
+    @staticmethod
+    def read(file: TextIO) -> Iterator[Tuple[int, tuple]]:
+        title, start, lines = None, 0, []
+        for number, line in enumerate(file, 1):
+            line = line.rstrip("\r\n")
+            if line.startswith("# "):
+                if title is not None:
+                    yield start, NotesMarkdown.__note(title, lines)
+                title, start, lines = line[2:].strip(), number, []
+            elif title is not None:
+                lines.append(line)
+        if title is not None:
+            yield start, NotesMarkdown.__note(title, lines)
+
+    @staticmethod
+    def write(file: TextIO, notes: Iterable[Note]):
+        for note in notes:
+            lines = [NotesMarkdown.__escape(line) for line in note.content.value.split("\n")]
+            file.write(f"# {note.title.value}\n\n" + "\n".join(lines) + "\n\n")
+            if note.tags.value:
+                file.write(f"{NotesMarkdown.TAGS_PREFIX} {', '.join(note.tags.value)}\n\n")
+
+    @staticmethod
+    def __note(title: str, lines: List[str]) -> tuple:
+        while lines and not lines[-1].strip():
+            lines.pop()
+        tags = []
+        if lines and lines[-1].startswith(NotesMarkdown.TAGS_PREFIX):
+            tags = [tag.strip() for tag in lines.pop()[len(NotesMarkdown.TAGS_PREFIX):].split(",") if tag.strip()]
+        while lines and not lines[-1].strip():
+            lines.pop()
+        while lines and not lines[0].strip():
+            lines.pop(0)
+        return title, "\n".join(line[1:] if line.startswith("\\") else line for line in lines), tags, None
+
+    @staticmethod
+    def __escape(line: str) -> str:
+        return "\\" + line if line.startswith(("#", NotesMarkdown.TAGS_PREFIX, "\\")) else line
+
+
+class Transfer:
+    """Streaming import and export of contacts and notes. Files are read and written record by record,
+    rows are validated in batches of BATCH_SIZE by a process pool.
+    Rows which can't be imported are written to a reject file in JSON Lines: {"line": ..., "error": ..., "row": [...]}
+    Worker processes are started with forkserver (spawn where it isn't available): the session runs journal and
+    autosave threads, and a forked child could inherit a lock held by one of them.
+    Formats are chosen by the file extension: CONTACT_FORMATS and NOTE_FORMATS
+    Methods:
+        import_contacts(address_book, filepath, reject_filepath = None, workers = None, on_batch = None) -> (imported, rejected)
+            contacts with a name already present in the book are rejected
+        import_notes(note_book, filepath, reject_filepath = None, workers = None, on_batch = None) -> (imported, rejected)
+            notes with a title already present in the book are rejected
+            reject_filepath: default is filepath + REJECT_SUFFIX, the file is created only if there are rejected rows,
+                a reject file of a previous import is deleted
+            workers: number of processes, default is the number of CPUs. With 1 rows are validated in this process,
+                as well as files with less than two batches of rows
+            on_batch: called after every batch is added to the book, e.g. to commit changes
+        export_contacts(address_book, filepath) -> int
+        export_notes(note_book, filepath) -> int
+            return the number of written records
+        validate_contacts(rows) / validate_notes(rows) -> List[(record|None, error|None)]
+            batch validation of plain rows, runs in the worker processes
+    Raise ValueError for unsupported file extensions, OSError if the file can't be opened
+    """
+    CONTACT_FORMATS = {".csv": ContactCsv, ".vcf": VCard, ".vcard": VCard}
+    NOTE_FORMATS = {".jsonl": NotesJsonl, ".md": NotesMarkdown}
+    REJECT_SUFFIX = ".rejects.jsonl"
+
+    @staticmethod
+    def import_contacts(address_book, filepath: str, reject_filepath: str = None, workers: int = None,
+                        on_batch: Callable = None) -> Tuple[int, int]:
+        def add(record: UserRecord):
+            if address_book.find(record.name.value):
+                raise KeyError("Contact already exists")
+            address_book.add_record(record)
+        file_format = Transfer.__format(filepath, Transfer.CONTACT_FORMATS)
+        return Transfer.__import(file_format, filepath, Transfer.validate_contacts, add, reject_filepath, workers, on_batch)
+
+    @staticmethod
+    def import_notes(note_book, filepath: str, reject_filepath: str = None, workers: int = None,
+                     on_batch: Callable = None) -> Tuple[int, int]:
+        def add(note: Note):
+            if note.title.value in note_book:
+                raise KeyError("Note with this title already exists.")
+            note_book[note.title.value] = note
+        file_format = Transfer.__format(filepath, Transfer.NOTE_FORMATS)
+        return Transfer.__import(file_format, filepath, Transfer.validate_notes, add, reject_filepath, workers, on_batch)
+
+    @staticmethod
+    def export_contacts(address_book, filepath: str) -> int:
+        return Transfer.__export(Transfer.__format(filepath, Transfer.CONTACT_FORMATS), filepath, address_book.values())
+
+    @staticmethod
+    def export_notes(note_book, filepath: str) -> int:
+        return Transfer.__export(Transfer.__format(filepath, Transfer.NOTE_FORMATS), filepath, note_book.values())
+
+    @staticmethod
+    def validate_contacts(rows: List[tuple]) -> List[Tuple[UserRecord|None, str|None]]:
+        """Values of the whole batch are checked by the Validator batch methods, records are created by UserRecord.trusted.
+        Errors are the same as UserRecord would raise: phones first, then birthday and emails"""
+        phones = iter(Validator.normalize_phones([phone for row in rows for phone in row[1]]))
+        birthdays = iter(Validator.validate_birthdays([row[2] for row in rows if row[2]]))
+        emails = iter(Validator.validate_emails([email for row in rows for email in row[3]]))
+        results = []
+        for name, row_phones, birthday, row_emails, address in rows:
+            # Results of all values of the row are taken, so the iterators stay aligned with the next rows
+            row_phones = [next(phones) for _ in row_phones]
+            birthday = next(birthdays) if birthday else (None, None)
+            row_emails = [next(emails) for _ in row_emails]
+            error = ("Name is required" if not name else
+                     Transfer.__first_error(row_phones, "Number", name) or birthday[1] or
+                     Transfer.__first_error(row_emails, "Email", name))
+            if error:
+                results.append((None, error))
+            else:
+                results.append((UserRecord.trusted(name, [phone for phone, _ in row_phones], birthday[0] and birthday[0].toordinal(),
+                                                   [email for email, _ in row_emails], address), None))
+        return results
+
+    @staticmethod
+    def validate_notes(rows: List[tuple]) -> List[Tuple[Note|None, str|None]]:
+        results = []
+        for title, content, tags, error in rows:
+            if error is None and (not isinstance(title, str) or not title.strip()):
+                error = "Title is required"
+            elif error is None and content is not None and not isinstance(content, str):
+                error = "Content should be a string"
+            elif error is None and tags is not None and not (isinstance(tags, list) and all(
+                    isinstance(tag, str) and tag.strip() for tag in tags)):
+                error = "Tags should be a list of strings"
+            results.append((None, error) if error else (Note(title.strip(), content or "", list(dict.fromkeys(tags or ()))), None))
+        return results
+
+    @staticmethod
+    def __first_error(results: List[Tuple[str|None, str|None]], kind: str, name: str) -> str|None:
+        """First validation error or duplicate value of the row"""
+        known = set()
+        for value, error in results:
+            if error:
+                return error
+            if value in known:
+                return f"[ERROR] {kind} {value} already exists in the record {name}"
+            known.add(value)
+        return None
+
+    @staticmethod
+    def __format(filepath: str, formats: dict):
+        extension = os.path.splitext(filepath)[1].lower()
+        if extension not in formats:
+            raise ValueError(f"Unsupported file format {extension or filepath}. Use one of: {', '.join(formats)}")
+        return formats[extension]
+
+    @staticmethod
+    def __import(file_format, filepath: str, validate: Callable, add: Callable, reject_filepath: str|None,
+                 workers: int|None, on_batch: Callable|None) -> Tuple[int, int]:
+        imported = rejected = 0
+        reject_filepath = reject_filepath or filepath + Transfer.REJECT_SUFFIX
+        reject_file = None
+        try:
+            with open(filepath, "r", encoding="utf-8-sig", newline="") as file:
+                # Rejects of an earlier import of the file must not be taken for rejects of this one
+                if os.path.exists(reject_filepath):
+                    os.remove(reject_filepath)
+                batches = Transfer.__batches(file_format.read(file))
+                for batch, results in Transfer.__validated(batches, validate, workers or os.cpu_count() or 1):
+                    for (number, row), (record, error) in zip(batch, results):
+                        if error is None:
+                            try:
+                                add(record)
+                                imported += 1
+                                continue
+                            except (KeyError, ValueError) as add_error:
+                                error = "; ".join(map(str, add_error.args))
+                        if reject_file is None:
+                            reject_file = open(reject_filepath, "w", encoding="utf-8")
+                        reject_file.write(json.dumps({"line": number, "error": error, "row": row}, ensure_ascii=False) + "\n")
+                        rejected += 1
+                    if on_batch:
+                        on_batch()
+        finally:
+            if reject_file is not None:
+                reject_file.close()
+        return imported, rejected
+
+    @staticmethod
+    def __batches(rows: Iterator[Tuple[int, tuple]]) -> Iterator[List[Tuple[int, tuple]]]:
+        while batch := list(itertools.islice(rows, BATCH_SIZE)):
+            yield batch
+
+    @staticmethod
+    def __validated(batches: Iterator[list], validate: Callable, workers: int) -> Iterator[Tuple[list, list]]:
+        """Yields (batch, validation results) in the order of batches.
+        At most 2 batches per worker are read ahead, so the file is never held in memory as a whole"""
+        head = list(itertools.islice(batches, 2))
+        batches = itertools.chain(head, batches)
+        # Starting the pool takes longer than validation of a single batch
+        if workers == 1 or len(head) < 2:
+            for batch in batches:
+                yield batch, validate([row for _, row in batch])
+            return
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(start_method)) as pool:
+            pending = deque()
+            for batch in batches:
+                pending.append((batch, pool.submit(validate, [row for _, row in batch])))
+                if len(pending) >= 2 * workers:
+                    batch, future = pending.popleft()
+                    yield batch, future.result()
+            while pending:
+                batch, future = pending.popleft()
+                yield batch, future.result()
+
+    @staticmethod
+    def __export(file_format, filepath: str, records: Iterable) -> int:
+        count = 0
+        def counted():
+            nonlocal count
+            for record in records:
+                count += 1
+                yield record
+        # Written to a temporary file first, so a failed export never leaves a truncated file
+        with open(filepath + ".tmp", "w", encoding="utf-8", newline="") as file:
+            file_format.write(file, counted())
+        os.replace(filepath + ".tmp", filepath)
+        return count
@@ -0,0 +1,132 @@
+import os
+import threading
+from typing import List
+
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.binary_format import BinaryFormat
+from ccnb.src.journal import Journal
+from ccnb.src.NoteBook import NoteBook
+
+
+class Watcher:
+    """Live reload of the changes made by the writer session into the books of a read-only session.
+    A worker thread checks the saves with os.stat every `seconds`, stat of a few files is cheap and works everywhere:
+        operations appended to the journal are read from the last offset
+        a replaced save or a rotated journal makes the worker read a new snapshot of the books
+    The books are changed only by apply() in the main thread between commands. Journal operations are applied
+    as they are, a snapshot is compared with the books and only the records which differ are set or deleted,
+    so indexes of the books are updated for the changed records and never rebuilt.
+    __init__:
+        file_ids: callable() -> list, identity of the saves, the journal is the last one (see DataBase.file_ids)
+        snapshot: callable() -> DataBase, reads a new snapshot with its `watched` state (see DataBase.read_consistent)
+        journal_path: str, journal of the writer
+        files, offset: file ids and journal offset of the snapshot the books were read from
+        seconds: float, interval of the checks
+    Attributes:
+        reloads: int, number of snapshots read by the worker
+    Methods:
+        attach(address_book, note_book)
+            books which receive the changes
+        apply() -> int
+            merges the changes found by the worker into the books, returns number of changed records
+        take_errors() -> List[str]
+            messages of the failed checks since the last call, the worker never prints, the session shows them
+        close()
+            stops the worker
+    """
+    def __init__(self, file_ids, snapshot, journal_path: str, files: list, offset: int, seconds: float = 1.0):
+        self.file_ids = file_ids
+        self.snapshot = snapshot
+        self.journal_path = journal_path
+        self.seconds = seconds
+        self.reloads = 0
+        self.__files = files
+        self.__offset = offset
+        self.__address_book = None
+        self.__note_book = None
+        self.__pending_snapshot = None  # DataBase which replaces the books
+        self.__pending_operations = []  # journal operations made after the snapshot
+        self.__errors = []              # messages of failed checks, taken by the prompt thread
+        self.__closed = False
+        self.__condition = threading.Condition()
+        self.__worker = threading.Thread(target=self.__run, name="ccnb-watcher", daemon=True)
+        self.__worker.start()
+
+    def attach(self, address_book: AddressBook, note_book: NoteBook):
+        self.__address_book = address_book
+        self.__note_book = note_book
+
+    def apply(self) -> int:
+        with self.__condition:
+            data_base, self.__pending_snapshot = self.__pending_snapshot, None
+            operations, self.__pending_operations = self.__pending_operations, []
+        changed = 0
+        if data_base is not None:
+            changed += self.__merge(self.__address_book, data_base.address_book, BinaryFormat.contact_values)
+            changed += self.__merge(self.__note_book, data_base.note_book, BinaryFormat.note_values)
+        for operation in operations:
+            Journal.apply(operation, self.__address_book, self.__note_book)
+        return changed + len(operations)
+
+    def take_errors(self) -> List[str]:
+        with self.__condition:
+            errors, self.__errors = self.__errors, []
+        return errors
+
+    @staticmethod
+    def __merge(book, snapshot, values) -> int:
+        """Deletes records which are not in the snapshot and sets records which differ from it"""
+        deleted = [key for key in book.keys() if key not in snapshot]
+        for key in deleted:
+            del book[key]
+        changed = [key for key, record in snapshot.items() if key not in book or values(book[key]) != values(record)]
+        for key in changed:
+            book[key] = snapshot[key]
+        return len(deleted) + len(changed)
+
+    def close(self):
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify()
+        self.__worker.join()
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                self.__condition.wait_for(lambda: self.__closed, self.seconds)
+                if self.__closed:
+                    return
+            try:
+                self.__check()
+            except Exception as ex:
+                # Files are checked again after `seconds`, the same error is reported once
+                message = f"Reload of changes failed: {ex}"
+                with self.__condition:
+                    if message not in self.__errors:
+                        self.__errors.append(message)
+
+    def __check(self):
+        files = self.file_ids()
+        if files != self.__files:
+            data_base = self.snapshot()
+            with self.__condition:
+                # The snapshot has all operations collected before it
+                self.__pending_snapshot = data_base
+                self.__pending_operations = []
+            self.__files, self.__offset = data_base.watched
+            self.reloads += 1
+            return
+        if files[-1] is None:
+            return
+        try:
+            with open(self.journal_path, "rb") as journal_file:
+                stat = os.fstat(journal_file.fileno())
+                if stat.st_ino != files[-1] or stat.st_size <= self.__offset:
+                    # Journal rotated after the check is read with the next snapshot
+                    return
+                operations, self.__offset = Journal.read_operations(journal_file, self.__offset)
+        except FileNotFoundError:
+            return
+        if operations:
+            with self.__condition:
+                self.__pending_operations.extend(operations)
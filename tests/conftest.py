@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from ccnb.src import data_base
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.binary_format import BinaryFormat
+from ccnb.src.models import UserRecord
+from ccnb.src.NoteBook import NoteBook
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+@pytest.fixture
+def ccnb_path(tmp_path, monkeypatch):
+    """Save files of the test are written to a temporary CCNB_PATH"""
+    monkeypatch.setattr(data_base, "CCNB_PATH", str(tmp_path))
+    return tmp_path
+
+
+def make_contact(name: str, phones=("0501234567",), birthday: str = None, emails=(), address: str = None) -> UserRecord:
+    record = UserRecord(name, list(phones))
+    if birthday:
+        record.birthday = birthday
+    for email in emails:
+        record.add_email(email)
+    if address:
+        record.address = address
+    return record
+
+
+@pytest.fixture
+def books():
+    """Small AddressBook and NoteBook with every kind of field"""
+    address_book, note_book = AddressBook(), NoteBook()
+    address_book.add_record(make_contact("John", ("0501112233", "0505555555"), "03.08.1995", ("john@mail.com",), "Kyiv"))
+    address_book.add_record(make_contact("Jane", ("0679876543",), "01.01.0999"))
+    address_book.add_record(make_contact("Олена", ("0931234567",), address="Львів, вул. Зелена 1"))
+    note_book.add_note("todo", "buy milk")
+    note_book.add_tags_to_note("todo", ["home", "shop"])
+    note_book.add_note("report", "quarterly report draft")
+    return address_book, note_book
+
+
+def contents(address_book, note_book):
+    """Plain values of the books for comparisons"""
+    return ({key: BinaryFormat.contact_values(record) for key, record in address_book.items()},
+            {title: BinaryFormat.note_values(note) for title, note in note_book.items()})
+
+
+def legacy_books():
+    """Books saved in tests/data/legacy.pkl by the first version of ccnb"""
+    address_book, note_book = AddressBook(), NoteBook()
+    address_book.add_record(make_contact("John", ("0501112233", "0505555555"), "03.08.1995", ("john@mail.com",), "Kyiv"))
+    address_book.add_record(make_contact("Олена", ("0931234567",)))
+    note_book.add_note("todo", "buy milk")
+    note_book.add_tags_to_note("todo", ["home", "shop"])
+    note_book.add_note("report", "quarterly report draft")
+    return address_book, note_book
@@ -0,0 +1,50 @@
+from ccnb.src.AddressBook import AddressBook
+
+from conftest import make_contact
+
+
+def test_find_edit_and_delete():
+    book = AddressBook()
+    book.add_record(make_contact("John", ("0501234567", "0505555555")))
+    book.add_record(make_contact("Jane", ("0679876543",)))
+    john = book.find("john")
+    assert john.name.value == "John"
+    john.edit_phone("0501234567", "0501112233")
+    assert list(book.find("John").phones) == ["+380505555555", "+380501112233"]
+    assert book.find_by_phone("0501112233") == [john]
+    assert book.find_by_phone("0501234567") == []
+    book.delete("Jane")
+    assert book.find("Jane") is None
+    assert book.search_by_phone("6798765") == []
+
+
+def test_upcoming_birthdays_move_weekends_to_monday():
+    book = AddressBook()
+    book.add_record(make_contact("John", birthday="03.08.1995"))
+    book.add_record(make_contact("Jane", ("0671234567",), birthday="02.01.1995"))
+    upcoming = book.get_upcoming_birthdays("29.07.2024")
+    # 03.08.2024 is Saturday
+    assert [(str(user["name"]), user["congratulation_date"]) for user in upcoming] == [("John", "05.08.2024")]
+
+
+def test_next_birthdays_include_ties_after_weekend_boundary():
+    book = AddressBook()
+    # 01.01.2024 is Monday, 06.01 and 07.01 are weekend days congratulated on Monday 08.01
+    for name, birthday in (("Monday", "08.01.1990"), ("Sunday", "07.01.1990"), ("Saturday", "06.01.1990")):
+        book.add_record(make_contact(name, birthday=birthday))
+    # Saturday comes first in calendar order, Monday was added first and wins the tie
+    assert [(str(user["name"]), user["congratulation_date"]) for user in book.get_next_birthdays(1, "01.01.2024")] == [("Monday", "08.01.2024")]
+    assert [str(user["name"]) for user in book.get_next_birthdays(2, "01.01.2024")] == ["Monday", "Sunday"]
+    assert [str(user["name"]) for user in book.get_next_birthdays(5, "01.01.2024")] == ["Monday", "Sunday", "Saturday"]
+
+
+def test_search_order_does_not_depend_on_pattern_length():
+    book = AddressBook()
+    for name in ("Ann", "Bob", "Anna"):
+        book.add_record(make_contact(name))
+    # Replaced record keeps its place
+    book[1] = make_contact("Ann", ("0507654321",))
+    assert list(book.data) == [1, 2, 3]
+    assert [record.name.value for record in book.search("an")] == ["Ann", "Anna"]
+    assert [record.name.value for record in book.search("ann")] == ["Ann", "Anna"]
+    assert list(book.find("Ann").phones) == ["+380507654321"]
@@ -0,0 +1,56 @@
+import threading
+
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.autosave import Autosave
+from ccnb.src.NoteBook import NoteBook
+
+from conftest import make_contact
+
+
+class Saves:
+    """Save function for Autosave which fails the first `failures` calls"""
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+        self.done = threading.Semaphore(0)
+
+    def __call__(self, user_id, contacts, notes):
+        self.calls.append((user_id, contacts, notes))
+        self.done.release()
+        if len(self.calls) <= self.failures:
+            raise OSError("disk is full")
+
+
+def test_changed_books_are_saved_after_enough_changes():
+    saves = Saves()
+    autosave = Autosave(saves, changes=2, seconds=60)
+    address_book, note_book = AddressBook(), NoteBook()
+    autosave.attach(address_book, note_book)
+    address_book.add_record(make_contact("John"))
+    autosave.commit()
+    address_book.add_record(make_contact("Jane", ("0671234567",)))
+    autosave.commit()
+    assert saves.done.acquire(timeout=5)
+    autosave.close()
+    user_id, contacts, notes = saves.calls[0]
+    assert user_id == 2 and [contact[:2] for contact in contacts] == [(1, "John"), (2, "Jane")]
+    # Note book has no changes and is not written
+    assert notes is None
+    assert autosave.saves == 1 and autosave.saved
+
+
+def test_failed_save_is_reported_to_the_session_and_retried(capsys):
+    saves = Saves(failures=1)
+    autosave = Autosave(saves, changes=1, seconds=0.05)
+    address_book = AddressBook()
+    autosave.attach(address_book)
+    address_book.add_record(make_contact("John"))
+    autosave.commit()
+    assert saves.done.acquire(timeout=5) and saves.done.acquire(timeout=5)
+    autosave.close()
+    # The worker doesn't print over the prompt
+    assert capsys.readouterr().out == ""
+    assert autosave.take_errors() == ["Autosave failed: disk is full"]
+    assert autosave.take_errors() == []
+    assert saves.calls[0] == saves.calls[1]
+    assert autosave.saves == 1 and autosave.saved
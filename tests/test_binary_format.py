@@ -0,0 +1,112 @@
+import gc
+import io
+import os
+import pickle
+import shutil
+import threading
+
+import pytest
+
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.binary_format import BinaryFormat
+from ccnb.src.data_base import CONTACTS_SEGMENT, NOTES_SEGMENT, DataBase
+from ccnb.src.NoteBook import NoteBook
+
+from conftest import DATA, contents, legacy_books, make_contact
+
+
+def test_round_trip(books):
+    address_book, note_book = books
+    address_book.delete("Jane")
+    file = io.BytesIO()
+    BinaryFormat.dump(address_book, note_book, file)
+    file.seek(0)
+    loaded_address_book, loaded_note_book = BinaryFormat.load(file)
+    assert contents(loaded_address_book, loaded_note_book) == contents(address_book, note_book)
+    # Deleted key is never given again
+    assert loaded_address_book.user_id == 3
+    assert not loaded_address_book.has_changes() and not loaded_note_book.has_changes()
+
+
+def test_empty_books_round_trip():
+    file = io.BytesIO()
+    BinaryFormat.dump(AddressBook(), NoteBook(), file)
+    file.seek(0)
+    address_book, note_book = BinaryFormat.load(file)
+    assert len(address_book) == 0 and len(note_book) == 0 and address_book.user_id == 0
+
+
+def test_load_rejects_other_files(books):
+    file = io.BytesIO()
+    BinaryFormat.dump(*books, file)
+    data = file.getvalue()
+    with pytest.raises(ValueError, match="not a ccnb save file"):
+        BinaryFormat.load(io.BytesIO(b"\x80\x04" + data[2:]))
+    with pytest.raises(ValueError, match="not supported"):
+        BinaryFormat.load(io.BytesIO(BinaryFormat.HEADER.pack(BinaryFormat.MAGIC, BinaryFormat.VERSION + 1) + data[6:]))
+    with pytest.raises(ValueError):
+        BinaryFormat.load(io.BytesIO(data[:-3]))
+
+
+class PausedFile(io.BytesIO):
+    """Save file whose load stops after the header until resume is set, gc state is recorded when it continues"""
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.started, self.resume = threading.Event(), threading.Event()
+        self.gc_enabled = None
+
+    def read(self, size=-1):
+        if self.tell() == BinaryFormat.HEADER.size and not self.started.is_set():
+            self.started.set()
+            self.resume.wait(5)
+            self.gc_enabled = gc.isenabled()
+        return super().read(size)
+
+
+def test_gc_is_restored_after_overlapping_loads(books):
+    file = io.BytesIO()
+    BinaryFormat.dump(*books, file)
+    data = file.getvalue()
+    first, second = PausedFile(data), PausedFile(data)
+    threads = [threading.Thread(target=BinaryFormat.load, args=(paused_file,)) for paused_file in (first, second)]
+    for thread, paused_file in zip(threads, (first, second)):
+        thread.start()
+        assert paused_file.started.wait(5)
+    # The first load finishes while the second one is still running
+    first.resume.set()
+    threads[0].join()
+    second.resume.set()
+    threads[1].join()
+    assert first.gc_enabled is False and second.gc_enabled is False
+    assert gc.isenabled()
+
+    with pytest.raises(ValueError):
+        BinaryFormat.load(io.BytesIO(data[:-3]))
+    assert gc.isenabled()
+    gc.disable()
+    try:
+        BinaryFormat.load(io.BytesIO(data))
+        assert not gc.isenabled()
+    finally:
+        gc.enable()
+
+
+def test_legacy_pickle_is_loaded_and_converted(ccnb_path):
+    shutil.copy(os.path.join(DATA, "legacy.pkl"), ccnb_path / "legacy.pkl")
+    data_base = DataBase(username="legacy")
+    assert contents(data_base.address_book, data_base.note_book) == contents(*legacy_books())
+    assert data_base.address_book.user_id == 2
+
+    DataBase.save_data(data_base.address_book, data_base.note_book, "legacy", only_changed=False)
+    assert not os.path.exists(ccnb_path / "legacy.pkl")
+    for segment in (CONTACTS_SEGMENT, NOTES_SEGMENT):
+        assert os.path.exists(DataBase.segment_path("legacy", segment))
+    data_base = DataBase(username="legacy")
+    assert contents(data_base.address_book, data_base.note_book) == contents(*legacy_books())
+    data_base.address_book.add_record(make_contact("New"))
+    assert max(data_base.address_book.keys()) == 3
+
+
+def test_data_base_pickles_in_legacy_layout(books):
+    data_base = pickle.loads(pickle.dumps(DataBase(*books)))
+    assert contents(data_base.address_book, data_base.note_book) == contents(*books)
@@ -0,0 +1,109 @@
+import io
+import os
+import pickle
+import shutil
+
+import pyAesCrypt
+import pytest
+
+from ccnb.src.cipher import CREATED_BY, SessionCipher
+from ccnb.src.data_base import CONTACTS_SEGMENT, NOTES_SEGMENT, DataBase
+
+from conftest import DATA, contents, legacy_books
+
+BUFFER_SIZE = 64 * 1024
+# "AES", version, reserved byte, CREATED_BY extension, 128 bytes container extension, end of extensions
+SALT_OFFSET = 5 + 2 + len(CREATED_BY) + 2 + 128 + 2
+PLAIN = os.urandom(3 * BUFFER_SIZE + 5)
+
+
+def encrypt(cipher: SessionCipher, plain: bytes) -> bytes:
+    encrypted = io.BytesIO()
+    cipher.encrypt(io.BytesIO(plain), encrypted, BUFFER_SIZE)
+    return encrypted.getvalue()
+
+
+@pytest.mark.parametrize("size", [0, 15, 16, BUFFER_SIZE, len(PLAIN)])
+def test_pyaescrypt_reads_session_cipher_files(size):
+    encrypted = encrypt(SessionCipher("password"), PLAIN[:size])
+    plain = io.BytesIO()
+    pyAesCrypt.decryptStream(io.BytesIO(encrypted), plain, "password", BUFFER_SIZE)
+    assert plain.getvalue() == PLAIN[:size]
+
+
+@pytest.mark.parametrize("size", [0, 15, 16, BUFFER_SIZE, len(PLAIN)])
+def test_session_cipher_reads_pyaescrypt_files(size):
+    encrypted = io.BytesIO()
+    pyAesCrypt.encryptStream(io.BytesIO(PLAIN[:size]), encrypted, "password", BUFFER_SIZE)
+    plain = io.BytesIO()
+    SessionCipher("password").decrypt(io.BytesIO(encrypted.getvalue()), plain, BUFFER_SIZE)
+    assert plain.getvalue() == PLAIN[:size]
+
+
+def salt(encrypted: bytes) -> bytes:
+    return encrypted[SALT_OFFSET:SALT_OFFSET + 16]
+
+
+def test_session_stretches_its_salt_once():
+    cipher = SessionCipher("password")
+    first, second = encrypt(cipher, PLAIN), encrypt(cipher, PLAIN)
+    assert salt(first) == salt(second)
+    # Data key and iv are new for every file
+    assert first[SALT_OFFSET + 16:SALT_OFFSET + 64] != second[SALT_OFFSET + 16:SALT_OFFSET + 64]
+    cipher.decrypt(io.BytesIO(first), io.BytesIO(), BUFFER_SIZE)
+    assert cipher.derivations == 1
+    assert salt(encrypt(SessionCipher("password"), PLAIN)) != salt(first)
+
+
+def test_file_is_verified_and_decrypted_with_one_stretching():
+    encrypted = encrypt(SessionCipher("password"), PLAIN)
+    cipher = SessionCipher("password")
+    cipher.verify(io.BytesIO(encrypted))
+    plain = io.BytesIO()
+    cipher.decrypt(io.BytesIO(encrypted), plain, BUFFER_SIZE)
+    assert plain.getvalue() == PLAIN
+    assert cipher.derivations == 1
+
+
+def test_wrong_password_and_corrupted_file():
+    encrypted = encrypt(SessionCipher("password"), PLAIN)
+    with pytest.raises(ValueError, match="Wrong password"):
+        SessionCipher("wrong").verify(io.BytesIO(encrypted))
+    corrupted = encrypted[:-40] + bytes([encrypted[-40] ^ 1]) + encrypted[-39:]
+    with pytest.raises(ValueError, match="corrupted"):
+        SessionCipher("password").decrypt(io.BytesIO(corrupted), io.BytesIO(), BUFFER_SIZE)
+
+
+def test_encrypted_legacy_pickle_is_converted(ccnb_path):
+    shutil.copy(os.path.join(DATA, "secret.pkl.aes"), ccnb_path / "secret.pkl.aes")
+    cipher = SessionCipher("password")
+    data_base = DataBase(cipher=cipher, username="secret")
+    assert contents(data_base.address_book, data_base.note_book) == contents(*legacy_books())
+
+    DataBase.save_data(data_base.address_book, data_base.note_book, "secret", "password", cipher, only_changed=False)
+    assert not os.path.exists(ccnb_path / "secret.pkl.aes")
+    data_base = DataBase(cipher=SessionCipher("password"), username="secret")
+    assert contents(data_base.address_book, data_base.note_book) == contents(*legacy_books())
+    for segment in (CONTACTS_SEGMENT, NOTES_SEGMENT):
+        plain = io.BytesIO()
+        with open(DataBase.segment_path("secret", segment) + ".aes", "rb") as encrypted_file:
+            pyAesCrypt.decryptStream(encrypted_file, plain, "password", BUFFER_SIZE)
+        assert plain.getvalue().startswith(b"CCNB")
+
+
+class Payload:
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return os.mkdir, (self.path,)
+
+
+def test_legacy_pickle_is_authenticated_before_unpickling(ccnb_path):
+    created = ccnb_path / "created"
+    encrypted = encrypt(SessionCipher("password"), pickle.dumps((Payload(str(created)), PLAIN)))
+    filepath = ccnb_path / "secret.pkl.aes"
+    filepath.write_bytes(encrypted[:-1] + bytes([encrypted[-1] ^ 1]))
+    with pytest.raises(ValueError, match="Bad HMAC"):
+        DataBase.read_encrypted(str(filepath), SessionCipher("password"))
+    assert not created.exists()
@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.columns import ContactColumns
+
+from conftest import make_contact
+
+
+@pytest.fixture
+def address_book():
+    book = AddressBook()
+    birthdays = ["28.02.2000", "01.03.1990", None, "31.12.1970", "01.01.2001", "03.08.1995"]
+    for i, birthday in enumerate(birthdays):
+        book.add_record(make_contact(f"Contact {i}", (f"05012345{i:02}",), birthday, (f"c{i}@mail.com",)))
+    return book
+
+
+def test_queries_match_address_book(address_book):
+    columns = ContactColumns(address_book)
+    # Changes after the view was built are synced
+    address_book.find("Contact 2").birthday = "02.03.1985"
+    address_book.delete("Contact 4")
+    address_book.add_record(make_contact("Contact 6", ("0661234567",), "27.12.1999"))
+    for specific_date in ("26.02.2023", "25.12.2023", "01.08.2024"):
+        for days in (0, 7, 30):
+            assert columns.get_upcoming_birthdays(specific_date, days) == address_book.get_upcoming_birthdays(specific_date, days)
+    for month in (2, 3, 12):
+        assert columns.get_birthdays_in_month(month) == address_book.get_birthdays_in_month(month)
+    for digits in ("1234", "4505", "+38066"):
+        assert columns.search_by_phone(digits) == address_book.search_by_phone(digits)
+    assert columns.find_by_phone("0501234501") == address_book.find_by_phone("0501234501")
+    assert columns.count_by_email_domain() == {"mail.com": 5}
+    columns.close()
+
+
+def test_address_book_uses_columns_above_min_size(address_book, monkeypatch):
+    queries = []
+    query = ContactColumns.get_upcoming_birthdays
+    monkeypatch.setattr(ContactColumns, "get_upcoming_birthdays", lambda self, *args: queries.append(args) or query(self, *args))
+    reference = AddressBook()
+    for record in address_book.values():
+        reference.add_record(make_contact(record.name.value, record.phones, str(record.birthday) if record.birthday else None))
+    address_book.use_columns(len(address_book) + 1)
+    assert address_book.get_upcoming_birthdays("25.12.2023", 10) == reference.get_upcoming_birthdays("25.12.2023", 10)
+    assert not queries
+    for book in (address_book, reference):
+        book.add_record(make_contact("Contact 6", ("0661234567",), "27.12.1999"))
+    # The view is built by the first query of a big enough book and follows later changes
+    assert address_book.get_upcoming_birthdays("25.12.2023", 10) == reference.get_upcoming_birthdays("25.12.2023", 10)
+    assert len(queries) == 1
+    for book in (address_book, reference):
+        book.find("Contact 3").birthday = "02.01.1971"
+        book.delete("Contact 5")
+    for specific_date, days in (("25.12.2023", 10), ("26.02.2023", 7), ("01.08.2024", 30)):
+        assert address_book.get_upcoming_birthdays(specific_date, days) == reference.get_upcoming_birthdays(specific_date, days)
+    for month in (1, 3, 12):
+        assert address_book.get_birthdays_in_month(month) == reference.get_birthdays_in_month(month)
@@ -0,0 +1,121 @@
+import os
+
+import pytest
+
+from ccnb.src import data_base
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.Bot import Bot
+from ccnb.src.data_base import CONTACTS_SEGMENT, NOTES_SEGMENT, DataBase
+from ccnb.src.journal import Journal
+from ccnb.src.NoteBook import NoteBook
+
+from conftest import contents, make_contact
+
+
+def journaled(tmp_path, books):
+    """Journal with every record of the books, a changed contact and a deleted note"""
+    address_book, note_book = AddressBook(), NoteBook()
+    journal = Journal(str(tmp_path / "books.journal"))
+    journal.attach(address_book, note_book)
+    for key, record in books[0].items():
+        address_book[key] = record
+    for title, note in books[1].items():
+        note_book[title] = note
+    journal.commit()
+    address_book.find("John").add_phone("0661112233")
+    note_book.add_note("draft", "to be deleted")
+    journal.commit()
+    note_book.delete_note("draft")
+    journal.close()
+    journal.detach()
+    return journal.filepath, address_book, note_book
+
+
+def test_replay_restores_books(tmp_path, books):
+    filepath, address_book, note_book = journaled(tmp_path, books)
+    replayed_address_book, replayed_note_book = AddressBook(), NoteBook()
+    assert Journal.replay(filepath, replayed_address_book, replayed_note_book) == 8
+    assert contents(replayed_address_book, replayed_note_book) == contents(address_book, note_book)
+    # Operations are idempotent
+    Journal.replay(filepath, replayed_address_book, replayed_note_book)
+    assert contents(replayed_address_book, replayed_note_book) == contents(address_book, note_book)
+
+
+def test_replay_skips_line_cut_by_crash(tmp_path, books):
+    filepath, address_book, note_book = journaled(tmp_path, books)
+    with open(filepath, "a", encoding="utf-8") as journal_file:
+        journal_file.write('{"contact": 9, "record": {"name": "Cu')
+    replayed = AddressBook(), NoteBook()
+    Journal.replay(filepath, *replayed)
+    assert contents(*replayed) == contents(address_book, note_book)
+    with open(filepath, "rb") as journal_file:
+        operations, offset = Journal.read_operations(journal_file)
+    assert len(operations) == 8 and offset < len(open(filepath, "rb").read())
+
+
+def test_birthday_before_year_1000(tmp_path):
+    address_book = AddressBook()
+    journal = Journal(str(tmp_path / "books.journal"))
+    journal.attach(address_book)
+    address_book.add_record(make_contact("Old", birthday="01.01.0999"))
+    journal.close()
+    replayed = AddressBook()
+    Journal.replay(journal.filepath, replayed, None)
+    assert str(replayed.find("Old").birthday) == "01.01.0999"
+
+
+def test_commit_is_synced_to_disk(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(os, "fsync", lambda fd: synced.append(fd))
+    address_book = AddressBook()
+    journal = Journal(str(tmp_path / "books.journal"))
+    journal.attach(address_book)
+    journal.commit()
+    assert not synced
+    address_book.add_record(make_contact("John"))
+    journal.commit()
+    assert len(synced) == 1
+    journal.close()
+
+
+def test_session_after_crash_has_journaled_changes(ccnb_path):
+    bot = Bot("crash")
+    bot.add_contact(["Ann", "0501112233"])
+    bot.note_book.add_note("n", "note")
+    bot.commit_changes()
+    # Process dies: nothing is saved, the OS releases the lock
+    bot.journal.close()
+    bot.database.lock.release()
+    bot = Bot("crash")
+    assert bot.address_book.find("Ann") is not None and "n" in bot.note_book
+    bot.finalize([])
+
+
+def test_compaction_folds_journal_into_segments(ccnb_path, monkeypatch):
+    monkeypatch.setattr(Journal, "COMPACT_AFTER", 3)
+    bot = Bot("compact")
+    for i in range(7):
+        bot.add_contact([f"N{i}", "05011122%02d" % i])
+        bot.commit_changes()
+    bot.journal.close()
+    bot.database.lock.release()
+    # Segments have all compacted operations, the journal only the rest
+    segment = DataBase.read_snapshot(DataBase.segment_path("compact", CONTACTS_SEGMENT))
+    assert len(segment.address_book) >= 3
+    bot = Bot("compact")
+    assert sorted(record.name.value for record in bot.address_book.values()) == [f"N{i}" for i in range(7)]
+    bot.finalize([])
+
+
+def test_journal_is_folded_for_session_without_journal(ccnb_path, monkeypatch):
+    bot = Bot("fold")
+    bot.add_contact(["Ann", "0501112233"])
+    bot.commit_changes()
+    bot.journal.close()
+    bot.database.lock.release()
+    monkeypatch.setattr(data_base, "JOURNAL_ENABLED", False)
+    database, _ = DataBase.load_data("fold")
+    assert not (ccnb_path / "fold.journal").exists()
+    assert database.address_book.find("Ann") is not None
+    assert database.loaded(NOTES_SEGMENT) is None
+    database.lock.release()
@@ -0,0 +1,119 @@
+import pytest
+
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.NoteBook import NoteBook
+from ccnb.src.models import UserRecord
+
+from conftest import make_contact
+
+
+def test_list_setters_notify_once():
+    record = UserRecord("John")
+    calls = []
+    record.set_listener(lambda: calls.append(1))
+    record.phones = ["0501112233", "0502223344", "0503334455"]
+    record.emails = ["john@mail.com", "john@work.com"]
+    assert len(calls) == 2
+    assert list(record.phones) == ["+380501112233", "+380502223344", "+380503334455"]
+
+
+def test_list_setters_add_nothing_on_error():
+    record = UserRecord("John", ["0501112233"])
+    calls = []
+    record.set_listener(lambda: calls.append(1))
+    with pytest.raises(ValueError):
+        record.phones = ["0509998877", "0501112233"]
+    with pytest.raises(ValueError):
+        record.emails = ["john@mail.com", "not an email"]
+    assert list(record.phones) == ["+380501112233"] and record.emails is None
+    assert calls == []
+
+
+CONTACT_CHANGES = {
+    "name": lambda record: setattr(record, "name", "Johnny"),
+    "phones": lambda record: setattr(record, "phones", ["0509998877"]),
+    "add_phone": lambda record: record.add_phone("0509998877"),
+    "remove_phone": lambda record: record.remove_phone("0501112233"),
+    "edit_phone": lambda record: record.edit_phone("0501112233", "0509998877"),
+    "birthday": lambda record: setattr(record, "birthday", "03.08.1995"),
+    "emails": lambda record: setattr(record, "emails", ["john@work.com"]),
+    "add_email": lambda record: record.add_email("john@work.com"),
+    "remove_email": lambda record: record.remove_email("john@mail.com"),
+    "edit_email": lambda record: record.edit_email("john@mail.com", "john@work.com"),
+    "address": lambda record: setattr(record, "address", "Main street 1"),
+}
+
+NOTE_CHANGES = {
+    "add_tag": lambda note: note.add_tag("home"),
+    "remove_tag": lambda note: note.remove_tag("work"),
+    "edit_content": lambda note: note.edit_content("new content"),
+}
+
+
+@pytest.mark.parametrize("change", CONTACT_CHANGES.values(), ids=CONTACT_CHANGES.keys())
+def test_contact_change_is_tracked_by_the_book(change):
+    address_book = AddressBook()
+    address_book.add_record(make_contact("Jane"))
+    address_book.add_record(make_contact("John", ("0501112233",), emails=("john@mail.com",)))
+    address_book.mark_saved()
+    record = address_book.find("John")
+    assert not record.dirty and not address_book.has_changes()
+    calls = []
+    address_book.subscribe(lambda key, changed: calls.append((key, changed)))
+    change(record)
+    assert record.dirty
+    assert calls and all(call == (2, record) for call in calls)
+    assert address_book.changed_keys == {2} and address_book.deleted_keys == set()
+    address_book.mark_saved()
+    assert not record.dirty and not address_book.has_changes()
+
+
+@pytest.mark.parametrize("change", NOTE_CHANGES.values(), ids=NOTE_CHANGES.keys())
+def test_note_change_is_tracked_by_the_book(change):
+    note_book = NoteBook()
+    note_book.add_note("other", "other note")
+    note_book.add_note("first", "first note")
+    note_book.add_tags_to_note("first", ["work"])
+    note_book.mark_saved()
+    note = note_book["first"]
+    assert not note.dirty and not note_book.has_changes()
+    calls = []
+    note_book.subscribe(lambda title, changed: calls.append((title, changed)))
+    change(note)
+    assert note.dirty
+    assert calls == [("first", note)]
+    assert note_book.changed_titles == {"first"} and note_book.deleted_titles == set()
+    note_book.mark_saved()
+    assert not note.dirty and not note_book.has_changes()
+
+
+def test_deleted_records_are_tracked_and_unsubscribed():
+    address_book, note_book = AddressBook(), NoteBook()
+    address_book.add_record(make_contact("John"))
+    note_book.add_note("first", "first note")
+    assert address_book.changed_keys == {1} and note_book.changed_titles == {"first"}
+    address_book.mark_saved()
+    note_book.mark_saved()
+    record, note = address_book.find("John"), note_book["first"]
+    address_book.delete("John")
+    note_book.delete_note("first")
+    assert address_book.changed_keys == set() and address_book.deleted_keys == {1}
+    assert note_book.changed_titles == set() and note_book.deleted_titles == {"first"}
+    # Changes of removed records don't reach the books any more
+    record.address = "Main street 1"
+    note.edit_content("new content")
+    assert record.dirty and note.dirty
+    assert address_book.deleted_keys == {1} and note_book.deleted_titles == {"first"}
+    address_book.mark_saved()
+    note_book.mark_saved()
+    assert not address_book.has_changes() and not note_book.has_changes()
+
+
+def test_loaded_records_are_clean():
+    record = UserRecord.trusted("John", ["+380501112233"])
+    assert not record.dirty
+    record.mark_clean()
+    record.add_phone("0509998877")
+    assert record.dirty
+    record.mark_clean()
+    assert not record.dirty
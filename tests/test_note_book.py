@@ -0,0 +1,17 @@
+from ccnb.src.NoteBook import NoteBook
+
+
+def titles(table) -> list:
+    return [row[0] for row in table.rows]
+
+
+def test_search_notes_appends_substring_matches_to_ranked_ones():
+    note_book = NoteBook()
+    note_book.add_note("reports", "quarterly report")
+    note_book.add_note("trip", "airport transfer")
+    note_book.add_note("portfolio", "portfolio review, port of the project")
+    note_book.add_note("other", "nothing here")
+    # Words starting with "port" are ranked, notes containing it inside a word follow in the order of the book
+    assert titles(note_book.search_notes("port")) == ["portfolio", "reports", "trip"]
+    assert titles(note_book.search_notes("port", limit=2)) == ["portfolio", "reports"]
+    assert titles(note_book.search_notes("missing")) == []
@@ -0,0 +1,70 @@
+import os
+
+from ccnb.src.data_base import DataBase
+from ccnb.src.record_store import RecordStore
+
+from conftest import contents, make_contact
+
+
+def test_books_round_trip(tmp_path, books):
+    filepath = str(tmp_path / "books.records")
+    RecordStore.create(filepath, *books)
+    assert os.listdir(tmp_path) == ["books.records"]
+    store = RecordStore(filepath)
+    assert contents(store.address_book, store.note_book) == contents(*books)
+    assert store.address_book.user_id == 3
+    assert store.address_book.find("олена").address.value == "Львів, вул. Зелена 1"
+    assert [str(record.name) for record in store.address_book.search("mail")] == ["John"]
+    assert [str(record.name) for record in store.address_book.find_by_phone("0679876543")] == ["Jane"]
+    store.close()
+
+
+def test_new_store_is_created_empty(tmp_path):
+    filepath = str(tmp_path / "books.records")
+    store = RecordStore(filepath)
+    assert store.is_empty()
+    assert sorted(os.listdir(tmp_path)) == ["books.records", "books.records.journal"]
+    store.close()
+    assert os.listdir(tmp_path) == ["books.records"]
+
+
+def test_changes_are_written_on_close(tmp_path, books):
+    filepath = str(tmp_path / "books.records")
+    RecordStore.create(filepath, *books)
+    store = RecordStore(filepath)
+    store.address_book.find("John").add_phone("0661234567")
+    store.address_book.delete("Jane")
+    store.address_book.add_record(make_contact("Petro", ("0991234567",), "01.01.1990"))
+    store.note_book.add_tags_to_note("report", ["work"])
+    store.note_book.delete_note("todo")
+    expected = contents(store.address_book, store.note_book)
+    store.close()
+    assert os.listdir(tmp_path) == ["books.records"]
+
+    store = RecordStore(filepath)
+    assert contents(store.address_book, store.note_book) == expected
+    assert list(store.address_book.keys()) == [1, 3, 4]
+    store.close()
+
+
+def test_journal_is_replayed_after_crash(tmp_path, books):
+    filepath = str(tmp_path / "books.records")
+    RecordStore.create(filepath, *books)
+    store = RecordStore(filepath)
+    store.address_book.find("Jane").birthday = "02.02.1992"
+    store.note_book.add_note("new", "written before the crash")
+    store.commit()
+    expected = contents(store.address_book, store.note_book)
+    # The session dies without close(), the store file still has the old books
+
+    recovered = RecordStore(filepath)
+    assert contents(recovered.address_book, recovered.note_book) == expected
+    recovered.close()
+
+
+def test_unencrypted_save_is_imported(ccnb_path, books):
+    DataBase.save_data(*books, "user")
+    storage = DataBase.open_record_store("user").storage
+    assert contents(storage.address_book, storage.note_book) == contents(*books)
+    assert not os.path.exists(DataBase.save_path("user", ".records.tmp"))
+    storage.close()
@@ -0,0 +1,53 @@
+import os
+
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.data_base import CONTACTS_SEGMENT, LEGACY_EXTENSION, NOTES_SEGMENT, SAVE_EXTENSION, DataBase
+from ccnb.src.NoteBook import NoteBook
+
+from conftest import contents, make_contact
+
+
+def inodes(username):
+    """Inodes of the segments, a written segment is a new file renamed over the old one"""
+    return {segment: os.stat(DataBase.segment_path(username, segment)).st_ino for segment in (CONTACTS_SEGMENT, NOTES_SEGMENT)}
+
+
+def test_books_are_saved_and_loaded_separately(ccnb_path, books):
+    DataBase.save_data(*books, "user")
+    assert DataBase.find_save("user") == DataBase.segment_path("user", CONTACTS_SEGMENT)
+    data_base = DataBase(username="user")
+    assert data_base.loaded(CONTACTS_SEGMENT) is None and data_base.loaded(NOTES_SEGMENT) is None
+    assert contents(data_base.address_book, NoteBook()) == contents(books[0], NoteBook())
+    # The note book is read only when it is used
+    assert data_base.loaded(NOTES_SEGMENT) is None
+    assert contents(AddressBook(), data_base.note_book) == contents(AddressBook(), books[1])
+
+
+def test_only_changed_segment_is_written(ccnb_path, books):
+    DataBase.save_data(*books, "user")
+    data_base = DataBase(username="user")
+    before = inodes("user")
+    data_base.note_book.add_note("new", "note")
+    assert DataBase.needs_save(None, data_base.note_book, "user")
+    DataBase.save_data(data_base.loaded(CONTACTS_SEGMENT), data_base.note_book, "user")
+    after = inodes("user")
+    assert after[CONTACTS_SEGMENT] == before[CONTACTS_SEGMENT] and after[NOTES_SEGMENT] != before[NOTES_SEGMENT]
+    assert not DataBase.needs_save(None, data_base.note_book, "user")
+    assert "new" in DataBase(username="user").note_book
+
+
+def test_single_save_file_of_older_version_is_migrated(ccnb_path, books):
+    DataBase.write_snapshot(DataBase(*books), DataBase.save_path("user"))
+    assert DataBase.find_save("user") == DataBase.save_path("user")
+    data_base = DataBase(username="user")
+    data_base.address_book.add_record(make_contact("Petro", ("0991234567",)))
+    # Only the contacts are saved, the old file still has the notes
+    DataBase.save_data(data_base.address_book, None, "user")
+    assert os.path.exists(DataBase.save_path("user"))
+    assert contents(AddressBook(), DataBase(username="user").note_book) == contents(AddressBook(), books[1])
+    # Once both segments exist, the old file is deleted
+    DataBase.save_data(data_base.address_book, data_base.note_book, "user", only_changed=False)
+    assert not os.path.exists(DataBase.save_path("user", SAVE_EXTENSION))
+    assert not os.path.exists(DataBase.save_path("user", LEGACY_EXTENSION))
+    loaded = DataBase(username="user")
+    assert contents(loaded.address_book, loaded.note_book) == contents(data_base.address_book, books[1])
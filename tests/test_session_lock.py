@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from ccnb.src import Bot as bot_module
+from ccnb.src import data_base, durable
+from ccnb.src.Bot import Bot
+from ccnb.src.data_base import DataBase
+from ccnb.src.session_lock import SessionLock, fcntl
+
+needs_flock = pytest.mark.skipif(fcntl is None, reason="advisory locks need fcntl")
+
+
+@needs_flock
+def test_lock_is_held_by_one_session(tmp_path):
+    filepath = str(tmp_path / "user.lock")
+    writer, other = SessionLock(filepath), SessionLock(filepath)
+    assert writer.acquire() and writer.held
+    assert not other.acquire() and not other.held
+    assert open(filepath).read() == f"{os.getpid()}\n"
+    writer.release()
+    assert other.acquire()
+    other.release()
+
+
+@needs_flock
+def test_second_session_is_read_only(ccnb_path, monkeypatch):
+    monkeypatch.setattr(bot_module, "WATCH_ENABLED", False)
+    writer = Bot("shared")
+    writer.add_contact(["Ann", "0501112233"])
+    writer.commit_changes()
+    reader = Bot("shared")
+    assert reader.read_only and not writer.read_only
+    assert reader.journal is None and reader.autosave is None
+    # Journaled changes of the writer are in the snapshot of the reader
+    assert reader.address_book.find("Ann") is not None
+    assert "read-only" in reader.add_contact(["Bob", "0671112233"])
+    assert reader.address_book.find("Bob") is None
+    assert reader.finalize([]) == "Good bye!"
+    writer.finalize([])
+    # The lock is free after the writer exits
+    next_writer = Bot("shared")
+    assert not next_writer.read_only
+    next_writer.finalize([])
+
+
+def test_directory_is_synced_before_journal_is_deleted(ccnb_path, books, monkeypatch):
+    events = []
+    monkeypatch.setattr(durable, "sync_directory", lambda path: events.append(("sync", path)))
+    remove = os.remove
+    monkeypatch.setattr(data_base.os, "remove", lambda path: (events.append(("remove", path)), remove(path)))
+    journal_path = DataBase.journal_path("user")
+    open(journal_path, "w").close()
+    DataBase.save_data(*books, "user")
+    segments_directory = os.path.dirname(DataBase.segment_path("user", data_base.CONTACTS_SEGMENT))
+    assert events == [("sync", segments_directory), ("sync", segments_directory), ("remove", journal_path)]
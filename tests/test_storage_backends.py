@@ -0,0 +1,68 @@
+import pytest
+
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.NoteBook import NoteBook
+from ccnb.src.record_store import RecordStore
+from ccnb.src.sqlite_storage import SqliteStorage
+
+from conftest import make_contact
+
+BIRTHDAYS = ["28.02.2000", "01.03.1990", "28.02.1985", "31.12.1970", "01.01.2001", "15.06.1999", None, "02.03.1990",
+             "08.01.1990", "07.01.1990", "06.01.1990"]
+
+
+def fill(address_book, note_book):
+    for i, birthday in enumerate(BIRTHDAYS):
+        address_book.add_record(make_contact(f"Contact {i}", (f"05012345{i:02}",), birthday))
+    note_book.add_note("first", "first note about reports")
+    note_book.add_tags_to_note("first", ["work", "urgent"])
+    note_book.add_note("second", "second note")
+    note_book.add_tags_to_note("second", ["home"])
+    note_book.add_note("third", "support ticket")
+    note_book.add_tags_to_note("third", ["work"])
+    note_book.add_note("fourth", "portfolio review")
+
+
+@pytest.fixture(params=["sqlite", "mmap"])
+def storage(request, tmp_path):
+    if request.param == "sqlite":
+        storage = SqliteStorage(str(tmp_path / "books.sqlite3"))
+    else:
+        storage = RecordStore(str(tmp_path / "books.ccnr"))
+    yield storage
+    storage.close()
+
+
+@pytest.fixture
+def reference():
+    address_book, note_book = AddressBook(), NoteBook()
+    fill(address_book, note_book)
+    return address_book, note_book
+
+
+@pytest.mark.parametrize("specific_date", ["27.02.2023", "28.02.2024", "25.12.2023", "14.06.2023", "02.01.2024"])
+def test_birthday_queries_match_address_book(storage, reference, specific_date):
+    fill(storage.address_book, storage.note_book)
+    address_book, _ = reference
+    for days in (0, 3, 7, 30, 400):
+        assert (storage.address_book.get_upcoming_birthdays(specific_date, days) ==
+                address_book.get_upcoming_birthdays(specific_date, days))
+    for count in (1, 3, 10):
+        assert (storage.address_book.get_next_birthdays(count, specific_date) ==
+                address_book.get_next_birthdays(count, specific_date))
+    for month in (1, 2, 3, 6, 12):
+        assert storage.address_book.get_birthdays_in_month(month) == address_book.get_birthdays_in_month(month)
+    with pytest.raises(ValueError):
+        storage.address_book.get_birthdays_in_month(13)
+
+
+def test_note_listings_match_note_book(storage, reference):
+    fill(storage.address_book, storage.note_book)
+    _, note_book = reference
+    for books in (storage.note_book, note_book):
+        assert books.edit_note("second", "edited") == "Note 'second' edited successfully."
+        assert books.remove_tag_from_note("first", "urgent") == "Tag 'urgent' removed from note 'first'."
+        assert books.delete_note("missing") == "Note not found."
+    for listing in ("show_all_notes", "show_tag_counts", "sort_notes_by_tag_count", "sort_notes_by_tags_alphabetically"):
+        assert str(getattr(storage.note_book, listing)()) == str(getattr(note_book, listing)())
+    assert str(storage.note_book.search_notes("port")) == str(note_book.search_notes("port"))
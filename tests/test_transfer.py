@@ -0,0 +1,40 @@
+import json
+
+from ccnb.src import transfer
+from ccnb.src.AddressBook import AddressBook
+from ccnb.src.NoteBook import NoteBook
+from ccnb.src.transfer import Transfer
+
+from conftest import contents
+
+
+def write_csv(path, count, invalid=()):
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("name,phones,birthday,emails,address\n")
+        for i in range(count):
+            phone = "123" if i in invalid else f"050{i:07}"
+            file.write(f"Name {i},{phone},01.02.1990,name{i}@mail.com,Street {i}\n")
+
+
+def test_process_pool_gives_the_same_books(tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer, "BATCH_SIZE", 50)
+    filepath = str(tmp_path / "contacts.csv")
+    write_csv(filepath, 300, invalid=(7, 120))
+    books = []
+    for workers in (1, 3):
+        address_book = AddressBook()
+        assert Transfer.import_contacts(address_book, filepath, workers=workers) == (298, 2)
+        books.append(contents(address_book, NoteBook()))
+    assert books[0] == books[1]
+    with open(filepath + Transfer.REJECT_SUFFIX, encoding="utf-8") as reject_file:
+        assert [json.loads(line)["line"] for line in reject_file] == [9, 122]
+
+
+def test_reject_file_of_earlier_import_is_deleted(tmp_path):
+    filepath = str(tmp_path / "contacts.csv")
+    write_csv(filepath, 3, invalid=(1,))
+    address_book = AddressBook()
+    assert Transfer.import_contacts(address_book, filepath, workers=4) == (2, 1)
+    write_csv(filepath, 3)
+    assert Transfer.import_contacts(AddressBook(), filepath, workers=4) == (3, 0)
+    assert not (tmp_path / ("contacts.csv" + Transfer.REJECT_SUFFIX)).exists()
@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from ccnb.src import data_base
+from ccnb.src.Bot import Bot
+from ccnb.src.session_lock import fcntl
+from ccnb.src.watcher import Watcher
+
+pytestmark = pytest.mark.skipif(fcntl is None, reason="read-only sessions need fcntl")
+
+
+def wait_for(condition, reader: Bot, timeout=5.0) -> bool:
+    """Reloads changes of the reader like the prompt does before every command, until condition() is true"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        reader.reload_changes()
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.fixture
+def sessions(ccnb_path, monkeypatch):
+    monkeypatch.setattr(data_base, "WATCH_SECONDS", 0.02)
+    writer = Bot("live")
+    writer.add_contact(["Ann", "0501112233"])
+    writer.commit_changes()
+    reader = Bot("live")
+    assert reader.read_only and reader.watcher is not None
+    yield writer, reader
+    reader.finalize([])
+    writer.finalize([])
+
+
+def test_journaled_changes_are_applied(sessions):
+    writer, reader = sessions
+    writer.add_contact(["Bob", "0671112233"])
+    writer.note_book.add_note("plan", "from the writer")
+    writer.address_book.delete("Ann")
+    writer.commit_changes()
+    assert wait_for(lambda: reader.address_book.find("Bob") is not None and "plan" in reader.note_book, reader)
+    assert reader.address_book.find("Ann") is None
+
+
+def test_new_save_is_merged(sessions, capsys):
+    writer, reader = sessions
+    writer.add_contact(["Bob", "0671112233"])
+    writer.commit_changes()
+    # Segments are written and the journal is deleted, the reader reads a new snapshot
+    writer.journal.close()
+    data_base.DataBase.save_data(writer.address_book, writer.note_book, "live", only_changed=False)
+    assert wait_for(lambda: reader.watcher.reloads > 0 and reader.address_book.find("Bob") is not None, reader)
+    assert reader.address_book.find("Ann") is not None
+    assert "Records changed by another session" in capsys.readouterr().out
+
+
+def test_errors_are_printed_by_the_session(capsys):
+    def file_ids():
+        raise OSError("save directory is gone")
+    watcher = Watcher(file_ids, None, "missing.journal", [], 0, seconds=0.01)
+    time.sleep(0.1)
+    watcher.close()
+    assert capsys.readouterr().out == ""
+    assert watcher.take_errors() == ["Reload of changes failed: save directory is gone"]
+    assert watcher.take_errors() == []